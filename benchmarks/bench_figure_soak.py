@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Soak benchmark of the figure lifecycle of ``Pianoroll``: resident memory
+while rendering many pianorolls in a loop, with the figures left open as in
+midiplot 0.0, closed by the ``Pianoroll.figure`` context manager, or created
+without pyplot and dropped.
+
+    python benchmarks/bench_figure_soak.py --renders 200 --notes 2000
+
+"""
+
+import argparse
+import gc
+import os
+import resource
+import sys
+import tempfile
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+# The benchmarks run from a checkout, without installing midiplot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import midiplot
+
+from bench_pianoroll import synthetic_tracks
+
+
+def rss_mb():
+
+    """Returns the resident memory of the process in MB, or the peak
+    resident memory where ``/proc`` is not available."""
+
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def render(pianoroll, tracks, mode, path):
+
+    """Renders the tracks to ``path`` once with the lifecycle ``mode``."""
+
+    if mode == 'context':
+        with pianoroll.figure() as (fig, ax):
+            pianoroll.plot_all_tracks(tracks, ax=ax)
+            fig.savefig(path)
+    else:
+        # 'open' leaves the pyplot figure open, 'nopyplot' drops the figure
+        fig, ax = pianoroll.plot_all_tracks(tracks)
+        fig.savefig(path)
+
+
+def soak(tracks, mode, renders, every, path):
+
+    """Renders the tracks ``renders`` times and returns the resident memory
+    sampled every ``every`` renders."""
+
+    pianoroll = midiplot.Pianoroll(pyplot=mode != 'nopyplot')
+    samples = []
+    for i in range(renders):
+        render(pianoroll, tracks, mode, path)
+        if (i + 1) % every == 0:
+            gc.collect()
+            samples.append(rss_mb())
+    plt.close('all')
+    gc.collect()
+
+    return samples
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=200)
+    parser.add_argument('--notes', type=int, default=2000)
+    parser.add_argument('--every', type=int, default=25,
+                        help='number of renders between memory samples')
+    parser.add_argument('--modes', nargs='+', default=['context', 'nopyplot', 'open'],
+                        choices=['context', 'nopyplot', 'open'])
+    args = parser.parse_args()
+
+    tracks = synthetic_tracks(args.notes)
+    path = os.path.join(tempfile.gettempdir(), 'midiplot_soak.png')
+    plt.rcParams['figure.max_open_warning'] = 0
+
+    print('{:>10} {:>10} {:>10} {:>10}'.format('mode', 'first MB', 'last MB', 'growth MB'))
+    for mode in args.modes:
+        samples = soak(tracks, mode, args.renders, args.every, path)
+        print('{:>10} {:>10.1f} {:>10.1f} {:>10.1f}'.format(mode, samples[0], samples[-1],
+                                                            samples[-1] - samples[0]))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the import of midiplot: wall time, resident memory and the
+plotting backends loaded by each import statement, measured in a fresh
+interpreter. Parsing workers only need numpy and pretty_midi, so importing
+midiplot or ``MidiProcessing`` must not load matplotlib or plotly; they are
+loaded on the first plot of ``Pianoroll``.
+
+    python benchmarks/bench_import.py --repeat 5 --check
+
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# The probes import the midiplot of this checkout, which does not need to be
+# installed
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = ['import numpy, pretty_midi',
+              'import midiplot',
+              'from midiplot import MidiProcessing',
+              'import midiplot; midiplot.Pianoroll(pyplot=False).plot_all_tracks({})']
+
+BACKENDS = ('matplotlib', 'plotly')
+
+PROBE = '''
+import json, os, resource, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+try:
+    with open('/proc/self/statm') as f:
+        rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+print(json.dumps({{"seconds": seconds, "rss": rss,
+                  "backends": sorted({{name.split('.')[0] for name in sys.modules}} & {backends})}}))
+'''
+
+
+def probe(statement):
+
+    """Runs ``statement`` in a new interpreter and returns its import time
+    in seconds, the resident memory in MB and the plotting backends in
+    ``sys.modules``."""
+
+    code = PROBE.format(statement=statement, backends=set(BACKENDS))
+    out = subprocess.run([sys.executable, '-c', code], check=True, cwd=ROOT,
+                         capture_output=True, text=True).stdout
+
+    return json.loads(out.splitlines()[-1])
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of interpreters per statement, the best time is kept')
+    parser.add_argument('--check', action='store_true',
+                        help='fails if importing midiplot loads a plotting backend')
+    args = parser.parse_args()
+
+    print('{:<72} {:>8} {:>8}  {}'.format('statement', 'ms', 'RSS MB', 'backends'))
+    failed = False
+    for statement in STATEMENTS:
+        results = [probe(statement) for _ in range(args.repeat)]
+        best = min(results, key=lambda result: result["seconds"])
+        print('{:<72} {:>8.1f} {:>8.1f}  {}'.format(statement, best["seconds"] * 1000, best["rss"],
+                                                    ', '.join(best["backends"]) or '-'))
+        if 'Pianoroll' not in statement and best["backends"]:
+            failed = True
+
+    if args.check and failed:
+        sys.exit('importing midiplot loaded a plotting backend')
+
+
+if __name__ == '__main__':
+    main()
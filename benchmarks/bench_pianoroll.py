@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the matplotlib pianoroll renderer: number of artists and draw
+time of ``Pianoroll.plot_all_tracks`` against the previous renderer, which
+created a line and a rectangle per note.
+
+    python benchmarks/bench_pianoroll.py --notes 1000 10000 50000
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+# The benchmarks run from a checkout, without installing midiplot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import midiplot
+from midiplot.midiprocessing import COLOR, COLOR_EDGES
+
+
+def synthetic_tracks(n_notes, n_tracks=4, seed=0):
+
+    """This function returns ``n_tracks`` random tracks with ``n_notes``
+    notes in total in the format of ``MidiProcessing.get_tracks``."""
+
+    rng = np.random.default_rng(seed)
+    tracks = {}
+    for n, count in enumerate(np.diff(np.linspace(0, n_notes, n_tracks + 1).astype(int))):
+        note_on = np.sort(rng.uniform(0, count / 8, count))
+        tracks[n] = {"n_track"       :   n,
+                     "n_program"     :   n,
+                     "track_name"    :   'track {}'.format(n),
+                     "is_drum"       :   False,
+                     "pitch"         :   rng.integers(24, 100, count),
+                     "note_on"       :   note_on,
+                     "note_off"      :   note_on + rng.uniform(0.05, 1, count),
+                     "velocity"      :   rng.integers(1, 128, count)}
+
+    return tracks
+
+
+def legacy_track_loop(self, track, ax, COLOR, COLOR_EDGES, axis='time',
+                      time_1_bar=None, tempo_map=None):
+
+    """Per note renderer of midiplot 0.0."""
+
+    for i in range(len(track["note_on"])):
+        x = track["note_on"][i]
+        plt.vlines(x=x, ymin=track["pitch"][i], ymax=track["pitch"][i]+1,
+                   color=COLOR_EDGES, linewidth=0.01, label=track["track_name"])
+        ax.add_patch(plt.Rectangle((x, track["pitch"][i]),
+                                   width=track["note_off"][i] - x, height=1,
+                                   alpha=0.5, edgecolor=COLOR_EDGES, facecolor=COLOR))
+
+
+def run(tracks, renderer):
+
+    """Plots the tracks and returns the number of artists, the build time
+    and the draw time in seconds."""
+
+    pianoroll = midiplot.Pianoroll()
+    if renderer == 'legacy':
+        pianoroll._track_loop = legacy_track_loop.__get__(pianoroll)
+
+    start = time.perf_counter()
+    pianoroll.plot_all_tracks(tracks)
+    fig = plt.gcf()
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fig.canvas.draw()
+    draw = time.perf_counter() - start
+
+    ax = fig.axes[0]
+    n_artists = len(ax.get_children())
+    plt.close(fig)
+
+    return n_artists, build, draw
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--legacy-max', type=int, default=20000,
+                        help='largest number of notes run with the legacy renderer')
+    args = parser.parse_args()
+
+    print('{:>8} {:>10} {:>10} {:>10} {:>10}'.format('notes', 'renderer', 'artists',
+                                                      'build s', 'draw s'))
+    for n_notes in args.notes:
+        tracks = synthetic_tracks(n_notes)
+        for renderer in ('collection', 'legacy'):
+            if renderer == 'legacy' and n_notes > args.legacy_max:
+                continue
+            n_artists, build, draw = run(tracks, renderer)
+            print('{:>8} {:>10} {:>10} {:>10.3f} {:>10.3f}'.format(n_notes, renderer,
+                                                                n_artists, build, draw))
+
+
+if __name__ == '__main__':
+    main()
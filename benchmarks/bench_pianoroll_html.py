@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the plotly pianoroll renderer: size of the HTML page and build
+time of a figure against the previous renderer, which added a shape and a
+trace per note, each hover text with the whole track.
+
+    python benchmarks/bench_pianoroll_html.py --notes 100 1000 10000
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import plotly.graph_objects as go
+
+# The benchmarks run from a checkout, without installing midiplot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import midiplot
+from midiplot.midiprocessing import COLOR, COLOR_EDGES
+
+from bench_pianoroll import synthetic_tracks
+
+
+def legacy_track_loop_html(self, track, fig, COLOR, COLOR_EDGES, axis='time',
+                           time_1_bar=None, tempo_map=None):
+
+    """Per note renderer of midiplot 0.0."""
+
+    for i in range(len(track["note_on"])):
+        x = track["note_on"][i]
+        x1 = track["note_off"][i]
+        fig.add_shape(type="rect", x0=x, y0=track["pitch"][i], x1=x1,
+                      y1=track["pitch"][i]+1, line=dict(color=COLOR_EDGES, width=2),
+                      fillcolor=COLOR, name=track["track_name"])
+        fig.add_trace(go.Scatter(x=[x, x, x1, x1, x],
+                                 y=[track["pitch"][i], track["pitch"][i]+1,
+                                    track["pitch"][i]+1, track["pitch"][i],
+                                    track["pitch"][i]],
+                                 fill="toself", mode='lines', name='',
+                                 text='{} {} {} {} {}'.format(track["track_name"], track["n_program"],
+                                                              list(track["note_on"]), list(track["note_off"]),
+                                                              list(track["pitch"])),
+                                 opacity=0))
+
+
+def run(tracks, renderer):
+
+    """Builds the figure of all the tracks and returns the number of
+    traces, the build time in seconds and the size in bytes of the HTML
+    page without the plotly.js bundle."""
+
+    pianoroll = midiplot.Pianoroll()
+    if renderer == 'legacy':
+        pianoroll._track_loop_html = legacy_track_loop_html.__get__(pianoroll)
+
+    start = time.perf_counter()
+    fig = go.Figure(layout=go.Layout({"template": "plotly_dark"}))
+    for key in tracks.keys():
+        pianoroll._track_loop_html(tracks[key], fig, COLOR[key], COLOR_EDGES[key])
+    html = fig.to_html(include_plotlyjs=False)
+    build = time.perf_counter() - start
+
+    return len(fig.data), build, len(html.encode())
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--legacy-max', type=int, default=300,
+                        help='largest number of notes run with the legacy renderer')
+    args = parser.parse_args()
+
+    print('{:>8} {:>10} {:>8} {:>10} {:>12}'.format('notes', 'renderer', 'traces',
+                                                     'build s', 'html bytes'))
+    for n_notes in args.notes:
+        tracks = synthetic_tracks(n_notes)
+        for renderer in ('scattergl', 'legacy'):
+            if renderer == 'legacy' and n_notes > args.legacy_max:
+                continue
+            n_traces, build, size = run(tracks, renderer)
+            print('{:>8} {:>10} {:>8} {:>10.3f} {:>12}'.format(n_notes, renderer,
+                                                              n_traces, build, size))
+
+
+if __name__ == '__main__':
+    main()
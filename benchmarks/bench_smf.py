@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the MIDI readers: time to read synthetic files of
+``synthetic.py`` with ``read_smf``, ``scan_smf`` and ``MidiProcessing``
+with the ``fast`` engine against ``pretty_midi.PrettyMIDI`` and the
+``pretty_midi`` engine. ``read_smf`` pairs the notes with array
+operations; the notes read by both are also checked to be the same.
+
+    python benchmarks/bench_smf.py --notes 10000 100000 --tempo-changes 16
+
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pretty_midi
+
+# The benchmarks run from a checkout, without installing midiplot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import midiplot
+
+from synthetic import synthetic_midi
+
+
+READERS = (('pretty_midi', lambda data: pretty_midi.PrettyMIDI(io.BytesIO(data))),
+           ('MidiProcessing.pretty_midi', lambda data: midiplot.MidiProcessing(
+               data, engine='pretty_midi').note_table),
+           ('read_smf', midiplot.read_smf),
+           ('read_smf.compact', lambda data: midiplot.read_smf(data, compact=True)),
+           ('scan_smf', midiplot.scan_smf),
+           ('MidiProcessing.fast', lambda data: midiplot.MidiProcessing(
+               data, engine='fast').note_table))
+
+
+def best_time(reader, data, repeat):
+
+    """Returns the best time in seconds of ``repeat`` reads of ``data``."""
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        reader(data)
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def check(data):
+
+    """Fails if ``read_smf`` does not read the notes of ``pretty_midi``."""
+
+    midi = pretty_midi.PrettyMIDI(io.BytesIO(data))
+    table = midiplot.read_smf(data).note_table
+    notes = [note for instrument in midi.instruments for note in instrument.notes]
+    assert table.notes['pitch'].tolist() == [note.pitch for note in notes]
+    np.testing.assert_allclose(table.notes['note_on'], [note.start for note in notes])
+    np.testing.assert_allclose(table.notes['note_off'], [note.end for note in notes])
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--tracks', type=int, default=8)
+    parser.add_argument('--tempo-changes', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print('{:>8} {:<28} {:>10} {:>10}'.format('notes', 'reader', 'best s', 'speedup'))
+    for n_notes in args.notes:
+        data = synthetic_midi(n_notes, args.tracks, args.tempo_changes)
+        check(data)
+        baseline = None
+        for name, reader in READERS:
+            seconds = best_time(reader, data, args.repeat)
+            baseline = baseline or seconds
+            print('{:>8} {:<28} {:>10.4f} {:>9.1f}x'.format(n_notes, name, seconds,
+                                                           baseline / seconds))
+
+
+if __name__ == '__main__':
+    main()
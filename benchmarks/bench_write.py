@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the MIDI writer: time to write segment files of a track set
+with ``write_smf`` against the previous writer, which built a
+``pretty_midi.Note`` per note and wrote the file with ``pretty_midi``.
+
+    python benchmarks/bench_write.py --files 200 --notes 500
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pretty_midi
+
+# The benchmarks run from a checkout, without installing midiplot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import midiplot
+
+from bench_pianoroll import synthetic_tracks
+
+
+def legacy_write(tracks, path):
+
+    """Per note writer of midiplot 0.0, one instrument per track."""
+
+    midi = pretty_midi.PrettyMIDI()
+    for track in tracks.values():
+        instrument = pretty_midi.Instrument(program=0)
+        for n in range(len(track["pitch"])):
+            instrument.notes.append(pretty_midi.Note(velocity=100,
+                                                     pitch=int(track["pitch"][n]),
+                                                     start=track["note_on"][n],
+                                                     end=track["note_off"][n]))
+        midi.instruments.append(instrument)
+    midi.write(path)
+
+
+def smf_write(tracks, path):
+
+    with open(path, 'wb') as f:
+        f.write(midiplot.write_smf(tracks))
+
+
+def run(tracks, writer, n_files, out_dir):
+
+    """Writes ``n_files`` files and returns the seconds per file."""
+
+    start = time.perf_counter()
+    for i in range(n_files):
+        writer(tracks, os.path.join(out_dir, '{}.mid'.format(i)))
+
+    return (time.perf_counter() - start) / n_files
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--notes', type=int, nargs='+', default=[100, 500, 5000])
+    args = parser.parse_args()
+
+    print('{:>8} {:>10} {:>12}'.format('notes', 'writer', 'ms / file'))
+    with tempfile.TemporaryDirectory() as out_dir:
+        for n_notes in args.notes:
+            tracks = synthetic_tracks(n_notes)
+            for name, writer in (('write_smf', smf_write), ('legacy', legacy_write)):
+                seconds = run(tracks, writer, args.files, out_dir)
+                print('{:>8} {:>10} {:>12.3f}'.format(n_notes, name, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
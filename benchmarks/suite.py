@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of midiplot on synthetic MIDI files of ``synthetic.py``. It
+times every stage of the library, from parsing to plotting and writing, for
+each combination of number of notes and tempo changes, and measures the
+peak memory traced by ``tracemalloc`` in a separate run. The results,
+including how the time of each benchmark scales with the number of notes,
+are written as JSON so releases can be compared.
+
+    python benchmarks/suite.py --notes 1000 10000 --out results.json
+    python benchmarks/suite.py --notes 1000 10000 --compare results.json
+
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+
+# The benchmarks run from a checkout, without installing midiplot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import midiplot
+
+from synthetic import synthetic_midi
+
+
+def _plot(method, *args, **kwargs):
+
+    """Plots with ``method`` of a ``Pianoroll`` without pyplot and renders
+    the figure to PNG."""
+
+    pianoroll = midiplot.Pianoroll(pyplot=False)
+    fig, _ = getattr(pianoroll, method)(*args, **kwargs)
+    fig.savefig(io.BytesIO(), format='png')
+    pianoroll.close(fig)
+
+
+def _benchmarks():
+
+    """Returns the ``(name, factory)`` pairs of the benchmarks. A factory
+    gets the context of a case, does the setup which is not timed and
+    returns the function which is timed."""
+
+    def parse(engine, **kwargs):
+        return lambda ctx: lambda: midiplot.MidiProcessing(ctx["data"], engine=engine, **kwargs)
+
+    def midi_method(method, *args, **kwargs):
+        def factory(ctx):
+            midi = midiplot.MidiProcessing(ctx["data"], engine='fast')
+            return lambda: getattr(midi, method)(*args, **kwargs)
+        return factory
+
+    def plot(method, tracks='all', **kwargs):
+        def factory(ctx):
+            all_tracks = ctx["tracks"]
+            first, second = all_tracks[0], all_tracks[len(all_tracks) - 1]
+            if tracks == 'all':
+                args = (all_tracks,)
+            elif tracks == 'one':
+                args = (second,)
+            else:
+                args = (first, second)
+            if kwargs.get("axis") == 'bar':
+                kwargs["tempo_map"] = ctx["tempo_map"]
+            return lambda: _plot(method, *args, **kwargs)
+        return factory
+
+    def html(method, tracks='all', **kwargs):
+        def factory(ctx):
+            pianoroll = midiplot.Pianoroll()
+            track = ctx["tracks"] if tracks == 'all' else ctx["tracks"][0]
+            return lambda: getattr(pianoroll, method)(track, show=False, **kwargs)
+        return factory
+
+    def html_export(ctx):
+        pianoroll = midiplot.Pianoroll()
+        def run():
+            fig = pianoroll.plot_all_tracks_html(ctx["tracks"], show=False)
+            fig.write_html(os.path.join(ctx["tmp_dir"], 'plot.html'), include_plotlyjs='cdn')
+        return run
+
+    def page(method, **kwargs):
+        def factory(ctx):
+            pianoroll = midiplot.Pianoroll()
+            return lambda: getattr(pianoroll, method)(ctx["tracks"], ctx["tmp_dir"], **kwargs)
+        return factory
+
+    def write(function):
+        return lambda ctx: lambda: function(ctx["tracks"], tempo_map=ctx["tempo_map"])
+
+    def save(ctx):
+        cut = midiplot.MidiProcessing(ctx["data"], engine='fast').cut_midi_bars(0, 8)
+        return lambda: midiplot.savemiditrack(cut, ctx["tmp_dir"] + os.sep, 'cut')
+
+    def export(ctx):
+        path = os.path.join(ctx["tmp_dir"], 'synthetic.mid')
+        with open(path, 'wb') as f:
+            f.write(ctx["data"])
+        return lambda: midiplot.export_pianorolls([path], ctx["tmp_dir"], formats=('png', 'html'),
+                                                  max_workers=0)
+
+    return [
+            ('MidiProcessing.pretty_midi',          parse('pretty_midi')),
+            ('MidiProcessing.fast',                 parse('fast')),
+            ('MidiProcessing.lazy',                 parse('fast', lazy=True)),
+            ('read_smf.compact',                    lambda ctx: lambda: midiplot.read_smf(ctx["data"], compact=True)),
+            ('get_tracks',                          midi_method('get_tracks')),
+            ('get_bars',                            midi_method('get_bars')),
+            ('cut_midi_bars',                       midi_method('cut_midi_bars', 2, 6)),
+            ('cut_midi_bars.ranges',                lambda ctx: midi_method('cut_midi_bars', ranges=[(b, min(b + 4, ctx["n_bars"])) for b in range(0, ctx["n_bars"], 4)])(ctx)),
+            ('cut_initial_silence',                 midi_method('cut_initial_silence')),
+            ('cut_initial_silence.all_tracks',      midi_method('cut_initial_silence', all_tracks=True)),
+            ('get_pianoroll',                       midi_method('get_pianoroll')),
+            ('plot_singletrack_pianoroll',          plot('plot_singletrack_pianoroll', tracks='one')),
+            ('overlap_multitrack_pianorolls',       plot('overlap_multitrack_pianorolls', tracks='two')),
+            ('plot_all_tracks',                     plot('plot_all_tracks')),
+            ('plot_all_tracks.bar',                 plot('plot_all_tracks', axis='bar')),
+            ('plot_all_tracks.raster',              plot('plot_all_tracks', render='raster')),
+            ('subplot_pianoroll',                   plot('subplot_pianoroll', tracks='two')),
+            ('plot_singletrack_pianoroll_html',     html('plot_singletrack_pianoroll_html', tracks='one')),
+            ('plot_all_tracks_html',                html('plot_all_tracks_html')),
+            ('html_export',                         html_export),
+            ('plot_all_tracks_tiles_html',          page('plot_all_tracks_tiles_html', include_plotlyjs='cdn')),
+            ('plot_all_tracks_canvas_html',         page('plot_all_tracks_canvas_html')),
+            ('export_pianorolls',                   export),
+            ('writemidtrack',                       write(midiplot.writemidtrack)),
+            ('savemiditrack',                       save),
+            ('write_smf',                           write(midiplot.write_smf)),
+           ]
+
+
+def run_benchmark(factory, ctx, repeat):
+
+    """Returns the times in seconds of ``repeat`` runs of a benchmark and the
+    peak of memory traced by ``tracemalloc`` in bytes of one more run."""
+
+    times = []
+    for _ in range(repeat):
+        function = factory(ctx)
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    function = factory(ctx)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return times, peak
+
+
+def scaling(results):
+
+    """Returns the exponent ``k`` of ``time ~ notes ** k`` of each benchmark
+    and number of tempo changes, fitted over the numbers of notes."""
+
+    groups = {}
+    for result in results:
+        key = (result["benchmark"], result["tempo_changes"])
+        if result["seconds"] > 0:
+            groups.setdefault(key, []).append((result["notes"], result["seconds"]))
+
+    exponents = []
+    for (benchmark, tempo_changes), points in groups.items():
+        if len(points) < 2:
+            continue
+        notes, seconds = np.log(np.array(points)).T
+        exponents.append({"benchmark"       :   benchmark,
+                          "tempo_changes"   :   tempo_changes,
+                          "exponent"        :   float(np.polyfit(notes, seconds, 1)[0])})
+
+    return exponents
+
+
+def compare(results, baseline, threshold):
+
+    """Prints the ratio of the time of each benchmark to the baseline and
+    returns the benchmarks slower than ``threshold`` times it."""
+
+    def key(result):
+        return (result["benchmark"], result["notes"], result["tracks"], result["tempo_changes"])
+
+    reference = {key(result): result for result in baseline["results"]}
+    regressions = []
+    print('\n{:<36} {:>8} {:>6} {:>10} {:>10} {:>8}'.format('benchmark', 'notes', 'tempo',
+                                                              'base s', 'now s', 'ratio'))
+    for result in results:
+        base = reference.get(key(result))
+        if base is None:
+            continue
+        ratio = result["seconds"] / base["seconds"] if base["seconds"] else float('inf')
+        print('{:<36} {:>8} {:>6} {:>10.4f} {:>10.4f} {:>8.2f}'.format(
+            result["benchmark"], result["notes"], result["tempo_changes"],
+            base["seconds"], result["seconds"], ratio))
+        if ratio > threshold:
+            regressions.append(result["benchmark"])
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--tracks', type=int, default=4)
+    parser.add_argument('--tempo-changes', type=int, nargs='+', default=[0, 16])
+    parser.add_argument('--duration', type=float, default=None,
+                        help='duration of the files in seconds, 8 notes per second by default '
+                             'up to the longest duration pretty_midi reads')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', default=None,
+                        help='regular expression of the benchmarks to run')
+    parser.add_argument('--out', default=None, help='JSON file of the results')
+    parser.add_argument('--compare', default=None,
+                        help='JSON file of previous results to compare with')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='ratio to the previous time which is a regression')
+    args = parser.parse_args()
+
+    benchmarks = [(name, factory) for name, factory in _benchmarks()
+                  if args.only is None or re.search(args.only, name)]
+
+    results = []
+    print('{:<36} {:>8} {:>6} {:>10} {:>10} {:>10}'.format('benchmark', 'notes', 'tempo',
+                                                            'min s', 'median s', 'peak MB'))
+    for n_notes in args.notes:
+        for n_tempo_changes in args.tempo_changes:
+            data = synthetic_midi(n_notes, args.tracks, n_tempo_changes, args.duration)
+            midi = midiplot.MidiProcessing(data, engine='fast')
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                ctx = {"data"        :   data,
+                       "tracks"      :   midi.get_tracks(),
+                       "tempo_map"   :   midi.tempo_map,
+                       "n_bars"      :   midi.tempo_map.n_bars,
+                       "tmp_dir"     :   tmp_dir}
+                for name, factory in benchmarks:
+                    times, peak = run_benchmark(factory, ctx, args.repeat)
+                    results.append({"benchmark"       :   name,
+                                    "notes"           :   n_notes,
+                                    "tracks"          :   args.tracks,
+                                    "tempo_changes"   :   n_tempo_changes,
+                                    "duration"        :   midi.get_duration(),
+                                    "seconds"         :   min(times),
+                                    "median"          :   statistics.median(times),
+                                    "repeat"          :   args.repeat,
+                                    "peak_bytes"      :   peak})
+                    print('{:<36} {:>8} {:>6} {:>10.4f} {:>10.4f} {:>10.2f}'.format(
+                        name, n_notes, n_tempo_changes, min(times),
+                        statistics.median(times), peak / 2**20))
+
+    report = {"meta"      :   {"midiplot"    :   midiplot.__version__,
+                               "python"      :   platform.python_version(),
+                               "numpy"       :   np.__version__,
+                               "matplotlib"  :   matplotlib.__version__,
+                               "platform"    :   platform.platform(),
+                               "cpus"        :   os.cpu_count(),
+                               "time"        :   time.strftime('%Y-%m-%dT%H:%M:%S')},
+              "results"   :   results,
+              "scaling"   :   scaling(results)}
+
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit('regressions: ' + ', '.join(sorted(set(regressions))))
+
+
+if __name__ == '__main__':
+    main()
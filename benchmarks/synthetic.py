@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic MIDI files for the benchmarks. The same arguments
+always give the same bytes, so the results of different releases can be
+compared.
+
+    python benchmarks/synthetic.py out.mid --notes 10000 --tracks 8 --tempo-changes 16
+
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# The benchmarks run from a checkout, without installing midiplot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import midiplot
+
+# pretty_midi rejects as corrupt a file with a later tick
+MAX_TICK = 10 ** 7
+MAX_BPM = 180
+
+
+def max_duration(resolution=480):
+
+    """This function returns the longest duration in seconds of a synthetic
+    file whose last tick ``pretty_midi`` accepts whatever its tempi, with a
+    quarter note to spare for the rounding of the ticks."""
+
+    return (MAX_TICK - resolution) / (resolution * MAX_BPM / 60)
+
+
+def synthetic_midi(n_notes, n_tracks=4, n_tempo_changes=0, duration=None,
+                   drums=True, seed=0, resolution=480):
+
+    """This function returns the bytes of a random MIDI file.
+
+    Parameters
+    ----------
+    n_notes : int
+        Number of notes of the file, split evenly between the tracks.
+    n_tracks : int
+        Number of tracks. Default ``4``.
+    n_tempo_changes : int
+        Number of tempo changes after the initial tempo, evenly spaced, with
+        random tempi between 60 and 180 bpm. Every other one also changes
+        the time signature between ``4/4`` and ``3/4``. Default ``0``.
+    duration : float
+        Duration in seconds. Default ``None`` which means 8 notes per
+        second, but no longer than ``max_duration(resolution)``, so
+        ``pretty_midi`` can read the file.
+    drums : bool
+        The first track is a drum track named ``drums``. Default ``True``.
+    seed : int
+        Seed of the random generator. Default ``0``.
+    resolution : int
+        Ticks per quarter note. Default ``480``.
+
+    Returns
+    -------
+    data : bytes
+        Contents of the MIDI file.
+    """
+
+    rng = np.random.default_rng(seed)
+    if duration is None:
+        duration = min(max(n_notes / 8, 1.), max_duration(resolution))
+
+    change_times = np.linspace(0, duration, n_tempo_changes + 2)[:-1]
+    tempi = np.round(rng.uniform(60, MAX_BPM, len(change_times)), 1)
+    tempi[0] = 120.
+    time_signatures = [(4, 4, 0.)] + [((3, 4) if i % 4 == 0 else (4, 4)) + (float(time),)
+                                      for i, time in enumerate(change_times[1:]) if i % 2 == 0]
+    tempo_map = midiplot.TempoMap(change_times, tempi, time_signatures, duration)
+
+    tracks = {}
+    counts = np.diff(np.linspace(0, n_notes, n_tracks + 1).astype(int))
+    for n, count in enumerate(counts):
+        is_drum = drums and n == 0
+        note_on = np.sort(rng.uniform(0, duration, count))
+        length = rng.uniform(0.02, 0.1, count) if is_drum else rng.uniform(0.1, 2, count)
+        tracks[n] = {"n_track"       :   n,
+                     "n_program"     :   0 if is_drum else int(rng.integers(0, 128)),
+                     "track_name"    :   'drums' if is_drum else 'track {}'.format(n),
+                     "is_drum"       :   is_drum,
+                     "pitch"         :   rng.integers(35, 82, count) if is_drum
+                                         else rng.integers(24, 108, count),
+                     "note_on"       :   note_on,
+                     "note_off"      :   np.minimum(note_on + length, duration),
+                     "velocity"      :   rng.integers(1, 128, count)}
+
+    return midiplot.write_smf(tracks, tempo_map=tempo_map, resolution=resolution)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--notes', type=int, default=10000)
+    parser.add_argument('--tracks', type=int, default=4)
+    parser.add_argument('--tempo-changes', type=int, default=0)
+    parser.add_argument('--duration', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.path, 'wb') as f:
+        f.write(synthetic_midi(args.notes, args.tracks, args.tempo_changes,
+                               args.duration, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
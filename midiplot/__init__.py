@@ -43,13 +43,85 @@ Tutorials can be found in the source tree's `examples directory
    :undoc-members:
        
        
+``midipianorolls.MidiCorpus``
+==========================
+
+.. autoclass:: MidiCorpus
+   :members:
+       
+       
+``midipianorolls.NoteCache``
+==========================
+
+.. autoclass:: NoteCache
+   :members:
+       
+       
+``midipianorolls.NoteTable``
+==========================
+
+.. autoclass:: NoteTable
+   :members:
+       
+       
+``midipianorolls.CompactNoteTable``
+==========================
+
+.. autoclass:: CompactNoteTable
+   :members:
+       
+       
+``midipianorolls.TempoMap``
+==========================
+
+.. autoclass:: TempoMap
+   :members:
+       
+       
+``midipianorolls.TilePyramid``
+==========================
+
+.. autoclass:: TilePyramid
+   :members:
+       
+       
 Utility functions
 =================
 .. autofunction:: writemidtrack
 .. autofunction:: savemiditrack
+.. autofunction:: read_smf
+.. autofunction:: scan_smf
+.. autofunction:: write_smf
+.. autofunction:: iter_archive
+.. autofunction:: piano_roll
+.. autofunction:: piano_roll_runs
+.. autofunction:: runs_to_piano_roll
+.. autofunction:: canvas_html
+.. autofunction:: write_canvas_html
+.. autofunction:: export_pianorolls
+.. autofunction:: export_pianoroll_tiles
+
+
+Instrumentation
+===============
+.. autofunction:: midiplot.metrics.record
+.. autofunction:: midiplot.metrics.span
+.. autofunction:: midiplot.metrics.timed
+.. autofunction:: midiplot.metrics.count
+.. autoclass:: midiplot.metrics.Recorder
+   :members:
 
 """
 
 from .midiprocessing import *
-
-__version__ = '0.0'
\ No newline at end of file
+from .notetable import NoteTable, CompactNoteTable, NOTE_DTYPE, COMPACT_DTYPE
+from .smf import read_smf, scan_smf, write_smf
+from .cache import NoteCache
+from .corpus import MidiCorpus, iter_archive
+from .export import export_pianorolls, export_pianoroll_tiles
+from .tempomap import TempoMap
+from .tiles import TilePyramid
+from .canvas import canvas_html, write_canvas_html
+from . import metrics
+from .roll import piano_roll, piano_roll_runs, runs_to_piano_roll, RUN_DTYPE
+from .version import __version__
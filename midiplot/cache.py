@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides an on-disk cache of the notes, tracks and tempo map
+extracted from MIDI files, so a file which has already been opened is not
+parsed again. The notes are stored in ticks, in the layout of
+``CompactNoteTable``, as ``.npy`` files which are memory-mapped when they are
+loaded, so worker processes opening the same file share their pages.
+
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .notetable import CompactNoteTable
+from .smf import SMFData
+from .version import __version__
+
+
+# Bump when the layout of the cached files changes
+CACHE_FORMAT = 2
+
+
+def default_cache_dir():
+
+    """This function returns the default cache directory:
+    ``$MIDIPLOT_CACHE_DIR`` if it is set, ``~/.cache/midiplot`` otherwise.
+    """
+
+    return os.environ.get('MIDIPLOT_CACHE_DIR',
+                          os.path.join(os.path.expanduser('~'), '.cache', 'midiplot'))
+
+
+class NoteCache:
+
+    """This class stores the data extracted from MIDI files in a directory.
+    Entries are keyed by the content hash of the MIDI file and the version of
+    the library, and the least recently used entries are removed when the
+    cache grows over ``max_bytes``.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory of the cache. Default ``None`` which means
+        ``default_cache_dir()``.
+    max_bytes : int
+        Maximum size in bytes of the cache. Default 1 GB.
+
+    Examples
+    --------
+    >>> cache = midiplot.NoteCache('/tmp/midiplot', max_bytes=2**28)
+    >>> midi = midiplot.MidiProcessing('midi.mid', cache=cache)
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=2**30):
+
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+
+
+    def key(self, data):
+
+        """This function returns the cache key of the contents of a MIDI
+        file.
+
+        Parameters
+        ----------
+        data : bytes
+            Contents of the MIDI file.
+
+        Returns
+        -------
+        key : str
+            Hex digest of the contents, the library version and the cache
+            format.
+        """
+
+        digest = hashlib.sha256(data)
+        digest.update('{}/{}'.format(__version__, CACHE_FORMAT).encode())
+
+        return digest.hexdigest()
+
+
+    def _paths(self, key):
+
+        base = os.path.join(self.cache_dir, key)
+
+        return base + '.npy', base + '.json'
+
+
+    def load(self, key):
+
+        """This function loads a cache entry. The notes are memory-mapped
+        read-only in a ``CompactNoteTable`` and are not copied, so processes
+        loading the same entry share their pages. ``SMFData.to_seconds``
+        converts them to a ``NoteTable``.
+
+        Parameters
+        ----------
+        key : str
+            Cache key returned by ``key``.
+
+        Returns
+        -------
+        smf : SMFData or None
+            Cached data, ``None`` if the key is not in the cache.
+        """
+
+        notes_path, meta_path = self._paths(key)
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            notes = np.load(notes_path, mmap_mode='r')
+            # Mark the entry as recently used. An entry evicted meanwhile
+            # by another process is a miss.
+            for path in (notes_path, meta_path):
+                os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        tick_scales = [tuple(scale) for scale in meta["tick_scales"]]
+        note_table = CompactNoteTable(notes,
+                                      meta["offsets"],
+                                      meta["programs"],
+                                      meta["names"],
+                                      meta["is_drum"],
+                                      tick_scales)
+
+        return SMFData(meta["resolution"],
+                       note_table,
+                       tick_scales,
+                       [tuple(ts) for ts in meta["time_signatures"]],
+                       meta["end_time"])
+
+
+    def store(self, key, smf):
+
+        """This function stores the data of a MIDI file in the cache and
+        evicts the least recently used entries if the cache is too big.
+
+        Parameters
+        ----------
+        key : str
+            Cache key returned by ``key``.
+        smf : SMFData
+            Data of the MIDI file.
+        """
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        notes_path, meta_path = self._paths(key)
+        table = smf.compact().note_table
+        meta = {"resolution"        :   smf.resolution,
+                "tick_scales"       :   [list(scale) for scale in smf.tick_scales],
+                "time_signatures"   :   [list(ts) for ts in smf.time_signatures],
+                "end_time"          :   smf.end_time,
+                "offsets"           :   table.offsets.tolist(),
+                "programs"          :   table.programs,
+                "names"             :   table.names,
+                "is_drum"           :   table.is_drum}
+
+        # Write to temporary files and rename them so concurrent readers
+        # never see a partial entry. The metadata goes last because it marks
+        # the entry as complete.
+        tmp_suffix = '.{}.tmp'.format(os.getpid())
+        with open(notes_path + tmp_suffix, 'wb') as f:
+            np.save(f, np.ascontiguousarray(table.notes))
+        os.replace(notes_path + tmp_suffix, notes_path)
+        with open(meta_path + tmp_suffix, 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + tmp_suffix, meta_path)
+
+        self.evict()
+
+
+    def _entries(self):
+
+        """This function returns the ``(last use, size, key)`` of every entry
+        of the cache."""
+
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(name)
+            if ext in ('.npy', '.json'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                last_use, size = entries.get(key, (0, 0))
+                entries[key] = (max(last_use, stat.st_mtime), size + stat.st_size)
+
+        return [(last_use, size, key) for key, (last_use, size) in entries.items()]
+
+
+    def _remove(self, key):
+
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+    def size(self):
+
+        """This function returns the size in bytes of the cache."""
+
+        if not os.path.isdir(self.cache_dir):
+            return 0
+
+        return sum(size for _, size, _ in self._entries())
+
+
+    def evict(self):
+
+        """This function removes the least recently used entries until the
+        cache is smaller than ``max_bytes``.
+        """
+
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+
+
+    def clear(self):
+
+        """This function removes every entry of the cache."""
+
+        if os.path.isdir(self.cache_dir):
+            for _, _, key in self._entries():
+                self._remove(key)
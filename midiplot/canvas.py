@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+This file writes self-contained HTML pianorolls drawn with a small canvas
+script. The notes are embedded as base64 typed arrays, so the pages are small,
+render immediately and do not need plotly.
+
+"""
+
+import base64
+import html
+import json
+import os
+
+import numpy as np
+
+from . import metrics
+
+
+def _b64(array):
+
+    """This function returns the bytes of an array in base64, decoded by the
+    pages into a typed array of the same dtype."""
+
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode('ascii')
+
+
+def _script_json(obj):
+
+    """This function returns ``obj`` as JSON which can be embedded in a
+    ``<script>`` element: track names and titles come from the MIDI files
+    and must not be able to close the element."""
+
+    return json.dumps(obj).replace('</', '<\\/').replace('<!--', '<\\!--')
+
+
+def _track_numbers(counts):
+
+    """This function returns the uint16 number of the track of each note,
+    given the number of notes of each track."""
+
+    if len(counts) > 2 ** 16:
+        raise ValueError('at most {} tracks can be drawn, got {}.'.format(2 ** 16, len(counts)))
+
+    return np.repeat(np.arange(len(counts), dtype=np.uint16), counts)
+
+
+def canvas_html(tracks, note_x=None, plot_title='', xaxis_title='time',
+                colors=None, edge_colors=None):
+
+    """This function returns a self-contained HTML page with the pianoroll
+    of several tracks. The plot can be panned by dragging, zoomed with the
+    mouse wheel (holding shift zooms the pitch axis) and reset with a double
+    click, and the hover shows the data of each note.
+
+    Parameters
+    ----------
+    tracks : dict
+        Tracks returned by ``MidiProcessing.get_tracks``.
+    note_x : list of (np.ndarray, np.ndarray)
+        Onsets and offsets of the notes of each track in the units of the x
+        axis. Default ``None`` which means the times in seconds.
+    plot_title : str
+        Title of the plot. Default ``''`` no title.
+    xaxis_title : str
+        Title of the x axis. Default ``time``.
+    colors : list of strs
+        Color of the notes of each track. Default ``None`` which means
+        ``midiprocessing.COLOR``.
+    edge_colors : list of strs
+        Color of the borders of the notes of each track. Default ``None``
+        which means ``midiprocessing.COLOR_EDGES``.
+
+    Returns
+    -------
+    html : str
+        HTML page.
+    """
+
+    from .midiprocessing import COLOR, COLOR_EDGES
+
+    keys = list(tracks.keys())
+    if note_x is None:
+        note_x = [(tracks[key]["note_on"], tracks[key]["note_off"]) for key in keys]
+    colors = colors if colors is not None else [COLOR[key % len(COLOR)] for key in keys]
+    edge_colors = edge_colors if edge_colors is not None else \
+        [COLOR_EDGES[key % len(COLOR_EDGES)] for key in keys]
+
+    counts = [len(tracks[key]["pitch"]) for key in keys]
+    x0 = np.concatenate([np.asarray(on, dtype=np.float32) for on, _ in note_x] + [np.empty(0, np.float32)])
+    x1 = np.concatenate([np.asarray(off, dtype=np.float32) for _, off in note_x] + [np.empty(0, np.float32)])
+    pitch = np.concatenate([np.asarray(tracks[key]["pitch"]) for key in keys] + [np.empty(0)])
+    velocity = np.concatenate([np.asarray(tracks[key]["velocity"]) if "velocity" in tracks[key]
+                               else np.full(count, 100) for key, count in zip(keys, counts)]
+                              + [np.empty(0)])
+    track = _track_numbers(counts)
+
+    # Sorted by onset so the page only scans the notes of the view
+    order = np.argsort(x0, kind='stable')
+
+    data = {"title"         :   plot_title,
+            "xaxis_title"   :   xaxis_title,
+            "names"         :   [tracks[key]["track_name"] for key in keys],
+            "programs"      :   [int(tracks[key]["n_program"]) for key in keys],
+            "colors"        :   colors,
+            "edge_colors"   :   edge_colors,
+            "x0"            :   _b64(x0[order]),
+            "x1"            :   _b64(x1[order]),
+            "pitch"         :   _b64(pitch[order].astype(np.uint8)),
+            "velocity"      :   _b64(velocity[order].astype(np.uint8)),
+            "track"         :   _b64(track[order])}
+
+    return _PAGE.replace('{{title}}', html.escape(plot_title or 'pianoroll')) \
+                .replace('{{data}}', _script_json(data))
+
+
+def write_canvas_html(path, tracks, **kwargs):
+
+    """This function writes the page of ``canvas_html`` to disk.
+
+    Parameters
+    ----------
+    path : str
+        Path of the HTML file.
+    tracks : dict
+        Tracks returned by ``MidiProcessing.get_tracks``.
+    **kwargs
+        Arguments of ``canvas_html``.
+
+    Returns
+    -------
+    path : str
+        Path of the HTML file.
+    """
+
+    page = canvas_html(tracks, **kwargs)
+    with metrics.span('write'), open(path, 'w') as f:
+        f.write(page)
+    metrics.count('bytes_written', os.path.getsize(path))
+
+    return path
+
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{{title}}</title>
+<style>
+html, body { margin: 0; height: 100%; background: #111111; color: #f2f5fa; font: 12px sans-serif; overflow: hidden; }
+#plot { position: absolute; left: 0; top: 0; width: 100%; height: 100%; cursor: crosshair; }
+#legend { position: absolute; right: 10px; top: 8px; }
+#legend span { display: inline-block; width: 10px; height: 10px; margin: 0 4px 0 12px; }
+#tip { position: absolute; display: none; pointer-events: none; padding: 4px 6px; background: #000000cc; white-space: pre; }
+</style>
+</head>
+<body>
+<canvas id="plot"></canvas><div id="legend"></div><div id="tip"></div>
+<script>
+(function() {
+var data = {{data}};
+function decode(b64, Type) {
+    var s = atob(b64), bytes = new Uint8Array(s.length);
+    for (var i = 0; i < s.length; i++) bytes[i] = s.charCodeAt(i);
+    return new Type(bytes.buffer);
+}
+var x0 = decode(data.x0, Float32Array), x1 = decode(data.x1, Float32Array);
+var pitch = decode(data.pitch, Uint8Array), velocity = decode(data.velocity, Uint8Array);
+var track = decode(data.track, Uint16Array), n = x0.length;
+
+var maxDur = 0, xMin = 0, xMax = 1, pMin = 127, pMax = 0;
+for (var i = 0; i < n; i++) {
+    maxDur = Math.max(maxDur, x1[i] - x0[i]);
+    xMax = Math.max(xMax, x1[i]);
+    pMin = Math.min(pMin, pitch[i]); pMax = Math.max(pMax, pitch[i]);
+}
+if (n) xMin = Math.min(0, x0[0]);
+if (pMin > pMax) { pMin = 0; pMax = 127; }
+var home = [xMin, xMax, Math.max(pMin - 1, 0), Math.min(pMax + 2, 128)];
+var view = home.slice();
+
+var canvas = document.getElementById('plot'), ctx = canvas.getContext('2d');
+var tip = document.getElementById('tip'), margin = {l: 50, r: 10, t: 34, b: 36};
+
+var legend = document.getElementById('legend');
+data.names.forEach(function(name, t) {
+    var swatch = document.createElement('span');
+    swatch.style.background = data.colors[t];
+    legend.appendChild(swatch);
+    legend.appendChild(document.createTextNode(name));
+});
+
+function lowerBound(x) {
+    var lo = 0, hi = n;
+    while (lo < hi) { var mid = (lo + hi) >> 1; if (x0[mid] < x) lo = mid + 1; else hi = mid; }
+    return lo;
+}
+function step(span, pixels) {
+    var raw = span / Math.max(pixels / 80, 1), p = Math.pow(10, Math.floor(Math.log10(raw)));
+    return raw / p >= 5 ? 5 * p : raw / p >= 2 ? 2 * p : p;
+}
+function px(x) { return margin.l + (x - view[0]) / (view[1] - view[0]) * (canvas.width - margin.l - margin.r); }
+function py(y) { return canvas.height - margin.b - (y - view[2]) / (view[3] - view[2]) * (canvas.height - margin.t - margin.b); }
+
+function draw() {
+    var dpr = window.devicePixelRatio || 1;
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+    ctx.fillStyle = '#111111'; ctx.fillRect(0, 0, canvas.width, canvas.height);
+    ctx.fillStyle = '#282828';
+    ctx.fillRect(margin.l, margin.t, canvas.width - margin.l - margin.r, canvas.height - margin.t - margin.b);
+
+    // Grid and ticks
+    ctx.strokeStyle = '#ffffff22'; ctx.fillStyle = '#f2f5fa'; ctx.font = 11 * dpr + 'px sans-serif';
+    var sx = step(view[1] - view[0], canvas.width), sy = Math.max(1, Math.round(step(view[3] - view[2], canvas.height / 2)));
+    ctx.beginPath();
+    for (var x = Math.ceil(view[0] / sx) * sx; x <= view[1]; x += sx) {
+        ctx.moveTo(px(x), margin.t); ctx.lineTo(px(x), canvas.height - margin.b);
+        ctx.fillText(+x.toFixed(6), px(x) - 8, canvas.height - margin.b + 14 * dpr);
+    }
+    for (var y = Math.ceil(view[2] / sy) * sy; y <= view[3]; y += sy) {
+        ctx.moveTo(margin.l, py(y)); ctx.lineTo(canvas.width - margin.r, py(y));
+        ctx.fillText(y, 4 * dpr, py(y) + 4 * dpr);
+    }
+    ctx.stroke();
+    ctx.fillText(data.xaxis_title, canvas.width / 2, canvas.height - 6 * dpr);
+    ctx.fillText(data.title, margin.l, 20 * dpr);
+
+    // Notes of the view
+    ctx.save();
+    ctx.beginPath();
+    ctx.rect(margin.l, margin.t, canvas.width - margin.l - margin.r, canvas.height - margin.t - margin.b);
+    ctx.clip();
+    var first = lowerBound(view[0] - maxDur), last = lowerBound(view[1]), h = py(0) - py(1);
+    ctx.globalAlpha = 0.5;
+    for (var i = first; i < last; i++) {
+        if (x1[i] < view[0] || pitch[i] + 1 < view[2] || pitch[i] > view[3]) continue;
+        var left = px(x0[i]), w = Math.max(px(x1[i]) - left, 1), top = py(pitch[i] + 1);
+        ctx.fillStyle = data.colors[track[i]];
+        ctx.fillRect(left, top, w, h);
+        if (w > 3 && h > 3) { ctx.strokeStyle = data.edge_colors[track[i]]; ctx.strokeRect(left, top, w, h); }
+    }
+    ctx.restore();
+}
+
+function resize() {
+    var dpr = window.devicePixelRatio || 1;
+    canvas.width = canvas.clientWidth * dpr; canvas.height = canvas.clientHeight * dpr;
+    margin = {l: 50 * dpr, r: 10 * dpr, t: 34 * dpr, b: 36 * dpr};
+    draw();
+}
+
+function toData(event) {
+    var dpr = window.devicePixelRatio || 1, r = canvas.getBoundingClientRect();
+    var cx = (event.clientX - r.left) * dpr, cy = (event.clientY - r.top) * dpr;
+    return [view[0] + (cx - margin.l) / (canvas.width - margin.l - margin.r) * (view[1] - view[0]),
+            view[2] + (canvas.height - margin.b - cy) / (canvas.height - margin.t - margin.b) * (view[3] - view[2])];
+}
+
+var drag = null;
+canvas.addEventListener('mousedown', function(event) { drag = [event.clientX, event.clientY, view.slice()]; });
+window.addEventListener('mouseup', function() { drag = null; });
+canvas.addEventListener('mousemove', function(event) {
+    if (drag) {
+        var dpr = window.devicePixelRatio || 1, v = drag[2];
+        var dx = (drag[0] - event.clientX) * dpr / (canvas.width - margin.l - margin.r) * (v[1] - v[0]);
+        var dy = (event.clientY - drag[1]) * dpr / (canvas.height - margin.t - margin.b) * (v[3] - v[2]);
+        view = [v[0] + dx, v[1] + dx, v[2] + dy, v[3] + dy];
+        tip.style.display = 'none';
+        draw();
+        return;
+    }
+    var p = toData(event);
+    var hit = -1, first = lowerBound(p[0] - maxDur), last = lowerBound(p[0] + 1e-9);
+    for (var i = last - 1; i >= first; i--) {
+        if (x1[i] >= p[0] && pitch[i] == Math.floor(p[1])) { hit = i; break; }
+    }
+    if (hit < 0) { tip.style.display = 'none'; return; }
+    tip.textContent = data.names[track[hit]] + ' ' + data.programs[track[hit]] +
+        '\\non ' + x0[hit].toFixed(3) + '\\noff ' + x1[hit].toFixed(3) +
+        '\\npitch ' + pitch[hit] + '\\nvelocity ' + velocity[hit];
+    tip.style.left = event.clientX + 12 + 'px'; tip.style.top = event.clientY + 12 + 'px';
+    tip.style.display = 'block';
+});
+canvas.addEventListener('wheel', function(event) {
+    event.preventDefault();
+    var p = toData(event), k = Math.exp(event.deltaY * 0.002);
+    if (event.shiftKey) view = [view[0], view[1], p[1] - (p[1] - view[2]) * k, p[1] + (view[3] - p[1]) * k];
+    else view = [p[0] - (p[0] - view[0]) * k, p[0] + (view[1] - p[0]) * k, view[2], view[3]];
+    draw();
+}, {passive: false});
+canvas.addEventListener('dblclick', function() { view = home.slice(); draw(); });
+window.addEventListener('resize', resize);
+resize();
+})();
+</script>
+</body>
+</html>
+"""
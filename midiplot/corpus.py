@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides tools to load many MIDI files, from directories or 
+straight from zip and tar archives, in parallel.
+
+"""
+
+import fnmatch
+import glob
+import itertools
+import os
+import tarfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .midiprocessing import MidiProcessing
+
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_archive(path):
+
+    """This function tells if a path is a zip or tar archive by its
+    extension.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+
+    Returns
+    -------
+    is_archive : bool
+        Is it an archive?
+    """
+
+    return isinstance(path, str) and path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _archive_names(archive):
+
+    """This function returns the names of the files of an archive."""
+
+    if archive.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive) as f:
+            return [info.filename for info in f.infolist() if not info.is_dir()]
+
+    with tarfile.open(archive) as f:
+        return [info.name for info in f.getmembers() if info.isfile()]
+
+
+def iter_archive(archive, members=None, pattern=('*.mid', '*.midi')):
+
+    """This function iterates over the MIDI files of a zip or tar archive
+    without extracting it. The contents of each member are read in memory
+    and can be given to ``MidiProcessing``. Tar archives are read in a
+    single pass, in the order of the archive.
+
+    Parameters
+    ----------
+    archive : str
+        Path of the zip or tar (optionally compressed) archive.
+    members : list of strs
+        Names of the members to read. Default ``None`` which means every
+        member that matches ``pattern``.
+    pattern : str or tuple of strs
+        Glob patterns of the names of the members. Default ``('*.mid', 
+        '*.midi')``.
+
+    Yields
+    ------
+    name : str
+        Name of the member in the archive.
+    data : bytes
+        Contents of the member.
+
+    Examples
+    --------
+    >>> for name, data in midiplot.iter_archive('dataset.tar.gz'):
+    ...     midi = midiplot.MidiProcessing(data, engine='fast')
+    """
+
+    if isinstance(pattern, str):
+        pattern = (pattern,)
+    if members is not None:
+        members = set(members)
+
+    def wanted(name):
+        if members is not None:
+            return name in members
+        return any(fnmatch.fnmatch(name.lower(), p) for p in pattern)
+
+    if archive.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive) as f:
+            for info in f.infolist():
+                if not info.is_dir() and wanted(info.filename):
+                    yield info.filename, f.read(info)
+        return
+
+    with tarfile.open(archive) as f:
+        for info in f:
+            if info.isfile() and wanted(info.name):
+                yield info.name, f.extractfile(info).read()
+
+
+def _map_batches(function, batches, args, max_workers, ordered=True):
+
+    """This function yields ``function(batch, *args)`` of each batch,
+    computed in a pool of ``max_workers`` processes (``0`` computes them in
+    the calling process). Batches are taken from the iterable only when
+    there are less than two per worker in flight, so the members of an
+    archive are read in a single pass as the workers need them. The
+    results are in the order of the batches if ``ordered``, otherwise as
+    soon as they are computed."""
+
+    if max_workers == 0:
+        for batch in batches:
+            yield function(batch, *args)
+        return
+
+    batches = iter(batches)
+    window = 2 * (max_workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers) as executor:
+        pending = [executor.submit(function, batch, *args)
+                   for batch in itertools.islice(batches, window)]
+        while pending:
+            if ordered:
+                future = pending.pop(0)
+            else:
+                future = next(iter(wait(pending, return_when=FIRST_COMPLETED).done))
+                pending.remove(future)
+            pending.extend(executor.submit(function, batch, *args)
+                           for batch in itertools.islice(batches, 1))
+            yield future.result()
+
+
+def _load_batch(sources, engine, cache, compact=False):
+
+    """This function extracts the data of a batch of ``(path, source)``
+    pairs of MIDI files in a worker process. Only the arrays and track
+    metadata are sent back to the parent process, not ``pretty_midi``
+    objects. A file which cannot be parsed is returned with its error in
+    the failed files instead."""
+
+    results = []
+    failed = []
+    for path, source in sources:
+        try:
+            midi = MidiProcessing(source, engine=engine, cache=cache)
+            smf = midi._smf.compact() if compact else midi._smf.to_seconds()
+        except Exception as error:
+            failed.append((path, '{}: {}'.format(type(error).__name__, error)))
+            continue
+        results.append((path, smf))
+
+    return results, failed
+
+
+class MidiCorpus:
+
+    """This class loads the MIDI files of a directory, a glob pattern, a
+    list of paths or a zip or tar archive in a pool of processes.
+
+    Each file is returned as a ``(path, smf)`` pair, where ``smf`` is a
+    ``smf.SMFData`` with the ``note_table``, tempo map and duration of the
+    file. The files of an archive are read in memory, without extracting
+    them, in a single pass in the order of the archive, and their paths are
+    their names in the archive. Files which cannot be parsed are skipped
+    and listed with their error in ``failed`` during the iteration.
+
+    Parameters
+    ----------
+    source : str or list of strs
+        Directory (searched recursively for ``.mid`` and ``.midi`` files,
+        whatever the case of the extension),
+        glob pattern, list of paths of MIDI files or path of a zip or tar
+        archive (see ``ARCHIVE_EXTENSIONS``).
+    max_workers : int
+        Number of worker processes. Default ``None`` which means the number
+        of CPUs. ``0`` loads the files in the calling process.
+    engine : str
+        Engine of ``MidiProcessing`` used to parse the files. Default
+        ``fast``.
+    cache : bool or NoteCache
+        Cache of ``MidiProcessing``. Default ``None``.
+    batch_size : int
+        Number of files sent to a worker at once. Default ``16``.
+    compact : bool
+        Returns the notes of each file in a ``CompactNoteTable``, with times
+        in ticks, which takes less memory to keep a whole corpus loaded.
+        Default ``False``.
+
+    Examples
+    --------
+    >>> corpus = midiplot.MidiCorpus('dataset/', max_workers=8)
+    >>> for path, smf in corpus:
+    ...     print(path, len(smf.note_table))
+    >>> corpus.stats()
+    """
+
+    def __init__(self, source, max_workers=None, engine='fast', cache=None,
+                 batch_size=16, compact=False):
+
+        self.archive = None
+        if is_archive(source):
+            self.archive = source
+            paths = [name for name in _archive_names(source)
+                     if name.lower().endswith(('.mid', '.midi'))]
+        elif isinstance(source, str):
+            if os.path.isdir(source):
+                paths = [path for path in glob.glob(os.path.join(source, '**', '*'),
+                                                    recursive=True)
+                         if path.lower().endswith(('.mid', '.midi')) and os.path.isfile(path)]
+            else:
+                paths = glob.glob(source, recursive=True)
+            paths = sorted(paths)
+        else:
+            paths = list(source)
+
+        self.paths = paths
+        self.max_workers = max_workers
+        self.engine = engine
+        self.cache = cache
+        self.batch_size = batch_size
+        self.compact = compact
+        self.failed = []
+
+
+    def __len__(self):
+
+        return len(self.paths)
+
+
+    def _batches(self, batch_size=None):
+
+        """This function yields the files in lists of ``batch_size``
+        ``(path, source)`` pairs, where ``source`` is the path itself or,
+        for the members of an archive, their contents."""
+
+        batch_size = batch_size or self.batch_size
+        if self.archive is None:
+            sources = ((path, path) for path in self.paths)
+        else:
+            sources = iter_archive(self.archive, members=self.paths)
+
+        while True:
+            batch = list(itertools.islice(sources, batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+    def __iter__(self):
+
+        """Iterates over the files in the order of ``paths``."""
+
+        self.failed = []
+        args = (self.engine, self.cache, self.compact)
+        for results, failed in _map_batches(_load_batch, self._batches(), args,
+                                             self.max_workers):
+            self.failed.extend(failed)
+            yield from results
+
+
+    def iter_completed(self):
+
+        """This function iterates over the files as soon as they are loaded,
+        in any order.
+
+        Yields
+        ------
+        path : str
+            Path of the MIDI file.
+        smf : SMFData
+            Data of the MIDI file.
+        """
+
+        self.failed = []
+        args = (self.engine, self.cache, self.compact)
+        for results, failed in _map_batches(_load_batch, self._batches(), args,
+                                             self.max_workers, ordered=False):
+            self.failed.extend(failed)
+            yield from results
+
+
+    def stats(self):
+
+        """This function loads every file of the corpus and returns
+        aggregate statistics.
+
+        Returns
+        -------
+        stats : dict
+            ``n_files``, ``n_tracks``, ``n_notes``, ``total_duration`` in
+            seconds, ``durations`` of every file in the order of ``paths``,
+            ``programs`` histogram of the 128 program numbers of the non drum
+            tracks, ``n_drum_tracks`` and ``n_failed``, the number of files
+            which could not be parsed (see ``failed``), whose duration is 0.
+        """
+
+        index = {path: i for i, path in enumerate(self.paths)}
+        durations = np.zeros(len(self.paths))
+        programs = np.zeros(128, dtype=np.int64)
+        n_tracks = 0
+        n_notes = 0
+        n_drum_tracks = 0
+
+        for path, smf in self.iter_completed():
+            durations[index[path]] = smf.end_time
+            n_tracks += len(smf.programs)
+            n_notes += len(smf.note_table)
+            for program, is_drum in zip(smf.programs, smf.is_drum):
+                if is_drum:
+                    n_drum_tracks += 1
+                else:
+                    programs[program] += 1
+
+        return {"n_files"           :   len(self.paths),
+                "n_tracks"          :   n_tracks,
+                "n_notes"           :   n_notes,
+                "total_duration"    :   float(durations.sum()),
+                "durations"         :   durations,
+                "programs"          :   programs,
+                "n_drum_tracks"     :   n_drum_tracks,
+                "n_failed"          :   len(self.failed)}
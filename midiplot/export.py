@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides a headless batch export of the pianorolls of many MIDI
+files, and of long MIDI files in tiles of fixed duration, rendered in a 
+pool of processes with the Agg backend.
+
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+from . import metrics
+from .canvas import write_canvas_html
+from .corpus import MidiCorpus, _map_batches
+from .midiprocessing import COLOR, MidiProcessing, Pianoroll
+
+
+def _file_name(name, path, track, root=''):
+
+    """This function returns the output file name, without extension, of a
+    file or of one of its tracks. ``root`` is the directory the ``parent``
+    field is relative to."""
+
+    if callable(name):
+        return name(path, track)
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    parent = os.path.relpath(os.path.dirname(path) or '.', root or '.')
+    parent = '' if parent == '.' else parent + os.sep
+    if track is None:
+        return name.format(stem=stem, parent=parent)
+
+    return name.format(stem=stem,
+                       parent=parent,
+                       n_track=track["n_track"],
+                       n_program=track["n_program"],
+                       track_name=re.sub(r'[^\w.-]+', '_', track["track_name"]))
+
+
+def _export_batch(sources, out_dir, formats, per_track, name, root, engine, cache,
+                  axis, figsize, dpi, render):
+
+    """This function renders the pianorolls of a batch of ``(path, source)``
+    pairs of MIDI files in a worker process. A single figure, which is not
+    registered in pyplot, is reused for every plot of the batch and cleared
+    at the end. A file which cannot be read or rendered is recorded with its
+    error and the batch goes on."""
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    # Room for the legend of the tracks on the right, without the extra
+    # draw of bbox_inches='tight'
+    fig.subplots_adjust(left=0.04, right=0.85)
+    pianoroll = Pianoroll()
+    written = []
+    failed = []
+
+    try:
+        for path, source in sources:
+            try:
+                with metrics.span('export_file', file=path):
+                    written += _export_file(path, source, out_dir, formats, per_track, name,
+                                            root, engine, cache, axis, fig, ax, pianoroll,
+                                            render)
+            except Exception as error:
+                failed.append((path, '{}: {}'.format(type(error).__name__, error)))
+    finally:
+        fig.clf()
+
+    return written, failed
+
+
+def _export_file(path, source, out_dir, formats, per_track, name, root, engine, cache,
+                 axis, fig, ax, pianoroll, render):
+
+    """This function renders the pianorolls of a MIDI file of a batch of
+    ``_export_batch`` in its figure."""
+
+    midi = MidiProcessing(source, engine=engine, cache=cache)
+    tracks = midi.get_tracks()
+    tempo_map = midi.tempo_map if axis == 'bar' else None
+    written = []
+
+    if per_track:
+        items = [(track, {key: track}) for key, track in tracks.items()]
+    else:
+        items = [(None, tracks)]
+
+    for track, group in items:
+        base = os.path.join(out_dir, _file_name(name, path, track, root))
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        drawn = False
+        for fmt in formats:
+            out_path = base + '.' + fmt
+            if fmt == 'html':
+                write_canvas_html(out_path, group, xaxis_title=axis,
+                                  note_x=pianoroll._tracks_x(group, axis, tempo_map=tempo_map))
+            else:
+                if not drawn:
+                    ax.cla()
+                    if track is None:
+                        pianoroll.plot_all_tracks(group, axis=axis, tempo_map=tempo_map,
+                                                  render=render, ax=ax)
+                    else:
+                        pianoroll.plot_singletrack_pianoroll(track, axis=axis,
+                                                             tempo_map=tempo_map,
+                                                             render=render, ax=ax)
+                    drawn = True
+                _savefig(fig, out_path, fmt)
+            written.append(out_path)
+
+    return written
+
+
+def _savefig(fig, out_path, fmt):
+
+    with metrics.span('write', format=fmt):
+        fig.savefig(out_path, format=fmt)
+    metrics.count('bytes_written', os.path.getsize(out_path))
+
+
+@metrics.timed()
+def export_pianorolls(source, out_dir, formats=('png',), per_track=False, name=None,
+                      max_workers=None, engine='fast', cache=None, axis='time',
+                      figsize=(20, 5), dpi=100, render='auto', batch_size=16):
+
+    """This function renders the pianoroll of each MIDI file, or of each of
+    their tracks, of a directory, glob pattern or list of paths to image or
+    HTML files. The files are rendered in a pool of processes with the Agg
+    backend, without pyplot figures, so no figure is left open.
+
+    Parameters
+    ----------
+    source : str or list of strs
+        Directory, glob pattern, list of paths of MIDI files or archive, as
+        in ``MidiCorpus``.
+    out_dir : str
+        Output directory.
+    formats : tuple of strs
+        Output formats: ``png``, ``svg``, ``pdf`` or any other format of
+        ``savefig``, and ``html`` which writes a canvas page of
+        ``write_canvas_html``. Default ``('png',)``.
+    per_track : bool
+        Renders each track to its own file instead of all the tracks of a
+        file together. Default ``False``.
+    name : str or callable
+        Output file name without extension. A format string with the fields
+        ``stem`` (name of the MIDI file without extension) and ``parent``
+        (directory of the MIDI file relative to the common directory of all
+        the files, with a trailing separator, or empty), and also
+        ``n_track``, ``n_program`` and ``track_name`` if ``per_track`` is
+        ``True``. A callable gets the path of the MIDI file and the track
+        (``None`` if ``per_track`` is ``False``). Default ``None`` which
+        means ``{parent}{stem}`` or ``{parent}{stem}_{n_track}``, so the
+        directories of the files are mirrored in ``out_dir`` and files
+        with the same name in different directories do not overwrite each
+        other.
+    max_workers : int
+        Number of worker processes. Default ``None`` which means the number
+        of CPUs. ``0`` renders in the calling process.
+    engine : str
+        Engine of ``MidiProcessing``. Default ``fast``.
+    cache : bool or NoteCache
+        Cache of ``MidiProcessing``. Default ``None``.
+    axis : str
+        ``time`` or ``bar``. Default ``time``.
+    figsize : tuple of floats
+        Size of the figures in inches. Default ``(20, 5)``.
+    dpi : int
+        Resolution of the images. Default ``100``.
+    render : str
+        Render mode of the ``Pianoroll`` plots. Default ``auto``.
+    batch_size : int
+        Number of files sent to a worker at once. Default ``16``.
+
+    Returns
+    -------
+    paths : list of strs
+        Paths of the written files, in the order of the MIDI files.
+    failed : list of (str, str)
+        Path and error of each MIDI file which could not be read or
+        rendered. The other files are exported anyway.
+
+    Examples
+    --------
+    >>> paths, failed = midiplot.export_pianorolls('dataset/', 'plots/',
+    ...                                            formats=('png', 'html'),
+    ...                                            max_workers=8)
+    """
+
+    if name is None:
+        name = '{parent}{stem}_{n_track}' if per_track else '{parent}{stem}'
+
+    corpus = MidiCorpus(source)
+    paths = corpus.paths
+    if corpus.archive is None:
+        paths = [os.path.abspath(path) for path in paths]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths]) if paths else ''
+
+    if not per_track and not callable(name):
+        names = [_file_name(name, path, None, root) for path in paths]
+        if len(set(names)) < len(names):
+            raise ValueError('several files have the same output name, '
+                             'add {parent} to name.')
+
+    os.makedirs(out_dir, exist_ok=True)
+    args = (out_dir, tuple(formats), per_track, name, root, engine, cache, axis, figsize,
+            dpi, render)
+
+    written = []
+    failed = []
+    for batch_written, batch_failed in _map_batches(_export_batch, corpus._batches(batch_size),
+                                                    args, max_workers):
+        written.extend(batch_written)
+        failed.extend(batch_failed)
+
+    return written, failed
+
+
+def _tile_tracks(all_tracks, note_x, start, end):
+
+    """This function returns the tracks with the notes that sound between
+    ``start`` and ``end`` in the units of ``note_x``. Every track is kept,
+    even if it has no notes in the tile, so the legend of the tiles is the
+    same."""
+
+    tracks = {}
+    for key, (x_on, x_off) in zip(all_tracks.keys(), note_x):
+        mask = (x_on < end) & (x_off > start)
+        track = dict(all_tracks[key])
+        for column in ("pitch", "note_on", "note_off", "velocity"):
+            track[column] = np.asarray(track[column])[mask]
+        tracks[key] = track
+
+    return tracks
+
+
+def _tile_batches(all_tracks, note_x, out_dir, name, tile_duration, n_tiles, batch_size,
+                  tiles):
+
+    """This function yields the render jobs of the tiles in lists of
+    ``batch_size``. The notes of a tile are only selected when its batch is
+    taken, and the entry of each tile is appended to ``tiles``."""
+
+    for first in range(0, n_tiles, batch_size):
+        jobs = []
+        for i in range(first, min(first + batch_size, n_tiles)):
+            start, end = i * tile_duration, (i + 1) * tile_duration
+            tracks = _tile_tracks(all_tracks, note_x, start, end)
+            file_name = '{}_{:05d}.png'.format(name, i)
+            tiles.append({"file"      :   file_name,
+                          "start"     :   start,
+                          "end"       :   end,
+                          "n_notes"   :   sum(len(track["pitch"]) for track in tracks.values())})
+            jobs.append((os.path.join(out_dir, file_name), start, end, tracks))
+        yield jobs
+
+
+def _render_tiles(jobs, axis, tempo_map, pitch_range, figsize, dpi, render, stitch):
+
+    """This function renders a batch of tiles in a worker process with a
+    single figure, which is not registered in pyplot, as in
+    ``_export_batch``."""
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    if stitch:
+        # The tiles are put side by side, so they have no margins
+        fig.subplots_adjust(left=0, right=1, bottom=0, top=1)
+    else:
+        fig.subplots_adjust(left=0.04, right=0.85)
+    pianoroll = Pianoroll()
+
+    try:
+        for out_path, start, end, tracks in jobs:
+            ax.cla()
+            pianoroll.plot_all_tracks(tracks, axis=axis, tempo_map=tempo_map,
+                                      render=render, ax=ax)
+            if axis == 'bar':
+                step = max(int(np.ceil((end - start) / 50)), 1)
+                ax.set_xticks(np.arange(np.ceil(start), np.floor(end) + 1, step))
+            ax.set_xlim(start, end)
+            ax.set_ylim(*pitch_range)
+            if stitch:
+                ax.get_legend().remove()
+                ax.tick_params(labelleft=False, labelbottom=False)
+            _savefig(fig, out_path, 'png')
+    finally:
+        fig.clf()
+
+    return [job[0] for job in jobs]
+
+
+@metrics.timed()
+def export_pianoroll_tiles(all_tracks, out_dir, name='plot', tile_duration=60,
+                           axis='time', bpm=120, bar='4/4', tempo_map=None,
+                           pitch_range=None, max_workers=None, figsize=(20, 5),
+                           dpi=100, render='auto', batch_size=8, stitch=False):
+
+    """This function renders the pianoroll of all the tracks of a long MIDI
+    file as a set of PNG tiles of ``tile_duration`` seconds or bars. Every
+    tile has the same pitch range and track colors, so the memory of each
+    render does not depend on the length of the file. The tiles are rendered
+    in a pool of processes and listed in a ``<name>.json`` index. The notes
+    of a tile are selected only when its batch is sent to a worker, and at
+    most two batches per worker are in flight.
+
+    Parameters
+    ----------
+    all_tracks : dict
+        Tracks returned by ``MidiProcessing.get_tracks``.
+    out_dir : str
+        Output directory.
+    name : str
+        Name of the index and prefix of the tiles, which are written as
+        ``<name>_<n_tile>.png``. Default ``plot``.
+    tile_duration : int or float
+        Duration of the tiles in the units of ``axis``. Default ``60``.
+    axis : str
+        ``time`` or ``bar``. Default ``time``.
+    bpm : int or float
+        Beats per minute of the ``bar`` axis. Default ``120``.
+    bar : str
+        Bar measure of the ``bar`` axis, e.g. ``3/4``. Default ``4/4``.
+    tempo_map : TempoMap
+        Tempo map of the MIDI file (``MidiProcessing.tempo_map``) used for
+        the ``bar`` axis. If it is given ``bpm`` and ``bar`` are ignored.
+    pitch_range : tuple of ints
+        Lowest and highest pitch of the tiles. Default ``None`` which means
+        the pitch range of all the tracks.
+    max_workers : int
+        Number of worker processes. Default ``None`` which means the number
+        of CPUs. ``0`` renders in the calling process.
+    figsize : tuple of floats
+        Size of each tile in inches. Default ``(20, 5)``.
+    dpi : int
+        Resolution of the tiles. Default ``100``.
+    render : str
+        Render mode of the ``Pianoroll`` plots. Default ``auto``.
+    batch_size : int
+        Number of tiles sent to a worker at once. Default ``8``.
+    stitch : bool
+        Renders the tiles without margins, legend or tick labels and also
+        writes them side by side to ``<name>.png``. The whole image is held
+        in memory. Default ``False``.
+
+    Returns
+    -------
+    index_path : str
+        Path of the JSON index of the tiles.
+
+    Examples
+    --------
+    >>> midi = midiplot.MidiProcessing('concert.mid')
+    >>> midiplot.export_pianoroll_tiles(midi.get_tracks(), 'tiles/', name='concert',
+    ...                                 tile_duration=60, max_workers=8)
+    """
+
+    pianoroll = Pianoroll()
+    duration = max((np.max(track["note_off"], initial=0)
+                    for track in all_tracks.values()), default=0)
+    if axis == 'bar':
+        tempo_map = pianoroll._bar_tempo_map(duration, bpm, bar, tempo_map)
+    elif axis != 'time':
+        raise ValueError('Axis must be time or bar.')
+    note_x = [pianoroll._note_x(track, axis, tempo_map=tempo_map)
+              for track in all_tracks.values()]
+
+    if pitch_range is None:
+        pitches = [np.asarray(track["pitch"]) for track in all_tracks.values()]
+        pitches = np.concatenate(pitches) if pitches else np.zeros(0)
+        pitch_range = (int(pitches.min()), int(pitches.max()) + 1) if pitches.size else (0, 128)
+    pitch_range = tuple(pitch_range)
+
+    x_max = max((np.max(x_off, initial=0) for x_on, x_off in note_x), default=0)
+    n_tiles = max(int(np.ceil(x_max / tile_duration)), 1)
+
+    os.makedirs(out_dir, exist_ok=True)
+    tiles = []
+    batches = _tile_batches(all_tracks, note_x, out_dir, name, tile_duration, n_tiles,
+                            batch_size, tiles)
+    args = (axis, tempo_map, pitch_range, figsize, dpi, render, stitch)
+    for _ in _map_batches(_render_tiles, batches, args, max_workers):
+        pass
+
+    index = {"name"            :   name,
+             "axis"            :   axis,
+             "tile_duration"   :   tile_duration,
+             "pitch_range"     :   list(pitch_range),
+             "figsize"         :   list(figsize),
+             "dpi"             :   dpi,
+             "tracks"          :   [{"n_track"      :   int(track["n_track"]),
+                                     "track_name"   :   track["track_name"],
+                                     "color"        :   COLOR[key % len(COLOR)]}
+                                    for key, track in all_tracks.items()],
+             "tiles"           :   tiles}
+
+    if stitch:
+        import matplotlib.image
+        image = np.concatenate([matplotlib.image.imread(os.path.join(out_dir, tile["file"]))
+                                for tile in tiles], axis=1)
+        matplotlib.image.imsave(os.path.join(out_dir, name + '.png'), image)
+        index["image"] = name + '.png'
+        del image
+
+    index_path = os.path.join(out_dir, name + '.json')
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=1)
+
+    return index_path
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides an opt-in instrumentation of midiplot: nested timing
+spans of the stages of ``MidiProcessing`` and ``Pianoroll`` (parsing, track
+extraction, tempo estimation, drawing, writing...) and counters (notes
+parsed, artists and traces emitted, bytes written). Nothing is recorded, and
+the instrumented functions only check one list, unless a ``record`` context
+is active.
+
+Spans and counters are recorded in the process where they happen, so the
+work done by the worker processes of ``MidiCorpus`` or ``export_pianorolls``
+is only recorded with ``max_workers=0``.
+
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import time
+
+
+# Recorders of the active ``record`` contexts
+_recorders = []
+# Names of the open spans of the current thread or task
+_stack = contextvars.ContextVar('midiplot_spans', default=())
+
+
+class Recorder:
+
+    """This class collects the spans and counters recorded inside a
+    ``record`` context.
+
+    Parameters
+    ----------
+    callback : callable
+        Function called with each event as soon as it is recorded: a span
+        when it ends or a counter increment. Default ``None``.
+
+    Attributes
+    ----------
+    spans : list of dicts
+        Finished spans in the order they end, with the keys ``type``
+        (``span``), ``name``, ``path`` (names of the enclosing spans and the
+        span joined by ``/``), ``depth``, ``start`` (``time.perf_counter``),
+        ``seconds`` and any attributes given to ``span``.
+    counters : dict
+        Total of each counter.
+    """
+
+    def __init__(self, callback=None):
+
+        self.callback = callback
+        self.spans = []
+        self.counters = {}
+
+
+    def _emit(self, event):
+
+        if self.callback is not None:
+            self.callback(event)
+
+
+    def summary(self):
+
+        """This function returns the number of calls and total seconds of
+        each span path.
+
+        Returns
+        -------
+        summary : dict
+            ``{path: {"count": int, "seconds": float}}``.
+        """
+
+        summary = {}
+        for span in self.spans:
+            entry = summary.setdefault(span["path"], {"count": 0, "seconds": 0.})
+            entry["count"] += 1
+            entry["seconds"] += span["seconds"]
+
+        return summary
+
+
+    def to_dict(self):
+
+        """This function returns the recorded spans and counters.
+
+        Returns
+        -------
+        metrics : dict
+            ``spans``, ``counters`` and the ``summary`` of the spans.
+        """
+
+        return {"spans"      :   list(self.spans),
+                "counters"   :   dict(self.counters),
+                "summary"    :   self.summary()}
+
+
+    def to_jsonl(self, path_or_file):
+
+        """This function writes the spans, one JSON object per line, and
+        then one line with the counters.
+
+        Parameters
+        ----------
+        path_or_file : str or file
+            Path of the output file, or file object open in text mode.
+        """
+
+        lines = [json.dumps(span) for span in self.spans]
+        lines.append(json.dumps({"type": "counters", "counters": self.counters}))
+        text = '\n'.join(lines) + '\n'
+
+        if hasattr(path_or_file, 'write'):
+            path_or_file.write(text)
+        else:
+            with open(path_or_file, 'w') as f:
+                f.write(text)
+
+
+@contextlib.contextmanager
+def record(callback=None):
+
+    """This function is a context manager which records the spans and
+    counters of midiplot while it is active.
+
+    Parameters
+    ----------
+    callback : callable
+        Function called with each event as soon as it is recorded, e.g. to
+        feed them to a metrics system. Default ``None``.
+
+    Yields
+    ------
+    recorder : Recorder
+        Recorder with the spans and counters.
+
+    Examples
+    --------
+    >>> with midiplot.metrics.record() as recorder:
+    ...     midi = midiplot.MidiProcessing('midi.mid')
+    ...     midiplot.Pianoroll().plot_all_tracks(midi.get_tracks())
+    >>> recorder.summary()
+    >>> recorder.to_jsonl('metrics.jsonl')
+    """
+
+    recorder = Recorder(callback)
+    _recorders.append(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorders.remove(recorder)
+
+
+@contextlib.contextmanager
+def _span(name, attrs):
+
+    stack = _stack.get() + (name,)
+    token = _stack.set(stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _stack.reset(token)
+        event = dict(attrs)
+        event.update({"type"      :   "span",
+                      "name"      :   name,
+                      "path"      :   '/'.join(stack),
+                      "depth"     :   len(stack) - 1,
+                      "start"     :   start,
+                      "seconds"   :   seconds})
+        for recorder in list(_recorders):
+            recorder.spans.append(event)
+            recorder._emit(event)
+
+
+def span(name, **attrs):
+
+    """This function returns a context manager which records the time spent
+    inside it as a span nested in the open spans.
+
+    Parameters
+    ----------
+    name : str
+        Name of the span.
+    **attrs
+        Attributes of the span, which must be serializable to JSON. They
+        cannot replace the keys of the span, e.g. ``path``.
+
+    Returns
+    -------
+    context : context manager
+        Span, or a context manager which does nothing if nothing is being
+        recorded.
+    """
+
+    if not _recorders:
+        return contextlib.nullcontext()
+
+    return _span(name, attrs)
+
+
+def timed(name=None):
+
+    """This function is a decorator which records each call of a function as
+    a span.
+
+    Parameters
+    ----------
+    name : str
+        Name of the span. Default ``None`` which means the qualified name of
+        the function.
+    """
+
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _recorders:
+                return function(*args, **kwargs)
+            with _span(span_name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, value=1):
+
+    """This function adds ``value`` to a counter.
+
+    Parameters
+    ----------
+    name : str
+        Name of the counter.
+    value : int or float
+        Increment. Default ``1``.
+    """
+
+    if not _recorders:
+        return
+
+    event = {"type"    :   "counter",
+             "name"    :   name,
+             "value"   :   value,
+             "path"    :   '/'.join(_stack.get())}
+    for recorder in list(_recorders):
+        recorder.counters[name] = recorder.counters.get(name, 0) + value
+        recorder._emit(event)
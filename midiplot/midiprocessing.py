@@ -4,13 +4,22 @@ This file provides MIDI handling tools.
 
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.ticker import MultipleLocator
-import plotly.express as px
-import plotly.graph_objects as go
+import contextlib
+import io
+import itertools
+import os
+import re
+
 import numpy as np
 import pretty_midi
+
+from .notetable import NoteTable, CompactNoteTable
+from .smf import read_smf, scan_smf, write_smf, SMFData, _change_ticks
+from .cache import NoteCache
+from .tempomap import TempoMap
+from . import metrics, roll
+from .tiles import TilePyramid
+from .canvas import write_canvas_html
              
              
 class MidiProcessing:
@@ -20,13 +29,36 @@ class MidiProcessing:
     
     Parameters
     ----------
-    midi_path : str or file
-        Path or file pointer to a MIDI file.
+    midi_path : str, bytes, file or pretty_midi.PrettyMIDI
+        Path to a ``.mid`` or ``.midi`` file, contents of a MIDI file, file
+        object open in binary mode (e.g. a member of an archive, see 
+        ``iter_archive``) or an already parsed ``PrettyMIDI`` object, which
+        is not cached.
+    engine : str
+        ``pretty_midi`` parses the file with ``pretty_midi``. ``fast`` reads
+        the notes and the tempo map straight from the file chunks with
+        ``smf.read_smf``, which gives the same tracks much faster; 
+        ``midi_file`` is then only parsed if a method needs it. Default
+        ``pretty_midi``.
+    cache : bool or NoteCache
+        Cache of the extracted notes, tracks and tempo map. If the file is
+        already in the cache it is memory-mapped instead of parsed, otherwise
+        it is parsed and stored. ``True`` uses a ``NoteCache`` in the default
+        cache directory. Default ``None`` which means no cache.
+    lazy : bool
+        Only scans the track names, programs, tempo map and duration of the
+        file with ``smf.scan_smf``, about twice as fast as ``smf.read_smf``
+        since no note is stored. The notes are extracted with ``engine`` the
+        first time a method needs them. Default ``False``.
 
     Attributes
     ----------
     midi_file : pretty_midi.pretty_midi.PrettyMIDI
         Pretty MIDI attribute
+    note_table : NoteTable
+        Columnar table with the notes of every track. It is built once, the
+        first time it is needed. Call ``invalidate`` after mutating
+        ``midi_file`` in place so it is rebuilt.
         
     Examples
     --------     
@@ -37,18 +69,194 @@ class MidiProcessing:
     >>> tuple2 = midi.get_notestuple_of_singletrack_by_name(track_name='drums')
     """
                  
-    def __init__(self, midi_path):
+    @metrics.timed()
+    def __init__(self, midi_path, engine='pretty_midi', cache=None, lazy=False):
         
         """Initialize by taking MIDI data from a file."""
         
-        if midi_path[-4:] == '.mid' or midi_path[-5:] == '.midi':
+        if engine not in ('pretty_midi', 'fast'):
+            raise ValueError('engine must be pretty_midi or fast.')
+            
+        self.midi_path = None
+        self.engine = engine
+        self._data = None
+        self.midi_file = None
+        
+        if isinstance(midi_path, pretty_midi.PrettyMIDI):
+            # Already parsed, there is nothing to cache
+            self._cache = None
+            self._midi_file = midi_path
+            self._smf = SMFData.from_pretty_midi(midi_path)
+            self._note_table = self._smf.note_table
+            return
+        elif isinstance(midi_path, (bytes, bytearray, memoryview)):
+            self._data = bytes(midi_path)
+        elif hasattr(midi_path, 'read'):
+            self._data = midi_path.read()
+        else:
+            midi_path = os.fspath(midi_path)
+            if not midi_path.lower().endswith(('.mid', '.midi')):
+                raise NameError('the inserted path does not corrrespond to a .mid or .midi file.')
+            self.midi_path = midi_path
+            
+        if cache is True:
+            cache = NoteCache()
+        self._cache = cache or None
+        
+        data = None
+        if self._cache is not None:
+            data = self._read()
+            self._cache_key = self._cache.key(data)
+            with metrics.span('cache.load'):
+                smf = self._cache.load(self._cache_key)
+            if smf is not None:
+                # The memory-mapped table is converted to seconds the first
+                # time the notes are needed
+                self._smf = smf
+                self._note_table = None
+                return
+        
+        if lazy:
+            data = data if data is not None else self._read()
+            with metrics.span('scan'):
+                self._smf = scan_smf(data)
+        else:
+            self._parse(data)
+        
+    
+    def _read(self):
+        
+        if self._data is not None:
+            return self._data
         
-            self.midi_file = pretty_midi.PrettyMIDI(midi_path)
+        with metrics.span('read'), open(self.midi_path, 'rb') as f:
+            data = f.read()
+        metrics.count('bytes_read', len(data))
             
+        return data
+        
+    
+    def _pretty_midi(self):
+        
+        """This function parses the file with ``pretty_midi``."""
+        
+        with metrics.span('parse', engine='pretty_midi'):
+            if self._data is not None:
+                return pretty_midi.PrettyMIDI(io.BytesIO(self._data))
+        
+            return pretty_midi.PrettyMIDI(self.midi_path)
+        
+    
+    def _parse(self, data=None):
+        
+        """This function extracts the notes, tracks and tempo map of the 
+        file with ``engine`` and stores them in the cache."""
+        
+        if self.engine == 'pretty_midi':
+            self._midi_file = self._pretty_midi()
+            with metrics.span('note_table'):
+                smf = SMFData.from_pretty_midi(self._midi_file)
         else:
-            raise NameError('the inserted path does not corrrespond to a .mid or .midi file.')
+            data = data if data is not None else self._read()
+            with metrics.span('parse', engine='fast'):
+                smf = read_smf(data)
+        metrics.count('notes_parsed', len(smf.note_table))
+            
+        if self._cache is not None:
+            with metrics.span('cache.store'):
+                self._cache.store(self._cache_key, smf)
+            
+        self._smf = smf
+        self._note_table = smf.note_table
+        
+    
+    @property
+    def midi_file(self):
+        
+        """Pretty MIDI object the tracks are extracted from. With the 
+        ``fast`` engine it is parsed the first time it is accessed."""
+        
+        if self._midi_file is None:
+            self._midi_file = self._pretty_midi()
+            
+        return self._midi_file
+    
+    
+    @midi_file.setter
+    def midi_file(self, midi_file):
+        
+        self._midi_file = midi_file
+        self.invalidate()
         
     
+    def invalidate(self):
+        
+        """This function drops the track data extracted from ``midi_file``
+        so it is extracted again the next time it is needed. It must be
+        called after mutating ``midi_file`` in place (adding notes, 
+        instruments...). Assigning a new ``midi_file`` calls it automatically.
+        """
+        
+        self._smf = None
+        self._note_table = None
+        self._tracks = None
+        self._track_index = None
+        self._tempo_maps = {}
+        self._beat_start = None
+        
+    
+    @property
+    def note_table(self):
+        
+        """Columnar ``NoteTable`` with the notes of every track."""
+        
+        if self._note_table is None:
+            if self._smf is not None and self._smf.note_table is not None:
+                self._note_table = self._smf.note_table.to_note_table()
+            elif self._smf is not None:
+                # Only the headers were scanned
+                self._parse()
+            else:
+                self._note_table = NoteTable.from_pretty_midi(self.midi_file)
+            
+        return self._note_table
+    
+    
+    def _index(self):
+        
+        """This function returns the cached tracks dict and the hash indexes
+        from track name, track number and program number to track number.
+        If several tracks share a name or program number the last one is
+        indexed. The note arrays of the cached tracks are read-only views
+        over ``note_table``, so callers cannot change the cache through them.
+        """
+        
+        if self._track_index is None:
+            table = self.note_table
+            self._tracks = table.to_dict()
+            for track in self._tracks.values():
+                for column in ('pitch', 'note_on', 'note_off', 'velocity'):
+                    track[column].flags.writeable = False
+            self._track_index = {
+                    "track_name"    :   {name: i for i, name in enumerate(table.names)},
+                    "n_track"       :   {i: i for i in range(table.n_tracks)},
+                    "n_program"     :   {program: i for i, program in enumerate(table.programs)}
+                    }
+            
+        return self._tracks, self._track_index
+    
+    
+    def _lookup(self, key, value, description):
+        
+        tracks, index = self._index()
+        
+        if value not in index[key]:
+            raise ValueError("The introduced {} {} is not in the MIDI file".format(description, value))
+            
+        return dict(tracks[index[key][value]])
+        
+    
+    @metrics.timed()
     def get_tracks(self):
         
         """This function stores the MIDI tracks in a tuple of 
@@ -65,37 +273,14 @@ class MidiProcessing:
         isdrum_list : list of bools
             Is the instrument a drum instrument (channel 9)?
         notes_list : tuple of [np.ndarray, np.ndarray, np.ndarray]
-            Tuple of pitch, onsets and offsets times in seconds.
+            Tuple of pitch, onsets and offsets times in seconds. The arrays
+            are read-only views over ``note_table``, copy them to modify
+            them.
         """
         
-        tracks = {}
-        
-        for i in range(len(self.midi_file.instruments)):
-            note_on_list = []
-            note_off_list = []
-            pitch_list = []
-            velocity_list = []
-            for note in self.midi_file.instruments[i].notes:
-                pitch_list.append(note.pitch)
-                note_on_list.append(note.start)
-                note_off_list.append(note.end)
-                velocity_list.append(note.velocity)
-                
-            track = { i: {
-                            "n_track"       :   i,
-                            "n_program"     :   int(self.midi_file.instruments[i].program),
-                            "track_name"    :   self.midi_file.instruments[i].name,
-                            "is_drum"       :   self.midi_file.instruments[i].is_drum,
-                            "pitch"         :   pitch_list,
-                            "note_on"       :   note_on_list,
-                            "note_off"      :   note_off_list,
-                            "velocity"      :   velocity_list
-                        }
-                    }
-                
-            tracks = {**tracks, **track}
-            
-        return tracks
+        tracks, _ = self._index()
+        
+        return {key: dict(track) for key, track in tracks.items()}
  
     
     def print_tracks(self):
@@ -104,17 +289,19 @@ class MidiProcessing:
         and is_drum.
         """
         
-        tracks = self.get_tracks()
+        # The scanned headers are enough, do not extract the notes
+        table = self._smf if self._smf is not None else self.note_table
         
-        for i in tracks:
+        for i in range(len(table.programs)):
             print('Track no:', i, 
-                  '| Program no:', tracks[i]["n_program"], 
-                  '| Track name:', tracks[i]["track_name"], 
-                  '| is drum:', tracks[i]["is_drum"])
+                  '| Program no:', table.programs[i], 
+                  '| Track name:', table.names[i], 
+                  '| is drum:', table.is_drum[i])
             
         return
     
     
+    @metrics.timed()
     def estimate_bpm(self, print_bpm=False):
     
         """This function returns the bpm estimation of a MIDI file using 
@@ -155,7 +342,10 @@ class MidiProcessing:
             Duration in seconds of the input MIDI file.       
         """
         
-        duration = self.midi_file.get_end_time()
+        if self._smf is not None:
+            duration = self._smf.end_time
+        else:
+            duration = self.midi_file.get_end_time()
         
         if print_duration == True:
             print('MIDI file duration in seconds is:', duration)
@@ -163,20 +353,313 @@ class MidiProcessing:
         return duration
     
     
+    def get_tempo_changes(self):
+        
+        """This function returns the tempo changes of the MIDI file.
+         
+        Returns
+        -------
+        changes_array : np.ndarray
+            Times in seconds where the tempo changes.
+        bpm_array : np.ndarray
+            Bpm of each tempo change.
+        """
+        
+        if self._smf is not None:
+            return self._smf.get_tempo_changes()
+        
+        return self.midi_file.get_tempo_changes()
+    
+    
+    def get_time_signatures(self):
+        
+        """This function returns the time signature changes of the MIDI file.
+         
+        Returns
+        -------
+        time_signatures : list of (int, int, float)
+            Time signature changes as ``(numerator, denominator, time)``.
+        """
+        
+        if self._smf is not None:
+            return list(self._smf.time_signatures)
+        
+        return [(ts.numerator, ts.denominator, ts.time) 
+                for ts in self.midi_file.time_signature_changes]
+    
+    
+    @property
+    def tempo_map(self):
+        
+        """``TempoMap`` with the tempo changes and time signatures of the 
+        MIDI file. It is built once and shared by every bar-aware function.
+        """
+        
+        return self.get_tempo_map()
+    
+    
+    def get_tempo_map(self, bar=None):
+        
+        """This function returns the cached ``TempoMap`` of the MIDI file.
+        
+        Parameters
+        ----------
+        bar : str
+            Bar measure, e.g. ``3/4``, which replaces the time signatures of
+            the file. Default ``None`` which means the time signatures of
+            the file.
+            
+        Returns
+        -------
+        tempo_map : TempoMap
+            Tempo map of the MIDI file.
+        """
+        
+        if bar not in self._tempo_maps:
+            with metrics.span('tempo_map'):
+                if bar is None:
+                    changes_array, bpm_array = self.get_tempo_changes()
+                    self._tempo_maps[bar] = TempoMap(changes_array, bpm_array, 
+                                                     self.get_time_signatures(),
+                                                     self.get_duration())
+                else:
+                    self._tempo_maps[bar] = self.get_tempo_map().with_bar(bar)
+                
+        return self._tempo_maps[bar]
+    
+    
+    def iter_windows(self, window_size, unit='seconds', boundary='start', 
+                     bar=None):
+        
+        """This function iterates over the notes of all the tracks in 
+        consecutive windows of time, in onset order. The rows of each window
+        (and the notes still sounding from previous windows) are gathered
+        when it is yielded, so a consumer only holds one window at a time.
+        The memory is not bounded by the window though: the whole 
+        ``note_table`` is loaded and its onsets are sorted once per call,
+        with an index of 8 bytes per note.
+        
+        Parameters
+        ----------
+        window_size : int or float
+            Length of the windows, in seconds or in bars.
+        unit : str
+            ``seconds`` or ``bars``. Default ``seconds``.
+        boundary : str
+            How the notes which span the boundary between windows are
+            handled. ``start`` yields each note only in the window where it
+            starts. ``overlap`` yields a note in every window it sounds in.
+            ``clip`` does the same but clips its onset and offset to the
+            window. Default ``start``.
+        bar : str
+            Bar measure used when ``unit`` is ``bars``. Default ``None`` 
+            which means the time signatures of the file.
+            
+        Yields
+        ------
+        start : float
+            Start time of the window in seconds.
+        end : float
+            End time of the window in seconds.
+        notes : np.ndarray
+            Notes of the window as rows of the ``note_table`` (with their
+            ``track`` number), sorted by onset.
+        """
+        
+        if boundary not in ('start', 'overlap', 'clip'):
+            raise ValueError('boundary must be start, overlap or clip.')
+            
+        notes = self.note_table.notes
+        order = np.argsort(notes['note_on'], kind='stable')
+        
+        if unit == 'seconds':
+            n_windows = max(int(np.ceil(self.get_duration() / window_size)), 1)
+            edges = np.arange(n_windows + 1) * window_size
+        elif unit == 'bars':
+            bar_times = self.get_tempo_map(bar).bar_times
+            edges = bar_times[::window_size]
+            if edges[-1] < bar_times[-1]:
+                edges = np.append(edges, bar_times[-1])
+        else:
+            raise ValueError('unit must be seconds or bars.')
+            
+        # Index in ``order`` of the first note of each window
+        first = np.searchsorted(notes['note_on'], edges, side='left', sorter=order)
+        first[-1] = len(order)
+        
+        carry = notes[:0]
+        for i in range(len(edges) - 1):
+            start, end = float(edges[i]), float(edges[i + 1])
+            window = notes[order[first[i]:first[i + 1]]]
+            
+            if boundary != 'start':
+                window = np.concatenate((carry[carry['note_off'] > start], window))
+                carry = window[window['note_off'] > end]
+                if boundary == 'clip':
+                    window = window.copy()
+                    np.clip(window['note_on'], start, end, out=window['note_on'])
+                    np.clip(window['note_off'], start, end, out=window['note_off'])
+                    
+            yield start, end, window
+    
+    
+    def _frames(self, times, fs, beat_resolution):
+        
+        """This function converts times in seconds to frames."""
+        
+        if beat_resolution is not None:
+            beats = self.tempo_map.seconds_to_beats(times)
+            return np.round(beats * beat_resolution).astype(np.int64)
+        
+        # Truncated like ``pretty_midi.PrettyMIDI.get_piano_roll``
+        return (np.asarray(times) * fs).astype(np.int64)
+    
+    
+    @metrics.timed()
+    def get_pianoroll(self, n_track=None, fs=100, beat_resolution=None, 
+                      velocity=True, merge=True, include_drums=True, 
+                      sparse=False, n_frames=None, out=None):
+        
+        """This function computes the piano-roll matrix of a track or of all
+        the tracks of the MIDI file. The frames are sampled ``fs`` times per 
+        second or ``beat_resolution`` times per quarter note following the
+        tempo changes. As in ``pretty_midi``, a note is active from the frame
+        of its onset to the frame before the one of its offset and the 
+        velocities of overlapping notes of the same pitch are added.
+        
+        Parameters
+        ----------
+        n_track : int
+            Number of the track. Default ``None`` which means all the tracks.
+        fs : int or float
+            Frames per second. Default ``100``.
+        beat_resolution : int
+            Frames per quarter note. If it is not ``None`` it is used instead
+            of ``fs``. Default ``None``.
+        velocity : bool
+            The values are velocities if ``True``, 0 or 1 otherwise. Default
+            ``True``.
+        merge : bool
+            Adds all the tracks in one piano-roll if ``True``, stacks one 
+            piano-roll per track otherwise. Default ``True``.
+        include_drums : bool
+            Includes the drum tracks. ``pretty_midi`` leaves them out. Default
+            ``True``.
+        sparse : bool
+            Returns the run-length encoded runs of ``roll.piano_roll_runs`` 
+            instead of a dense matrix. Default ``False``.
+        n_frames : int
+            Number of frames. Default ``None`` which means the duration of
+            the MIDI file.
+        out : np.ndarray
+            Preallocated output for the dense piano-roll. Default ``None``.
+            
+        Returns
+        -------
+        pianoroll : np.ndarray
+            Piano-roll of shape ``(128, n_frames)``, or 
+            ``(n_tracks, 128, n_frames)`` if ``merge`` is ``False``. If 
+            ``sparse`` is ``True``, structured array of ``roll.RUN_DTYPE``.
+        
+        Examples
+        --------
+        >>> roll = midi.get_pianoroll(beat_resolution=4, velocity=False)
+        >>> runs = midi.get_pianoroll(merge=False, sparse=True)
+        """
+        
+        table = self.note_table
+        if n_track is not None:
+            if not 0 <= n_track < table.n_tracks:
+                raise ValueError("The introduced track number {} is not in the MIDI file".format(n_track))
+            notes = table.notes[table.track_slice(n_track)]
+        else:
+            notes = table.notes
+            
+        if not include_drums and any(table.is_drum):
+            notes = notes[~np.asarray(table.is_drum)[notes['track']]]
+            
+        if n_frames is None:
+            n_frames = int(np.ceil(self._frames(self.get_duration(), fs, beat_resolution)))
+            
+        start = self._frames(notes['note_on'], fs, beat_resolution)
+        stop = self._frames(notes['note_off'], fs, beat_resolution)
+        value = notes['velocity'] if velocity else None
+        n_rows = 1 if merge or n_track is not None else table.n_tracks
+        row = notes['track'] if n_rows > 1 else None
+        
+        if sparse:
+            return roll.piano_roll_runs(notes['pitch'], start, stop, value, 
+                                        n_frames=n_frames, row=row)
+        
+        return roll.piano_roll(notes['pitch'], start, stop, value, n_frames=n_frames,
+                               n_rows=n_rows, row=row, out=out)
+    
+    
+    @metrics.timed()
+    def estimate_beat_start(self):
+        
+        """This function returns the time of the first beat of the MIDI file
+        estimated with ``pretty_midi``. It is only estimated once.
+         
+        Returns
+        -------
+        beat_start : float 
+            Time in seconds of the first beat.       
+        """
+        
+        if self._beat_start is None:
+            self._beat_start = self.midi_file.estimate_beat_start()
+            
+        return self._beat_start
+    
+    
+    def first_onset(self):
+        
+        """This function returns the onset of the first note of the MIDI 
+        file taking into account all the MIDI tracks.
+         
+        Returns
+        -------
+        first_onset : float 
+            Time in seconds of the first note.       
+        """
+        
+        return float(np.min(self.note_table.notes['note_on'], initial=np.inf)) \
+            if len(self.note_table) else 0.
+    
+    
+    def _silence_end(self, start):
+        
+        if start == 'beat_start':
+            return self.estimate_beat_start()
+        elif start == 'first_onset':
+            return self.first_onset()
+        
+        return float(start)
+    
+    
+    @metrics.timed()
     def cut_initial_silence(self, tuple_notes=None, select_track_by='track_name', 
-                            track_n=1, program_name='drums'):
+                            track_n=1, program_name='drums', all_tracks=False,
+                            start='beat_start'):
         
         """This function cuts the initial silence of a track. The initial
         silence is the silence between time 0 and the first note of the MIDI
         file taking into account all the MIDI tracks.
         
+        The notes which end before the cut are dropped, the rest are shifted
+        so the cut is at time 0 and the onsets of the notes which were still
+        sounding are clipped to 0.
+        
         Parameters
         ----------
-        tuple_notes : tuple of [np.ndarray, np.ndarray, np.ndarray]
-            Tuple of pitch, onsets and offsets times in seconds.
+        tuple_notes : tuple of [np.ndarray, np.ndarray, np.ndarray] or dict
+            Tuple of pitch, onsets and offsets times in seconds (and 
+            optionally velocities), or a track returned by ``get_tracks``.
             If we have a tuple_notes we can cut it even if it does not belong 
-            to the input MIDI file. Default ``None`` which means that a track 
-            of the MIDI file will be selected to be cut.
+            to the input MIDI file. It is cut at its own first onset. Default
+            ``None`` which means that a track of the MIDI file will be 
+            selected to be cut.
         select_track_by : str
             ``track_name`` selects the track by its name.
             ``program_number`` selects the track by its program number.
@@ -184,129 +667,123 @@ class MidiProcessing:
             Numer of the track to cut if select_track_by = ``program_number``.
         program_name : str
             Name of the track to cut if select_track_by = ``track_name``.    
+        all_tracks : bool
+            Cuts all the tracks of the MIDI file at once and returns them in 
+            the format of ``get_tracks``. Default ``False``.
+        start : str or float
+            Where the tracks of the MIDI file are cut: ``beat_start`` (the
+            first beat estimated by ``pretty_midi``), ``first_onset`` (the 
+            first note of all the tracks) or a time in seconds. Default
+            ``beat_start``.
         
         Returns
         -------
-        tuples : tuple of [np.ndarray, np.ndarray, np.ndarray]
-            Tuple of pitch, onsets and offsets times in seconds.      
+        tuples : tuple of [np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+            Tuple of pitch, onsets, offsets times in seconds and velocities.
+            If ``all_tracks`` is ``True``, dict of all the cut tracks.
         """
         
+        if all_tracks:
+            return self.note_table.trim(self._silence_end(start)).to_dict()
         
         if tuple_notes is not None:
-            start_time_sec = tuple_notes[1][0]
-            pitch = []
-            onsets = []
-            offsets = []
-            for i, onset in enumerate(tuple_notes[1]):
-                if (onset or tuple_notes[2][i] >= start_time_sec):
-                    pitch.append(tuple_notes[0][i])
-                    onsets.append(tuple_notes[1][i] - start_time_sec)
-                    offsets.append(tuple_notes[2][i] - start_time_sec)
+            pitch, onsets, offsets, velocity = _note_columns(tuple_notes)
+            start_time_sec = np.min(onsets) if len(onsets) else 0.
         
         else:
-            if select_track_by == 'track_name':
-                tuple_notes = self.get_notestuple_of_singletrack_by_name(program_name)
+            tuple_notes = self._select_track(select_track_by, track_n, program_name)
+            pitch, onsets, offsets, velocity = _note_columns(tuple_notes)
+            start_time_sec = self._silence_end(start)
             
-            elif select_track_by == 'program_number':
-                tuple_notes = self.get_notestuple_of_singletrack_by_nprogram(track_n)
-                
+        keep = offsets > start_time_sec
         
-            start_time_sec = self.midi_file.estimate_beat_start()
-            
-            pitch = []
-            onsets = []
-            offsets = []
-            for i, onset in enumerate(tuple_notes[1]):
-                if (onset or tuple_notes[2][i] >= start_time_sec):
-                    pitch.append(tuple_notes[0][i])
-                    onsets.append(tuple_notes[1][i] - start_time_sec)
-                    offsets.append(tuple_notes[2][i] - start_time_sec)
-
-
-        tuples = lists_to_tuple(pitch, onsets, offsets)
+        tuples = lists_to_tuple(pitch[keep], 
+                                np.maximum(onsets[keep] - start_time_sec, 0), 
+                                offsets[keep] - start_time_sec,
+                                velocity[keep] if velocity is not None else None)
         
         return tuples
 
     
     
-    def get_bars(self, bpm=None, bar='4/4', print_n_bars=False):
+    @metrics.timed()
+    def get_bars(self, bpm=None, bar=None, print_n_bars=False):
         
         """This function calculates the total number of bars of the MIDI file
-        with the total duration of the MIDI file, the bpm and the bar measure. 
-        The MIDI file is not quantized so the number of bars will vary between 
-        this bar values and a DAW.
+        with the ``tempo_map`` of the file (its tempo changes and time
+        signatures). The MIDI file is not quantized so the number of bars 
+        will vary between this bar values and a DAW.
         
         Parameters
         ----------
         bpm : int or float
-            Beats per minute. Default ``120``.
+            Beats per minute which replaces the tempo changes of the file.
+            Default ``None``.
         bar : str
-            Bar measure ``2/4``, ``3/4`` or ``4/4``. Default ``4/4``.
+            Bar measure, e.g. ``3/4``, which replaces the time signatures of
+            the file. Default ``None``.
         print_n_bars : bool
             print_time_per_bar = ``True`` prints the value of the number of 
             bars.
    
         Returns
         -------
-        n_bars : float
-            Total number of bars.      
+        n_bars : int
+            Total number of bars if ``bpm`` is given. Otherwise the tuple
+            ``(changes_array, bpm_array, n_bars_per_change_bpm, 
+            changes_bars, n_bars)`` with the tempo changes, the number of
+            bars before each change, the bar where each change occurs and
+            the total number of bars.
         """
         
         if bpm is not None:
             
-            bps = 60 / bpm
-            sec_per_bar = bps * int(bar[0])
-            n_bars = self.get_duration() / sec_per_bar
+            tempo_map = TempoMap.constant(bpm, bar or '4/4', self.get_duration())
+            n_bars = tempo_map.seconds_to_bars(self.get_duration())
            
-            return round(n_bars)
+            return round(float(n_bars))
         
-        else:
+        tempo_map = self.get_tempo_map(bar)
+        changes_array, bpm_array = tempo_map.change_times, tempo_map.tempi
         
-            if bar == '4/4' or bar == '3/4' or bar == '2/4':
-                changes_array, bpm_array = self.midi_file.get_tempo_changes()
-                
-                n_bars_per_change_bpm = []
-                #changes are the seconds where a change of bpm occur
-                # bpm are the bpm for each change
-                
-                changes_ant = 0
-                for (changes, bpm) in zip(changes_array, bpm_array): 
-                    
-                    bps = 60 / bpm
-                    sec_per_bar = bps * int(bar[0])
-                    
-                    n_bars_per_change = (changes - changes_ant) / sec_per_bar
-                    n_bars_per_change_bpm.append(round(n_bars_per_change))
-                    
-                    changes_ant = changes
-                    
-                n_bars = np.ceil(sum(n_bars_per_change_bpm))
-                
-                change_ant = 0
-                changes_bars = []
-                for i, bar in enumerate(n_bars_per_change_bpm):
-                    changes_bar = bar + change_ant
-                    changes_bars.append(changes_bar)
-                    change_ant = changes_bar
-               
-            else:
-                raise ValueError('bar inserted is not correct.')
-                
-            if print_n_bars:
-                print('MIDI file has:', n_bars, 'bars')
-                
-            return changes_array, bpm_array, n_bars_per_change_bpm, changes_bars, n_bars 
+        changes_bars = np.round(tempo_map.seconds_to_bars(changes_array)).astype(int)
+        n_bars_per_change_bpm = np.diff(changes_bars, prepend=0).tolist()
+        changes_bars = changes_bars.tolist()
+        n_bars = tempo_map.n_bars
+            
+        if print_n_bars:
+            print('MIDI file has:', n_bars, 'bars')
+            
+        return changes_array, bpm_array, n_bars_per_change_bpm, changes_bars, n_bars 
         
     
+    def _select_track(self, select_track_by, track_n, program_name):
+        
+        """This function returns the track selected by the ``select_track_by``
+        arguments of the cutting functions."""
+        
+        if select_track_by == 'track_name':
+            return self.get_singletrack_by_name(program_name)
+        
+        elif select_track_by == 'program_number':
+            return self.get_singletrack_by_nprogram(track_n)
+        
+        raise ValueError('select_track_by must be track_name or program_number.')
+        
 
-    def cut_midi_bars(self, start_bar, end_bar, bpm=None, tuple_notes=None, 
+    @metrics.timed()
+    def cut_midi_bars(self, start_bar=None, end_bar=None, bpm=None, tuple_notes=None, 
                       select_track_by='track_name', 
-                      track_n=1, program_name='drums'):
+                      track_n=1, program_name='drums', bar=None, ranges=None):
         
         """This function cuts the duration of a track by selecting the 
         starting bar and the ending bar. The MIDI file is not quantized so
         the bars values will vary between this bar values and a DAW.
         
+        A note belongs to the cut if its onset is in ``[start_bar, end_bar)``.
+        Several cuts can be done at once with ``ranges``: the notes are 
+        sorted by onset once and every cut is a ``np.searchsorted`` over them.
+        
         Parameters
         ----------
         start_bar : int
@@ -314,9 +791,11 @@ class MidiProcessing:
         end_bar : int
             Desired ending bar.
         bpm : int or float
-            Beats per minute. Default ``120``.
-        tuple_notes : tuple of [np.ndarray, np.ndarray, np.ndarray]
-            Tuple of pitch, onsets and offsets times in seconds.
+            Beats per minute. Default ``None`` which means that the tempo
+            changes of the MIDI file are used.
+        tuple_notes : tuple of [np.ndarray, np.ndarray, np.ndarray] or dict
+            Tuple of pitch, onsets and offsets times in seconds (and 
+            optionally velocities), or a track returned by ``get_tracks``.
             If we have a tuple_notes we can cut it even if it does not belong 
             to the input MIDI file. Default ``None`` which means that a track 
             of the MIDI file will be selected to be cut.
@@ -327,68 +806,74 @@ class MidiProcessing:
             Numer of the track to cut if select_track_by = ``program_number``.
         program_name : str
             Name of the track to cut if select_track_by = ``track_name``.    
+        bar : str
+            Bar measure, e.g. ``3/4``. Default ``None`` which means the
+            time signatures of the file (``4/4`` with ``bpm``).
+        ranges : list of (int, int)
+            List of ``(start_bar, end_bar)`` cuts. If it is given
+            ``start_bar`` and ``end_bar`` are ignored and a list of tuples is
+            returned.
         
         Returns
         -------
-        tuples : tuple of [np.ndarray, np.ndarray, np.ndarray]
-            Tuple of pitch, onsets and offsets times in seconds.
+        tuples : tuple of [np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+            Tuple of pitch, onsets, offsets times in seconds (relative to
+            the start of the cut) and velocities. A list of them, one per
+            cut, if ``ranges`` is given.
+            
+        Raises
+        ------
+        ValueError
+            If neither ``start_bar`` and ``end_bar`` nor ``ranges`` are 
+            given, a bar is negative, or an ending bar is lower than its 
+            starting bar or greater than the number of bars of the file.
         """
         
-        if bpm == None:
-            changes_array, bpm_array, n_bars_per_change_bpm, changes_bars, n_bars = self.get_bars()
-            
+        if bpm is None:
+            tempo_map = self.get_tempo_map(bar)
         else:
-            n_bars = self.get_bars(bpm)
-        
-        if end_bar > n_bars:
-            raise ValueError('The number of bars in the MIDI file', n_bars, 'is lower than the number of bars given', end_bar)
+            tempo_map = TempoMap.constant(bpm, bar or '4/4', self.get_duration())
+        bar_times = tempo_map.bar_times
+        n_bars = tempo_map.n_bars
+        
+        if ranges is None and (start_bar is None or end_bar is None):
+            raise ValueError('start_bar and end_bar, or ranges, must be given.')
+        bar_ranges = ranges if ranges is not None else [(start_bar, end_bar)]
+        bar_ranges = np.asarray(bar_ranges, dtype=np.int64).reshape(-1, 2)
+        
+        if np.any(bar_ranges < 0):
+            raise ValueError('The bars cannot be negative, got {}'.format(bar_ranges.min()))
+        if np.any(bar_ranges[:, 1] < bar_ranges[:, 0]):
+            start, end = bar_ranges[np.argmax(bar_ranges[:, 1] < bar_ranges[:, 0])]
+            raise ValueError('The ending bar {} is lower than the starting bar {}'.format(end, start))
+        if np.any(bar_ranges[:, 1] > n_bars):
+            raise ValueError('The number of bars in the MIDI file {} is lower than the number of bars given {}'.format(n_bars, bar_ranges[:, 1].max()))
     
         if tuple_notes is None:
-            if select_track_by == 'track_name':
-                tuple_notes = self.get_notestuple_of_singletrack_by_name(program_name)
-            
-            elif select_track_by == 'program_number':
-                tuple_notes = self.get_notestuple_of_singletrack_by_nprogram(track_n)
-        else:
-            tuple_notes = tuple_notes
-            
-        # Array of all the bars one by one ordered [0, 1, 2, 3...]
-        bars_array = np.arange(0, np.ceil(n_bars), 1)
-        # Initialize the array of all the bpm in each bar of the bars_array
-        bpm_bar_array = np.zeros(len(bars_array))
-        # We loop to write the bpm_bar_array 
-        change_ant = 0
-        for i, change in enumerate(changes_bars):
-            if i != 0:
-                change = int(change)
-                bpm_bar_array[change_ant:int(change)] = bpm_array[i-1]
-                change_ant = change 
-        
-        # Array of time duration of each bar obtained with bpm value of each bar
-        sec_per_bar = np.zeros(len(bars_array))
-        for b, bpms in enumerate(bpm_bar_array):
-                sec_per_bar[b] = (60 / bpms) * 4
-
-        # We loop in the array of bar duration so we can cut the time according
-        # to the desired starting and ending bars
-        for i in enumerate(sec_per_bar):
-            
-            start_time_sec = np.sum(sec_per_bar[0:start_bar])
-            end_time_sec = np.sum(sec_per_bar[0:end_bar])
-            
-            pitch = []
-            onsets = []
-            offsets = []
-            for i, onset in enumerate(tuple_notes[1]):
-                if (onset or tuple_notes[2][i] >= start_time_sec) and (onset or tuple_notes[2][i]) <= end_time_sec:
-                    pitch.append(tuple_notes[0][i])
-                    onsets.append(tuple_notes[1][i] - start_time_sec)
-                    offsets.append(tuple_notes[2][i] - start_time_sec)
-    
-    
-            tuples = lists_to_tuple(pitch, onsets, offsets)
-        
-        return tuples
+            tuple_notes = self._select_track(select_track_by, track_n, program_name)
+        pitch, onsets, offsets, velocity = _note_columns(tuple_notes)
+        
+        # Sort the notes by onset once and find the first note of every 
+        # range boundary
+        order = np.argsort(onsets, kind='stable')
+        sorted_onsets = onsets[order]
+        start_times = bar_times[bar_ranges[:, 0]]
+        first = np.searchsorted(sorted_onsets, start_times, side='left')
+        last = np.searchsorted(sorted_onsets, bar_times[bar_ranges[:, 1]], side='left')
+        
+        cuts = []
+        for start_time_sec, lo, hi in zip(start_times, first, last):
+            # Keep the original order of the notes of the track
+            rows = np.sort(order[lo:hi])
+            cuts.append(lists_to_tuple(pitch[rows], 
+                                       onsets[rows] - start_time_sec, 
+                                       offsets[rows] - start_time_sec,
+                                       velocity[rows] if velocity is not None else None))
+        
+        if ranges is not None:
+            return cuts
+        
+        return cuts[0]
   
  
     def get_singletrack_by_name(self, track_name):
@@ -407,16 +892,7 @@ class MidiProcessing:
             Tuple of pitch, onsets and offsets times in seconds.       
         """
         
-        all_tracks = self.get_tracks()
-        
-        if not any([track_name == all_tracks[i]["track_name"] for i in all_tracks]):
-            raise ValueError("The introduced track name {} is not in the MIDI file".format(track_name))
-        else:
-            for i in all_tracks:
-                if all_tracks[i]["track_name"] == track_name:
-                    track = all_tracks[i]
-          
-        return track
+        return self._lookup("track_name", track_name, "track name")
     
     
     def get_singletrack_by_ntrack(self, track_number):
@@ -435,16 +911,7 @@ class MidiProcessing:
             Tuple of pitch, onsets and offsets times in seconds.       
         """
         
-        all_tracks = self.get_tracks()
-        
-        if not any([track_number == all_tracks[i]["n_track"] for i in all_tracks]):
-            raise ValueError("The introduced track number {} is not in the MIDI file".format(track_number))
-        else:
-            for i in all_tracks:
-                if all_tracks[i]["n_track"] == track_number:
-                    track = all_tracks[i]
-          
-        return track
+        return self._lookup("n_track", track_number, "track number")
             
     
     def get_singletrack_by_nprogram(self, program_number):
@@ -463,16 +930,7 @@ class MidiProcessing:
             Tuple of pitch, onsets and offsets times in seconds.       
         """
  
-        all_tracks = self.get_tracks()
-        
-        if not any([program_number == all_tracks[i]["n_program"] for i in all_tracks]):
-            raise ValueError("The introduced program number {} is not in the MIDI file".format(program_number))
-        else:
-            for i in all_tracks:
-                if all_tracks[i]["n_program"] == program_number:
-                    track = all_tracks[i]
-          
-        return track
+        return self._lookup("n_program", program_number, "program number")
 
     
     """
@@ -516,12 +974,113 @@ COLOR = ['#D676FF',
          '#737D73'] 
                
                
+# Above this number of notes per pixel column of the axis the ``auto`` render
+# mode draws the pianoroll as an image
+RASTER_DENSITY = 10
+
+
 class Pianoroll:      
     
     """This class presents a collection of functions to plot 
     MIDI tracks pianorolls.
+    
+    The plot methods return the figure and axes they draw in. Figures 
+    created by them stay open until they are closed with ``close``, or they
+    can be created with the ``figure`` context manager, which closes them 
+    on exit.
+    
+    Parameters
+    ----------
+    pyplot : bool
+        Creates the figures with ``pyplot`` so they are shown by 
+        ``plt.show`` and in notebooks. If ``False`` the figures are plain 
+        matplotlib ``Figure`` objects with an Agg canvas, which are not 
+        registered anywhere and are freed when they are not referenced. 
+        Default ``True``.
+        
+    Examples
+    --------
+    >>> pianoroll = midiplot.Pianoroll(pyplot=False)
+    >>> with pianoroll.figure() as (fig, ax):
+    ...     pianoroll.plot_all_tracks(midi.get_tracks(), ax=ax)
+    ...     fig.savefig('tracks.png')
     """
     
+    def __init__(self, pyplot=True):
+        
+        self.pyplot = pyplot
+        
+        
+    def _subplots(self, nrows=1, figsize=(20, 5)):
+        
+        """This function creates a figure with ``nrows`` axes in a column."""
+        
+        if self.pyplot:
+            import matplotlib.pyplot as plt
+            return plt.subplots(nrows, 1, figsize=figsize, squeeze=False)
+        
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        
+        return fig, fig.subplots(nrows, 1, squeeze=False)
+    
+    
+    def close(self, fig):
+        
+        """This function releases the artists of a figure and closes it.
+        
+        Parameters
+        ----------
+        fig : matplotlib.figure.Figure
+            Figure returned by a plot method.
+        """
+        
+        fig.clf()
+        if self.pyplot:
+            import matplotlib.pyplot as plt
+            plt.close(fig)
+    
+    
+    @contextlib.contextmanager
+    def figure(self, nrows=1, figsize=(20, 5)):
+        
+        """This function is a context manager which creates a figure and 
+        closes it on exit.
+        
+        Parameters
+        ----------
+        nrows : int
+            Number of axes in a column. Default ``1``.
+        figsize : tuple of floats
+            Size of the figure in inches. Default ``(20, 5)``.
+            
+        Yields
+        ------
+        fig : matplotlib.figure.Figure
+            Figure.
+        ax : matplotlib.axes or np.ndarray
+            Axis, or array of axes if ``nrows`` is greater than 1.
+        """
+        
+        fig, axes = self._subplots(nrows, figsize)
+        try:
+            yield fig, axes[0, 0] if nrows == 1 else axes[:, 0]
+        finally:
+            self.close(fig)
+    
+    
+    def _bar_ticks(self, ax, n_bars):
+        
+        """This function puts the ticks of the x axis on the bars, with at
+        most about 50 labels."""
+        
+        step = max(int(np.ceil(n_bars / 50)), 1)
+        ax.set_xticks(np.arange(0, round(n_bars) + 1, step))
+        
+    
     def setup(self, ax, axis='time'):
         
         """This function is the setup of the axis of the pianoroll plots.
@@ -536,13 +1095,15 @@ class Pianoroll:
         """
         
         if axis == 'time':
-            plt.xlabel('time s')
+            ax.set_xlabel('time s')
         elif axis == 'bar':
-            plt.xlabel('bar')
+            ax.set_xlabel('bar')
         else:
             raise ValueError('Axis must be time or bar.')
             
-        plt.ylabel('Pitch')
+        from matplotlib.ticker import MultipleLocator
+        
+        ax.set_ylabel('Pitch')
         ax.yaxis.set_major_locator(MultipleLocator(1))
         ax.grid(linewidth=0.25)
         ax.set_facecolor('#282828')
@@ -564,13 +1125,15 @@ class Pianoroll:
         """
         
         if axis == 'time':
-            plt.xlabel('time s')
+            ax.set_xlabel('time s')
         elif axis == 'bar':
-            plt.xlabel('bar')
+            ax.set_xlabel('bar')
         else:
             raise ValueError('Axis must be time or bar.')
             
-        ylabel = 'Pitch'
+        from matplotlib.ticker import MultipleLocator
+        
+        ax.set_ylabel('Pitch')
         ax.yaxis.set_major_locator(MultipleLocator(1))
         ax.grid(linewidth=0.25)
         ax.set_facecolor('#282828')
@@ -578,15 +1141,46 @@ class Pianoroll:
         return self
     
 
+    def _bar_tempo_map(self, duration, bpm, bar, tempo_map):
+        
+        """This function returns the tempo map used to plot the bars axis:
+        ``tempo_map`` if it is given (e.g. ``MidiProcessing.tempo_map``), 
+        a constant ``bpm`` and ``bar`` tempo map otherwise."""
+        
+        if tempo_map is not None:
+            return tempo_map
+        
+        return TempoMap.constant(bpm, bar, duration)
+    
+    
+    def _note_x(self, track, axis='time', time_1_bar=None, tempo_map=None):
+        
+        """This function returns the x coordinates of the onsets and offsets
+        of the notes of a track in the units of ``axis``."""
+        
+        note_on = np.asarray(track["note_on"], dtype=np.float64)
+        note_off = np.asarray(track["note_off"], dtype=np.float64)
+        
+        if axis == 'time':
+            return note_on, note_off
+        elif axis == 'bar':
+            if tempo_map is not None:
+                return tempo_map.seconds_to_bars(note_on), tempo_map.seconds_to_bars(note_off)
+            return note_on / time_1_bar, note_off / time_1_bar
+        
+        raise ValueError('Axis must be time or bar.')
+    
+
     def _track_loop(self, track, ax, COLOR, COLOR_EDGES, 
-                   axis='time', time_1_bar=None):
+                   axis='time', time_1_bar=None, tempo_map=None):
     
-        """This function is the loop which plots the the pianoroll of a track.
+        """This function plots the pianoroll of a track with one collection
+        of note rectangles and one collection of onset lines.
         
         Parameters
         ----------
-        notes_tuple : tuple of [np.ndarray, np.ndarray, np.ndarray]
-            Tuple of pitch, onsets and offsets times in seconds.  
+        track : dict
+            Track in the format of ``MidiProcessing.get_tracks``.
         ax : matplotlib.axes
             Axis.
         COLOR : list
@@ -599,39 +1193,150 @@ class Pianoroll:
         time_1_bar : float
             Time duration of 1 bar. Default ``None`` so it will be calculated
             in ``plot`` functions.
+        tempo_map : TempoMap
+            Tempo map used to convert seconds to bars. If it is given 
+            ``time_1_bar`` is ignored.
         """
-                
-        for i in range(len(track["note_on"])):
-            if axis == 'time':
-                x = track["note_on"][i]
-            elif axis == 'bar':
-                x = track["note_on"][i] / time_1_bar
-                   
-            plt.vlines(x = x, 
-                       ymin = track["pitch"][i], 
-                       ymax = track["pitch"][i]+1,
-                       color=COLOR_EDGES, 
-                       linewidth=0.01,
-                       label=track["track_name"])
-                           
-            ax.add_patch(plt.Rectangle((x, track["pitch"][i]), 
-                                        width = track["note_off"][i] - track["note_on"][i],
-                                        height = 1,
-                                        alpha = 0.5,
-                                        edgecolor = COLOR_EDGES,
-                                        facecolor = COLOR))
-          
-    def _track_loop_html(self, track, fig, COLOR, COLOR_EDGES, 
-                        axis='time', time_1_bar=None):
+        
+        from matplotlib.collections import PolyCollection
+        
+        note_x, note_off_x = self._note_x(track, axis, time_1_bar, tempo_map)
+        pitch = np.asarray(track["pitch"], dtype=np.float64)
+        
+        # One collection per track instead of two artists per note
+        ax.vlines(note_x, pitch, pitch + 1,
+                  color=COLOR_EDGES, 
+                  linewidth=0.01,
+                  label=track["track_name"])
+        
+        verts = np.empty((len(pitch), 4, 2))
+        verts[:, 0, 0] = verts[:, 1, 0] = note_x
+        verts[:, 2, 0] = verts[:, 3, 0] = note_off_x
+        verts[:, 0, 1] = verts[:, 3, 1] = pitch
+        verts[:, 1, 1] = verts[:, 2, 1] = pitch + 1
+        
+        ax.add_collection(PolyCollection(verts,
+                                         alpha = 0.5,
+                                         edgecolor = COLOR_EDGES,
+                                         facecolor = COLOR))
+        ax.autoscale_view()
+        metrics.count('artists', 2)
+
+    def _raster_tracks(self, tracks, ax, colors, axis='time', time_1_bar=None, 
+                       tempo_map=None):
+        
+        """This function draws the pianorolls of several tracks as one image
+        with a column per pixel of the axis. The tracks are composited over
+        each other with their colors and an alpha of 0.5."""
+        
+        import matplotlib.colors
+        
+        x = [self._note_x(track, axis, time_1_bar, tempo_map) for track in tracks]
+        x_min = min((np.min(on, initial=np.inf) for on, _ in x), default=np.inf)
+        x_max = max((np.max(off, initial=-np.inf) for _, off in x), default=-np.inf)
+        if not x_min < x_max:
+            return
+        
+        width = max(int(np.ceil(ax.get_window_extent().width)), 1)
+        frames_per_x = width / (x_max - x_min)
+        
+        image = np.zeros((128, width, 4))
+        pitch_min, pitch_max = 127, 0
+        for track, (note_on, note_off), color in zip(tracks, x, colors):
+            pitch = np.asarray(track["pitch"], dtype=np.int64)
+            if not len(pitch):
+                continue
+            pitch_min, pitch_max = min(pitch_min, pitch.min()), max(pitch_max, pitch.max())
+            
+            # Every note covers at least one pixel
+            start = np.minimum(((note_on - x_min) * frames_per_x).astype(np.int64), width - 1)
+            stop = np.maximum(np.ceil((note_off - x_min) * frames_per_x).astype(np.int64), start + 1)
+            alpha = roll.piano_roll(pitch, start, stop, n_frames=width)[..., np.newaxis] * 0.5
+            
+            rgb = np.asarray(matplotlib.colors.to_rgb(color))
+            image[..., :3] = alpha * rgb + (1 - alpha) * image[..., :3]
+            image[..., 3:] = alpha + (1 - alpha) * image[..., 3:]
+        
+        # Colors were blended premultiplied
+        opaque = image[..., 3] > 0
+        image[opaque, :3] /= image[opaque, 3:]
+        
+        # The image already has a column per pixel, 'nearest' also exists in
+        # the matplotlib of requirements.txt
+        ax.imshow(image, extent=(x_min, x_max, 0, 128), origin='lower', 
+                  aspect='auto', interpolation='nearest')
+        metrics.count('artists')
+        ax.set_xlim(x_min, x_max)
+        ax.set_ylim(pitch_min, pitch_max + 1)
+        
     
-        """This function is the loop which plots the the pianoroll of a track.
+    def _draw_tracks(self, tracks, ax, colors, edge_colors, axis='time', 
+                     time_1_bar=None, tempo_map=None, render='auto'):
+        
+        """This function draws the pianorolls of several tracks in an axis.
         
         Parameters
         ----------
-        notes_tuple : tuple of [np.ndarray, np.ndarray, np.ndarray]
-            Tuple of pitch, onsets and offsets times in seconds.  
+        tracks : list of dicts
+            Tracks in the format of ``MidiProcessing.get_tracks``.
         ax : matplotlib.axes
             Axis.
+        colors : list
+            Color of the notes of each track, cycled if there are more
+            tracks than colors.
+        edge_colors : list
+            Color of the note borders of each track, cycled like
+            ``colors``.
+        axis : str
+            Change axis between ``time`` to plot time in seconds in the x axis 
+            or ``bar`` to plot the bars.   
+        time_1_bar : float
+            Time duration of 1 bar.
+        tempo_map : TempoMap
+            Tempo map used to convert seconds to bars.
+        render : str
+            ``vector`` draws every note, ``raster`` draws an image of the 
+            pianoroll at the resolution of the axis and ``auto`` rasters when
+            there are more than ``RASTER_DENSITY`` notes per pixel column.
+        """
+        
+        if render not in ('auto', 'vector', 'raster'):
+            raise ValueError('render must be auto, vector or raster.')
+            
+        # The colors are cycled so no track is dropped when there are more
+        # tracks than colors
+        colors = list(itertools.islice(itertools.cycle(colors), len(tracks)))
+        edge_colors = list(itertools.islice(itertools.cycle(edge_colors), len(tracks)))
+            
+        n_notes = sum(len(track["note_on"]) for track in tracks)
+        if render == 'auto':
+            width = ax.get_window_extent().width
+            render = 'raster' if n_notes > RASTER_DENSITY * width else 'vector'
+            
+        with metrics.span('draw', render=render):
+            if render == 'raster':
+                self._raster_tracks(tracks, ax, colors, axis, time_1_bar, tempo_map)
+            else:
+                for track, color, edge_color in zip(tracks, colors, edge_colors):
+                    self._track_loop(track, ax, color, edge_color, axis=axis, 
+                                     time_1_bar=time_1_bar, tempo_map=tempo_map)
+        metrics.count('notes_drawn', n_notes)
+            
+          
+    def _track_loop_html(self, track, fig, COLOR, COLOR_EDGES, 
+                        axis='time', time_1_bar=None, tempo_map=None):
+    
+        """This function plots the pianoroll of a track as a ``Scattergl``
+        trace of rectangles and a trace of invisible markers, one at the
+        center of each note, with the onset, offset, pitch and velocity of
+        the note in its hover.
+        
+        Parameters
+        ----------
+        track : dict
+            Track in the format of ``MidiProcessing.get_tracks``.
+        fig : plotly.graph_objects.Figure
+            Figure.
         COLOR : list
             Predefined list of colors to plot notes on the pianorolls. 
         COLOR_EDGES : list
@@ -642,42 +1347,74 @@ class Pianoroll:
         time_1_bar : float
             Time duration of 1 bar. Default ``None`` so it will be calculated
             in ``plot`` functions.
+        tempo_map : TempoMap
+            Tempo map used to convert seconds to bars. If it is given 
+            ``time_1_bar`` is ignored.
         """
-                
-        for i in range(len(track["note_on"])):
-            if axis == 'time':
-                x = track["note_on"][i]
-            elif axis == 'bar':
-                x = track["note_on"][i] / time_1_bar
-
-            
-            fig.add_shape(type="rect",
-                          x0=x,
-                          y0=track["pitch"][i],
-                          x1=track["note_off"][i],
-                          y1=track["pitch"][i]+1,
-                          line=dict(
-                                color=COLOR_EDGES,
-                                width=2,
-                            ),
-                          fillcolor=COLOR,
-                          name=track["track_name"])
-            
-            fig.add_trace(
-                    go.Scatter(
-                        x=[x,x,track["note_off"][i],track["note_off"][i],x], 
-                        y=[track["pitch"][i],track["pitch"][i]+1,track["pitch"][i]+1,track["pitch"][i],track["pitch"][i]], 
-                        fill="toself",
-                        mode='lines',
-                        name='',
-                        text='{} {} {} {} {}'.format(track["track_name"],track["n_program"],track["note_on"],track["note_off"],track["pitch"]),
-                        opacity=0
-                        )
+        
+        note_x, note_off_x = self._note_x(track, axis, time_1_bar, tempo_map)
+        pitch = np.asarray(track["pitch"], dtype=np.float32)
+        n_notes = len(pitch)
+        
+        # Closed rectangles separated by NaN gaps, so the whole track is a
+        # single WebGL trace
+        x = np.empty((n_notes, 6), dtype=np.float32)
+        x[:, 0] = x[:, 1] = x[:, 4] = note_x
+        x[:, 2] = x[:, 3] = note_off_x
+        x[:, 5] = np.nan
+        y = np.empty((n_notes, 6), dtype=np.float32)
+        y[:, 0] = y[:, 3] = y[:, 4] = pitch
+        y[:, 1] = y[:, 2] = pitch + 1
+        y[:, 5] = np.nan
+        
+        import plotly.graph_objects as go
+        
+        # Hover data of each note, stored once on a marker at its center
+        # instead of on each of its 6 vertices
+        customdata = np.column_stack([np.asarray(track["note_on"], dtype=np.float32),
+                                      np.asarray(track["note_off"], dtype=np.float32),
+                                      pitch,
+                                      np.asarray(track["velocity"], dtype=np.float32)
+                                      if "velocity" in track else np.full(n_notes, np.nan, dtype=np.float32)])
+        
+        fig.add_trace(
+                go.Scattergl(
+                    x=x.ravel(), 
+                    y=y.ravel(), 
+                    fill="toself",
+                    fillcolor=COLOR,
+                    mode='lines',
+                    line=dict(color=COLOR_EDGES, width=2),
+                    name=track["track_name"],
+                    legendgroup=str(track["n_track"]),
+                    hoverinfo='skip'
+                    )
+                )
+        fig.add_trace(
+                go.Scattergl(
+                    x=(np.asarray(note_x, dtype=np.float32) + np.asarray(note_off_x, dtype=np.float32)) / 2,
+                    y=pitch + 0.5,
+                    mode='markers',
+                    marker=dict(color=COLOR, opacity=0),
+                    name=track["track_name"],
+                    legendgroup=str(track["n_track"]),
+                    showlegend=False,
+                    customdata=customdata,
+                    hovertemplate='{} {}<br>'.format(track["track_name"], track["n_program"]) +
+                                  'on %{customdata[0]:.3f} s<br>'
+                                  'off %{customdata[1]:.3f} s<br>'
+                                  'pitch %{customdata[2]}<br>'
+                                  'velocity %{customdata[3]}<extra></extra>'
                     )
+                )
+        metrics.count('traces', 2)
+        metrics.count('notes_drawn', n_notes)
                 
     
+    @metrics.timed()
     def plot_singletrack_pianoroll(self, track, bpm=120, 
-                                   axis='time', bar='4/4', plot_title=''):
+                                   axis='time', bar='4/4', plot_title='',
+                                   tempo_map=None, render='auto', ax=None):
                 
         """This function plots a pianoroll of a single track.
         
@@ -691,37 +1428,61 @@ class Pianoroll:
             Change axis between ``time`` to plot time in seconds in the x axis 
             or ``bar`` to plot the bars.       
         bar : str
-            Bar measure ``2/4``, ``3/4`` or ``4/4``. Default ``4/4``.
+            Bar measure, e.g. ``3/4``. Default ``4/4``.
         plot_title : str
             Writes a title in the pianoroll plot. Default ``''`` no title.
+        tempo_map : TempoMap
+            Tempo map of the MIDI file (``MidiProcessing.tempo_map``) used for
+            the ``bar`` axis. If it is given ``bpm`` and ``bar`` are ignored.
+        render : str
+            ``vector`` draws every note, ``raster`` draws an image of the 
+            pianoroll at the resolution of the figure and ``auto`` switches 
+            to ``raster`` above ``RASTER_DENSITY`` notes per pixel column. 
+            Default ``auto``.
+        ax : matplotlib.axes
+            Axis where the pianoroll is drawn. Default ``None`` which creates
+            a new figure.
+            
+        Returns
+        -------
+        fig : matplotlib.figure.Figure
+            Figure.
+        ax : matplotlib.axes
+            Axis.
         """
         
-        fig, ax = plt.subplots(figsize=(20, 5))
+        if ax is None:
+            fig, axes = self._subplots(figsize=(20, 5))
+            ax = axes[0, 0]
         
         if plot_title != '':
-            plt.title(plot_title)
+            ax.set_title(plot_title)
     
         if axis == 'time':
             self.setup(ax, axis)
         
-            self._track_loop(track, ax, COLOR[0], COLOR_EDGES[0])
+            self._draw_tracks([track], ax, COLOR[:1], COLOR_EDGES[:1], render=render)
             
         elif axis == 'bar':
-            # TODO fix this bc plot is not the same as plotting separately
-            duration = track["note_off"][-1]
-            n_bars = duration*60 / (int(bar[0])*bpm)
-            time_1_bar = (60 / bpm) * int(bar[0])
+            duration = np.max(track["note_off"], initial=0)
+            tempo_map = self._bar_tempo_map(duration, bpm, bar, tempo_map)
+            n_bars = tempo_map.n_bars
              
             self.setup(ax, axis=axis)
-            
-            yint = np.arange(0, round(n_bars), 1)
-            plt.yticks(yint)
         
-            self._track_loop(track, ax, COLOR[track["n_track"]], COLOR_EDGES[track["n_track"]], 
-                            axis=axis, time_1_bar = time_1_bar)
+            self._draw_tracks([track], ax, [COLOR[track["n_track"] % len(COLOR)]], 
+                              [COLOR_EDGES[track["n_track"] % len(COLOR_EDGES)]], 
+                              axis=axis, tempo_map=tempo_map, render=render)
+            self._bar_ticks(ax, n_bars)
+            
+        else:
+            raise ValueError('Axis must be time or bar.')
+            
+        return ax.figure, ax
             
     
-    def overlap_multitrack_pianorolls(self, *argv, plot_title=''):
+    @metrics.timed()
+    def overlap_multitrack_pianorolls(self, *argv, plot_title='', render='auto', ax=None):
                 
         """This function plots a multitrack pianoroll with each track in a 
         different color.
@@ -732,56 +1493,122 @@ class Pianoroll:
             Tuples of pitch, onsets and offsets times in seconds. 
         plot_title : str
             Writes a title in the pianoroll plot. Default ``''`` no title.
+        render : str
+            ``vector`` draws every note, ``raster`` draws an image of the 
+            pianoroll at the resolution of the figure and ``auto`` switches 
+            to ``raster`` above ``RASTER_DENSITY`` notes per pixel column. 
+            Default ``auto``.
+        ax : matplotlib.axes
+            Axis where the pianoroll is drawn. Default ``None`` which creates
+            a new figure.
+            
+        Returns
+        -------
+        fig : matplotlib.figure.Figure
+            Figure.
+        ax : matplotlib.axes
+            Axis.
         """
         
-        fig, ax = plt.subplots(figsize=(20, 10))
+        if ax is None:
+            fig, axes = self._subplots(figsize=(20, 10))
+            ax = axes[0, 0]
         
         if plot_title != '':
-            plt.title(plot_title)
+            ax.set_title(plot_title)
         
-        for i, arg in enumerate(argv):
-            self._track_loop(arg, ax, COLOR[i+1], COLOR_EDGES[i+1])
+        self._draw_tracks(argv, ax, COLOR[1:], COLOR_EDGES[1:], render=render)
             
         self.setup(ax)
+        
+        return ax.figure, ax
     
     
-    def plot_all_tracks(self, all_tracks, bpm=120, axis='time', time_1_bar=None, bar='4/4', plot_title=''):
+    @metrics.timed()
+    def plot_all_tracks(self, all_tracks, bpm=120, axis='time', time_1_bar=None, bar='4/4', plot_title='',
+                        tempo_map=None, render='auto', ax=None):
         
-        fig, ax = plt.subplots(figsize=(20, 5))
+        """This function plots the pianorolls of all the tracks of a MIDI 
+        file overlapped, each track in a different color.
+        
+        Parameters
+        ----------
+        all_tracks : dict
+            Tracks returned by ``MidiProcessing.get_tracks``.
+        bpm : int or float
+            Beats per minute. Default ``120``.
+        axis : str
+            Change axis between ``time`` to plot time in seconds in the x axis 
+            or ``bar`` to plot the bars.
+        time_1_bar : float
+            Time duration of 1 bar. Default ``None`` so it will be calculated
+            with ``bpm`` and ``bar``.
+        bar : str
+            Bar measure, e.g. ``3/4``. Default ``4/4``.
+        plot_title : str
+            Writes a title in the pianoroll plot. Default ``''`` no title.
+        tempo_map : TempoMap
+            Tempo map of the MIDI file (``MidiProcessing.tempo_map``) used for
+            the ``bar`` axis. If it is given ``bpm``, ``bar`` and 
+            ``time_1_bar`` are ignored.
+        render : str
+            ``vector`` draws every note, ``raster`` draws an image of the 
+            pianoroll at the resolution of the figure and ``auto`` switches 
+            to ``raster`` above ``RASTER_DENSITY`` notes per pixel column. 
+            Default ``auto``.
+        ax : matplotlib.axes
+            Axis where the pianoroll is drawn. Default ``None`` which creates
+            a new figure.
+            
+        Returns
+        -------
+        fig : matplotlib.figure.Figure
+            Figure.
+        ax : matplotlib.axes
+            Axis.
+        """
+        
+        if ax is None:
+            fig, axes = self._subplots(figsize=(20, 5))
+            ax = axes[0, 0]
         
         if plot_title != '':
-            plt.title(plot_title)
+            ax.set_title(plot_title)
         
         if axis == 'bar':
-            max_note_off_list = []
-            for key in all_tracks.keys():
-                max_note_off_list.append(all_tracks[key]["note_off"][-1])
-            
-            duration = max(max_note_off_list)
-            n_bars = duration*60 / (int(bar[0])*bpm)
-            time_1_bar = (60 / bpm) * int(bar[0])
-                         
-            yint = np.arange(0, round(n_bars), 1)
-            plt.yticks(yint)
+            duration = max(np.max(all_tracks[key]["note_off"], initial=0) 
+                           for key in all_tracks.keys())
+            if time_1_bar is None:
+                tempo_map = self._bar_tempo_map(duration, bpm, bar, tempo_map)
+                n_bars = tempo_map.n_bars
+            else:
+                n_bars = duration / time_1_bar
 			
-        elif axis == 'time':  
-            # TODO fix this
-            print('')
-        else:
+        elif axis != 'time':
             raise ValueError("Introduced axis is not valid.")
 
+        self._draw_tracks(list(all_tracks.values()), ax, 
+                          [COLOR[key % len(COLOR)] for key in all_tracks.keys()], 
+                          [COLOR_EDGES[key % len(COLOR_EDGES)] for key in all_tracks.keys()],
+                          axis=axis, time_1_bar=time_1_bar, tempo_map=tempo_map,
+                          render=render)
+
+        import matplotlib.patches as mpatches
+        
         patch_list = []
         for key in all_tracks.keys():
-            self._track_loop(all_tracks[key], ax, COLOR[key], COLOR_EDGES[key],
-                            axis=axis, time_1_bar=time_1_bar)
-            
-            patch = mpatches.Patch(color=COLOR[key], label=all_tracks[key]["track_name"])
+            patch = mpatches.Patch(color=COLOR[key % len(COLOR)], label=all_tracks[key]["track_name"])
             patch_list.append(patch)
-        plt.legend(handles=patch_list, bbox_to_anchor=(1, 1), loc='upper left')
+        ax.legend(handles=patch_list, bbox_to_anchor=(1, 1), loc='upper left')
         self.setup(ax, axis)
+        if axis == 'bar':
+            self._bar_ticks(ax, n_bars)
+            
+        return ax.figure, ax
             
         
-    def subplot_pianoroll(self, *args, plot_title=''):
+    @metrics.timed()
+    def subplot_pianoroll(self, *args, plot_title='', render='auto'):
     
         """This function plots the pinoroll of single tracks in different
         subplots.
@@ -792,23 +1619,41 @@ class Pianoroll:
             Tuples of pitch, onsets and offsets times in seconds. 
         plot_title : str
             Writes a title in the pianoroll plot. Default ``''`` no title.
+        render : str
+            ``vector`` draws every note, ``raster`` draws an image of the 
+            pianoroll at the resolution of the figure and ``auto`` switches 
+            to ``raster`` above ``RASTER_DENSITY`` notes per pixel column. 
+            Default ``auto``.
+            
+        Returns
+        -------
+        fig : matplotlib.figure.Figure
+            Figure.
+        axes : np.ndarray
+            Axes of the tracks.
         """ 
         
-        fig, ax = plt.subplots(len(args), 1, figsize=(20, 2*len(args)))
+        fig, axes = self._subplots(len(args), figsize=(20, 2*len(args)))
                 
-        plt.subplots_adjust(hspace=0.010)
+        fig.subplots_adjust(hspace=0.010)
+        if plot_title != '':
+            fig.suptitle(plot_title)
 
         for i, arg in enumerate(args):
-            ax = fig.add_subplot(i+1, 1, i+1)
-            self.track_loop(arg, ax, COLOR[i+1], COLOR_EDGES[i+1])
+            ax = axes[i, 0]
+            self._draw_tracks([arg], ax, [COLOR[(i+1) % len(COLOR)]], 
+                              [COLOR_EDGES[(i+1) % len(COLOR_EDGES)]], render=render)
             
             self.setup(ax)
             
+        return fig, axes[:, 0]
+            
 
+    @metrics.timed()
     def plot_singletrack_pianoroll_html(self, track, bpm=120, 
                                         axis='time', bar='4/4', plot_title='',
                                         save_html=False, fig_path=None,
-                                        name_fig='plot'):
+                                        name_fig='plot', tempo_map=None, show=True):
                 
         """This function plots a pianoroll of a single track.
         
@@ -822,9 +1667,19 @@ class Pianoroll:
             Change axis between ``time`` to plot time in seconds in the x axis 
             or ``bar`` to plot the bars.       
         bar : str
-            Bar measure ``2/4``, ``3/4`` or ``4/4``. Default ``4/4``.
+            Bar measure, e.g. ``3/4``. Default ``4/4``.
         plot_title : str
             Writes a title in the pianoroll plot. Default ``''`` no title.
+        tempo_map : TempoMap
+            Tempo map of the MIDI file (``MidiProcessing.tempo_map``) used for
+            the ``bar`` axis. If it is given ``bpm`` and ``bar`` are ignored.
+        show : bool
+            Opens the figure with ``fig.show``. Default ``True``.
+            
+        Returns
+        -------
+        fig : plotly.graph_objects.Figure
+            Figure.
         """
         # TODO fix
         
@@ -834,13 +1689,13 @@ class Pianoroll:
         else:
             title = ''
             
-        fig = go.Figure(data=go.Scatter(),
-                        layout=go.Layout({"title"      : title,
+        import plotly.graph_objects as go
+        
+        fig = go.Figure(layout=go.Layout({"title"      : title,
                                           "template"   : "plotly_dark",
                                           "xaxis"      : {'title':axis}, 
                                           "yaxis"      : {'title':'pitch'},
-                                          })
-                        )
+                                          }))
     
         if axis == 'time':
             #self.setup(ax, axis)
@@ -848,81 +1703,291 @@ class Pianoroll:
             self._track_loop_html(track, fig, COLOR[0], COLOR_EDGES[0])
             
         elif axis == 'bar':
-            # TODO fix this bc plot is not the same as plotting separately
-            duration = track["note_off"][-1]
-            n_bars = duration*60 / (int(bar[0])*bpm)
-            time_1_bar = (60 / bpm) * int(bar[0])
+            duration = np.max(track["note_off"], initial=0)
+            tempo_map = self._bar_tempo_map(duration, bpm, bar, tempo_map)
+            n_bars = tempo_map.n_bars
              
             #self.setup(ax, axis=axis)
             
-            yint = np.arange(0, round(n_bars), 1)
-            plt.yticks(yint)
+            fig.update_xaxes(dtick=max(int(np.ceil(n_bars / 50)), 1))
         
-            self._track_loop_html(track, fig, COLOR[track["n_track"]], COLOR_EDGES[track["n_track"]], 
-                                 axis=axis, time_1_bar = time_1_bar)
+            self._track_loop_html(track, fig, COLOR[track["n_track"] % len(COLOR)], 
+                                  COLOR_EDGES[track["n_track"] % len(COLOR_EDGES)], 
+                                 axis=axis, tempo_map=tempo_map)
                 
         if save_html:
-            if fig_path is not None:
-                fig.write_html(fig_path + '/' + name_fig + ".html")
-            else:
-                fig.write_html("../" + name_fig + ".html")
+            html_path = (fig_path if fig_path is not None else "..") + '/' + name_fig + ".html"
+            with metrics.span('write'):
+                fig.write_html(html_path)
+            metrics.count('bytes_written', os.path.getsize(html_path))
           
         fig.update_layout(legend={"xanchor":"center", "yanchor":"top"})
-        fig.show()
+        if show:
+            fig.show()
+            
+        return fig
        
         
-    def plot_all_tracks_html(self, all_tracks, bpm=120, axis='time', time_1_bar=None, bar='4/4', plot_title=''):
+    @metrics.timed()
+    def plot_all_tracks_html(self, all_tracks, bpm=120, axis='time', time_1_bar=None, bar='4/4', plot_title='',
+                             tempo_map=None, show=True):
         # TODO fix
-        fig = go.Figure()
         
         if plot_title != '':
             title = plot_title
         else:
             title = ''
             
-        fig = go.Figure(data=go.Scatter(),
-                        layout=go.Layout({"title"      : title,
+        import plotly.graph_objects as go
+        
+        fig = go.Figure(layout=go.Layout({"title"      : title,
                                           "template"   : "plotly_dark",
                                           "xaxis"      : {'title':axis}, 
                                           "yaxis"      : {'title':'pitch'},
-                                          })
-                        )
+                                          }))
             
         if axis == 'bar':
-            max_note_off_list = []
-            for key in all_tracks.keys():
-                max_note_off_list.append(all_tracks[key]["note_off"][-1])
-            
-            duration = max(max_note_off_list)
-            n_bars = duration*60 / (int(bar[0])*bpm)
-            time_1_bar = (60 / bpm) * int(bar[0])
+            duration = max(np.max(all_tracks[key]["note_off"], initial=0) 
+                           for key in all_tracks.keys())
+            if time_1_bar is None:
+                tempo_map = self._bar_tempo_map(duration, bpm, bar, tempo_map)
+                n_bars = tempo_map.n_bars
+            else:
+                n_bars = duration / time_1_bar
                          
-            yint = np.arange(0, round(n_bars), 1)
-            plt.yticks(yint)
+            fig.update_xaxes(dtick=max(int(np.ceil(n_bars / 50)), 1))
      
     
         #patch_list = []
         for key in all_tracks.keys():
-            self._track_loop_html(all_tracks[key], fig, COLOR[key], COLOR_EDGES[key],
-                            axis=axis, time_1_bar=time_1_bar)
+            self._track_loop_html(all_tracks[key], fig, COLOR[key % len(COLOR)], 
+                                  COLOR_EDGES[key % len(COLOR_EDGES)],
+                            axis=axis, time_1_bar=time_1_bar, tempo_map=tempo_map)
             
             #patch = mpatches.Patch(color=COLOR[key], label=all_tracks[key]["track_name"])
             #patch_list.append(patch)
         #plt.legend(handles=patch_list, bbox_to_anchor=(1, 1), loc='upper left')
         #self.setup_html_plot(fig, axis)
         fig.update_layout(legend={"xanchor":"center", "yanchor":"top"})
-        fig.show()
+        if show:
+            fig.show()
+            
+        return fig
+        
+        
+    def _tracks_x(self, all_tracks, axis='time', bpm=120, bar='4/4', tempo_map=None):
+        
+        """This function returns the onsets and offsets of the notes of every
+        track in the units of ``axis``."""
+        
+        if axis == 'bar':
+            duration = max((np.max(all_tracks[key]["note_off"], initial=0) 
+                            for key in all_tracks.keys()), default=0)
+            tempo_map = self._bar_tempo_map(duration, bpm, bar, tempo_map)
+        elif axis != 'time':
+            raise ValueError('Axis must be time or bar.')
+            
+        return [self._note_x(all_tracks[key], axis, tempo_map=tempo_map) 
+                for key in all_tracks.keys()]
+    
+    
+    @metrics.timed()
+    def plot_all_tracks_tiles_html(self, all_tracks, fig_path, name_fig='plot', 
+                                   bpm=120, axis='time', bar='4/4', plot_title='',
+                                   tempo_map=None, n_columns=1024, chunk_notes=5000,
+                                   include_plotlyjs=True):
+        
+        """This function writes an interactive HTML pianoroll of all the 
+        tracks for long MIDI files. The page only embeds the note density 
+        of a ``TilePyramid`` and loads the notes in chunks from the 
+        ``<name_fig>_tiles`` directory when the plot is zoomed in, so its 
+        size does not grow with the length of the file.
+        
+        Parameters
+        ----------
+        all_tracks : dict
+            Tracks returned by ``MidiProcessing.get_tracks``.
+        fig_path : str
+            Directory where the page is written.
+        name_fig : str
+            Name of the page without extension. Default ``plot``.
+        bpm : int or float
+            Beats per minute. Default ``120``.
+        axis : str
+            Change axis between ``time`` to plot time in seconds in the x axis 
+            or ``bar`` to plot the bars.
+        bar : str
+            Bar measure, e.g. ``3/4``. Default ``4/4``.
+        plot_title : str
+            Writes a title in the pianoroll plot. Default ``''`` no title.
+        tempo_map : TempoMap
+            Tempo map of the MIDI file (``MidiProcessing.tempo_map``) used for
+            the ``bar`` axis. If it is given ``bpm`` and ``bar`` are ignored.
+        n_columns : int
+            Columns of the finest density level. Default ``1024``.
+        chunk_notes : int
+            Notes per chunk. Default ``5000``.
+        include_plotlyjs : bool or str
+            ``True`` embeds plotly.js in the page, ``cdn`` loads it from
+            the plotly CDN. Default ``True``.
+            
+        Returns
+        -------
+        html_path : str
+            Path of the page.
+        """
+        
+        note_x = self._tracks_x(all_tracks, axis, bpm, bar, tempo_map)
+        pyramid = TilePyramid(all_tracks, n_columns=n_columns, chunk_notes=chunk_notes,
+                              note_x=note_x)
+        
+        return pyramid.write_html(fig_path, name_fig, plot_title=plot_title,
+                                  xaxis_title=axis, include_plotlyjs=include_plotlyjs)
+    
+    
+    @metrics.timed()
+    def plot_all_tracks_canvas_html(self, all_tracks, fig_path, name_fig='plot', 
+                                    bpm=120, axis='time', bar='4/4', plot_title='',
+                                    tempo_map=None):
+        
+        """This function writes the pianorolls of all the tracks of a MIDI 
+        file to a self-contained HTML page drawn on a canvas, without 
+        plotly. The page can be panned, zoomed and hovered.
+        
+        Parameters
+        ----------
+        all_tracks : dict
+            Tracks returned by ``MidiProcessing.get_tracks``.
+        fig_path : str
+            Directory where the page is written.
+        name_fig : str
+            Name of the page without extension. Default ``plot``.
+        bpm : int or float
+            Beats per minute. Default ``120``.
+        axis : str
+            Change axis between ``time`` to plot time in seconds in the x axis 
+            or ``bar`` to plot the bars.
+        bar : str
+            Bar measure, e.g. ``3/4``. Default ``4/4``.
+        plot_title : str
+            Writes a title in the pianoroll plot. Default ``''`` no title.
+        tempo_map : TempoMap
+            Tempo map of the MIDI file (``MidiProcessing.tempo_map``) used for
+            the ``bar`` axis. If it is given ``bpm`` and ``bar`` are ignored.
+            
+        Returns
+        -------
+        html_path : str
+            Path of the page.
+        """
+        
+        note_x = self._tracks_x(all_tracks, axis, bpm, bar, tempo_map)
+        
+        return write_canvas_html(os.path.join(fig_path, name_fig + '.html'), all_tracks,
+                                 note_x=note_x, plot_title=plot_title, xaxis_title=axis)
+    
+    
+    @metrics.timed()
+    def plot_singletrack_pianoroll_canvas_html(self, track, fig_path, name_fig='plot',
+                                               bpm=120, axis='time', bar='4/4', 
+                                               plot_title='', tempo_map=None):
+        
+        """This function writes the pianoroll of a single track to a 
+        self-contained HTML page drawn on a canvas, without plotly. See
+        ``plot_all_tracks_canvas_html``.
+        
+        Parameters
+        ----------
+        track : dict
+            Track in the format of ``MidiProcessing.get_tracks``.
+        fig_path : str
+            Directory where the page is written.
+        name_fig : str
+            Name of the page without extension. Default ``plot``.
+        bpm : int or float
+            Beats per minute. Default ``120``.
+        axis : str
+            Change axis between ``time`` to plot time in seconds in the x axis 
+            or ``bar`` to plot the bars.
+        bar : str
+            Bar measure, e.g. ``3/4``. Default ``4/4``.
+        plot_title : str
+            Writes a title in the pianoroll plot. Default ``''`` no title.
+        tempo_map : TempoMap
+            Tempo map of the MIDI file (``MidiProcessing.tempo_map``) used for
+            the ``bar`` axis. If it is given ``bpm`` and ``bar`` are ignored.
+            
+        Returns
+        -------
+        html_path : str
+            Path of the page.
+        """
+        
+        return self.plot_all_tracks_canvas_html({track["n_track"]: track}, fig_path, 
+                                                name_fig, bpm=bpm, axis=axis, bar=bar,
+                                                plot_title=plot_title, tempo_map=tempo_map)
     
 
-def writemidtrack(notes_tuple):
+def _track_set(notes, program=0, is_drum=False, name=''):
+    
+    """This function returns the tracks of ``write_smf`` from a notes tuple,
+    a track dict, a dict of tracks or a ``NoteTable``. A notes tuple is 
+    written as a track with ``program``, ``is_drum`` and ``name``."""
+    
+    if isinstance(notes, (dict, NoteTable, CompactNoteTable)):
+        return notes
+    
+    pitch, note_on, note_off, velocity = _note_columns(notes)
+    
+    return {0: {"n_track"       :   0,
+                "n_program"     :   program,
+                "track_name"    :   name,
+                "is_drum"       :   is_drum,
+                "pitch"         :   pitch,
+                "note_on"       :   note_on,
+                "note_off"      :   note_off,
+                "velocity"      :   velocity}}
+
+
+def _first_track_name(track):
+    
+    """This function returns the name of the first track of any input of
+    ``savemiditrack``, or ``''``."""
+    
+    if isinstance(track, pretty_midi.PrettyMIDI):
+        return track.instruments[0].name if track.instruments else ''
+    tracks = _track_set(track)
+    if isinstance(tracks, (NoteTable, CompactNoteTable)):
+        return tracks.names[0] if tracks.n_tracks else ''
+    if "pitch" in tracks:
+        return tracks.get("track_name", '')
+    
+    return next(iter(tracks.values()), {}).get("track_name", '')
+
+
+@metrics.timed()
+def writemidtrack(notes_tuple, program=0, is_drum=False, name='', tempo_map=None):
         
     """This function returns a MIDI track given a notes_tuple containing the 
-    pitch, the note on and note off events in seconds.
+    pitch, the note on and note off events in seconds and the velocities, or
+    given tracks. The velocities, programs, names and tempo map are kept. 
+    ``savemiditrack`` writes notes tuples and tracks with ``write_smf``
+    without building this object.
         
     Parameters
     ----------
-    notes_tuple : tuple of [np.ndarray, np.ndarray, np.ndarray]
-        Tuple of pitch, onsets and offsets times in seconds.
+    notes_tuple : tuple of np.ndarray, dict or NoteTable
+        Tuple of pitch, onsets and offsets times in seconds and, optionally,
+        velocities (``100`` if there are not). Also a track dict, the tracks
+        of ``MidiProcessing.get_tracks`` or a ``NoteTable``.
+    program : int
+        Program of the track of a notes tuple. Default ``0``.
+    is_drum : bool
+        Is the track of a notes tuple a drum track? Default ``False``.
+    name : str
+        Name of the track of a notes tuple. Default ``''``.
+    tempo_map : TempoMap
+        Tempo map of the file. Default ``None`` which means 120 bpm.
                 
     Returns
     -------
@@ -931,45 +1996,99 @@ def writemidtrack(notes_tuple):
     
     """
     
-    track = pretty_midi.PrettyMIDI()
-    instrument = pretty_midi.Instrument(program=0)
-    for n, notes in enumerate(notes_tuple[0]):
-        note = pretty_midi.Note(velocity = 100, 
-                                pitch = notes, 
-                                start = notes_tuple[1][n], 
-                                end = notes_tuple[2][n])
-        instrument.notes.append(note)
-    track.instruments.append(instrument)
+    tracks = _track_set(notes_tuple, program, is_drum, name)
+    if isinstance(tracks, (NoteTable, CompactNoteTable)):
+        tracks = tracks.to_dict()
+    elif "pitch" in tracks:
+        tracks = {0: tracks}
+    
+    if tempo_map is None:
+        track = pretty_midi.PrettyMIDI()
+    else:
+        track = pretty_midi.PrettyMIDI(initial_tempo=float(tempo_map.tempi[0]))
+        # pretty_midi has no public setter of the tempo changes
+        change_ticks = _change_ticks(tempo_map.change_times, tempo_map.tempi, track.resolution)
+        track._tick_scales = [(int(tick), 60. / (float(tempo) * track.resolution))
+                              for tick, tempo in zip(change_ticks, tempo_map.tempi)]
+        track._update_tick_to_time(int(change_ticks[-1]) + 1)
+        track.time_signature_changes = [pretty_midi.TimeSignature(numerator, denominator, time)
+                                        for numerator, denominator, time in tempo_map.time_signatures]
+    
+    for notes in tracks.values():
+        pitch = np.asarray(notes["pitch"])
+        velocity = notes.get("velocity")
+        if velocity is None:
+            velocity = np.full(len(pitch), 100)
+        instrument = pretty_midi.Instrument(program=int(notes.get("n_program", 0)),
+                                            is_drum=bool(notes.get("is_drum", False)),
+                                            name=notes.get("track_name", ''))
+        instrument.notes = [pretty_midi.Note(velocity=v, pitch=p, start=start, end=end)
+                            for v, p, start, end in zip(np.clip(velocity, 1, 127).tolist(),
+                                                        pitch.tolist(),
+                                                        np.asarray(notes["note_on"], dtype=np.float64).tolist(),
+                                                        np.asarray(notes["note_off"], dtype=np.float64).tolist())]
+        track.instruments.append(instrument)
         
     return track
 
 
-def savemiditrack(track, out_path, name):
+@metrics.timed()
+def savemiditrack(track, out_path, name=None, tempo_map=None, verbose=False):
     
     """This function writes a MIDI file in disk given a track, the output
-    directory to save the MIDI file and the name of the MIDI file.
+    directory to save the MIDI file and the name of the MIDI file, or writes
+    it to a file object. Notes tuples, tracks and ``NoteTable`` objects are 
+    encoded with ``write_smf`` without building ``pretty_midi`` objects.
         
     Parameters
     ----------
-    track : pretty_midi.pretty_midi.PrettyMIDI]
-        MIDI track of the tuple with pitch, note on and note off arrays.      
-    out_path : str
-        Output directory where the MIDI file willl be stored
+    track : pretty_midi.pretty_midi.PrettyMIDI, tuple, dict or NoteTable
+        MIDI track of the tuple with pitch, note on and note off arrays, or
+        any input of ``writemidtrack``.
+    out_path : str or file
+        Output directory where the MIDI file willl be stored, or file object
+        open in binary mode (e.g. ``io.BytesIO``) where it is written.
     name : str
-        Name of the output MIDI file.
+        Name of the output MIDI file, without extension. Not used if 
+        ``out_path`` is a file object. Default ``None`` which means the name
+        of the first track, or ``track`` if it has no name.
+    tempo_map : TempoMap
+        Tempo map of the file if ``track`` is not a ``PrettyMIDI`` object.
+        Default ``None`` which means 120 bpm.
+    verbose : bool
+        Prints where the file has been saved. Default ``False``.
                      
     """
-        
-    track.write(out_path + name + '.mid')
-    print(name, '.mid', 'has been saved in:', out_path)
+    
+    # Encoded before the file is opened, so an encoding error does not
+    # leave a truncated file behind
+    if isinstance(track, pretty_midi.PrettyMIDI):
+        buffer = io.BytesIO()
+        track.write(buffer)
+        data = buffer.getvalue()
+    else:
+        data = write_smf(_track_set(track), tempo_map=tempo_map)
+        
+    with metrics.span('write'):
+        if hasattr(out_path, 'write'):
+            out_path.write(data)
+        else:
+            if name is None:
+                name = re.sub(r'[^\w.-]+', '_', _first_track_name(track)) or 'track'
+            with open(os.path.join(out_path, name + '.mid'), 'wb') as f:
+                f.write(data)
+    metrics.count('bytes_written', len(data))
+            
+    if verbose:
+        print(name + '.mid', 'has been saved in:', out_path)
         
     return 
 
 
-def lists_to_tuple(pitch_list, note_on_list, note_off_list, velocity_list):
+def lists_to_tuple(pitch_list, note_on_list, note_off_list, velocity_list=None):
     
-    """This function returns a tuple of 3 numpy arrays in a variable taking
-    as inputs the pitch, note on and note off lists.
+    """This function returns a tuple of numpy arrays in a variable taking
+    as inputs the pitch, note on, note off and velocity lists.
         
     Parameters
     ----------
@@ -980,21 +2099,44 @@ def lists_to_tuple(pitch_list, note_on_list, note_off_list, velocity_list):
          
     note_off_list: list
         Note off event (or offset) in seconds for the pitches in pitch_list.
+    
+    velocity_list: list
+        Velocities of the pitches in pitch_list. Default ``None`` which means
+        that the tuple has no velocities.
                        
     Returns
     -------
-    notes_tuple : tuple of [np.ndarray, np.ndarray, np.ndarray]
-        Tuple of pitch, onsets and offsets times in seconds.
+    notes_tuple : tuple of [np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        Tuple of pitch, onsets and offsets times in seconds and velocities.
     """
         
     pitch = np.asarray(pitch_list)
     noteon = np.asarray(note_on_list)
     noteoff = np.asarray(note_off_list)
+    
+    if velocity_list is None:
+        return (pitch, noteon, noteoff)
+    
     velocity = np.asarray(velocity_list)
         
     notes_tuple = (pitch, noteon, noteoff, velocity)
         
     return notes_tuple  
+
+
+def _note_columns(tuple_notes):
+    
+    """This function returns the pitch, onsets, offsets and velocities 
+    (``None`` if there are not) arrays of a notes tuple or of a track dict."""
+    
+    if isinstance(tuple_notes, dict):
+        columns = [tuple_notes["pitch"], tuple_notes["note_on"], 
+                   tuple_notes["note_off"], tuple_notes.get("velocity")]
+    else:
+        columns = list(tuple_notes[:4]) + [None] * (4 - len(tuple_notes[:4]))
+        
+    return tuple(np.asarray(column) if column is not None else None 
+                 for column in columns)
     
     
 def note_sequence_to_tuple(note_sequence):
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides the columnar note storage used by ``MidiProcessing``,
+with times in seconds, and its compact form with times in ticks.
+
+"""
+
+import numpy as np
+
+
+NOTE_DTYPE = np.dtype([('pitch', np.int16),
+                       ('note_on', np.float64),
+                       ('note_off', np.float64),
+                       ('velocity', np.int16),
+                       ('track', np.int32)])
+
+COMPACT_DTYPE = np.dtype([('pitch', np.uint8),
+                          ('velocity', np.uint8),
+                          ('start', np.int32),
+                          ('end', np.int32)])
+
+# Used instead of COMPACT_DTYPE if a tick does not fit in an int32
+COMPACT_DTYPE_64 = np.dtype([('pitch', np.uint8),
+                             ('velocity', np.uint8),
+                             ('start', np.int64),
+                             ('end', np.int64)])
+
+
+class NoteTable:
+
+    """This class stores all the notes of a MIDI file in one NumPy structured
+    array with the columns ``pitch``, ``note_on``, ``note_off``, ``velocity``
+    and ``track``. The notes of each track are stored contiguously, so a track
+    is a ``[start, stop)`` range of rows given by ``offsets``.
+
+    Parameters
+    ----------
+    notes : np.ndarray
+        Structured array of ``NOTE_DTYPE`` with the notes of every track.
+    offsets : np.ndarray
+        Array of ``n_tracks + 1`` ints. The notes of track ``i`` are the rows
+        ``offsets[i]:offsets[i+1]``.
+    programs : list of ints
+        Program number of each track.
+    names : list of strs
+        Name of each track.
+    is_drum : list of bools
+        Is the instrument of each track a drum instrument (channel 9)?
+
+    Examples
+    --------
+    >>> table = midiplot.NoteTable.from_pretty_midi(midi.midi_file)
+    >>> table.track(0)["pitch"]
+    """
+
+    def __init__(self, notes, offsets, programs, names, is_drum):
+
+        """Initialize from already built columns."""
+
+        self.notes = notes
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.programs = [int(p) for p in programs]
+        self.names = list(names)
+        self.is_drum = [bool(d) for d in is_drum]
+
+
+    @classmethod
+    def from_pretty_midi(cls, midi_file):
+
+        """This function builds a NoteTable from the instruments of a
+        ``pretty_midi.PrettyMIDI`` object.
+
+        Parameters
+        ----------
+        midi_file : pretty_midi.pretty_midi.PrettyMIDI
+            Pretty MIDI object.
+
+        Returns
+        -------
+        table : NoteTable
+            Columnar table with the notes of every instrument.
+        """
+
+        instruments = midi_file.instruments
+        counts = [len(instrument.notes) for instrument in instruments]
+        offsets = np.zeros(len(instruments) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+
+        notes = np.empty(offsets[-1], dtype=NOTE_DTYPE)
+        pitch = notes['pitch']
+        note_on = notes['note_on']
+        note_off = notes['note_off']
+        velocity = notes['velocity']
+
+        for i, instrument in enumerate(instruments):
+            start, stop = offsets[i], offsets[i + 1]
+            pitch[start:stop] = [note.pitch for note in instrument.notes]
+            note_on[start:stop] = [note.start for note in instrument.notes]
+            note_off[start:stop] = [note.end for note in instrument.notes]
+            velocity[start:stop] = [note.velocity for note in instrument.notes]
+        notes['track'] = np.repeat(np.arange(len(instruments), dtype=np.int32),
+                                   counts)
+
+        return cls(notes,
+                   offsets,
+                   [instrument.program for instrument in instruments],
+                   [instrument.name for instrument in instruments],
+                   [instrument.is_drum for instrument in instruments])
+
+
+    def __len__(self):
+
+        return len(self.notes)
+
+
+    @property
+    def n_tracks(self):
+
+        """Number of tracks in the table."""
+
+        return len(self.offsets) - 1
+
+
+    def track_slice(self, n_track):
+
+        """This function returns the rows of the table that belong to a track.
+
+        Parameters
+        ----------
+        n_track : int
+            Number of the track.
+
+        Returns
+        -------
+        rows : slice
+            Slice of the rows of the track in ``notes``.
+        """
+
+        return slice(int(self.offsets[n_track]), int(self.offsets[n_track + 1]))
+
+
+    def track(self, n_track):
+
+        """This function returns a track in the dict format of
+        ``MidiProcessing.get_tracks``. The note columns are views over the
+        table, so no note data is copied.
+
+        Parameters
+        ----------
+        n_track : int
+            Number of the track.
+
+        Returns
+        -------
+        track : dict
+            Track with the keys ``n_track``, ``n_program``, ``track_name``,
+            ``is_drum``, ``pitch``, ``note_on``, ``note_off`` and ``velocity``.
+        """
+
+        rows = self.notes[self.track_slice(n_track)]
+
+        return {
+                "n_track"       :   n_track,
+                "n_program"     :   self.programs[n_track],
+                "track_name"    :   self.names[n_track],
+                "is_drum"       :   self.is_drum[n_track],
+                "pitch"         :   rows['pitch'],
+                "note_on"       :   rows['note_on'],
+                "note_off"      :   rows['note_off'],
+                "velocity"      :   rows['velocity']
+               }
+
+
+    def trim(self, start_time):
+
+        """This function cuts every track at ``start_time`` in one
+        vectorized pass: the notes which end before it are dropped, the
+        others are shifted so ``start_time`` becomes 0 and the onsets of the
+        notes which were still sounding are clipped to 0.
+
+        Parameters
+        ----------
+        start_time : float
+            Cut time in seconds.
+
+        Returns
+        -------
+        table : NoteTable
+            New table with the trimmed notes.
+        """
+
+        keep = self.notes['note_off'] > start_time
+        if keep.all():
+            notes = self.notes.copy()
+            offsets = self.offsets
+        else:
+            notes = self.notes[keep]
+            offsets = np.zeros(self.n_tracks + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(np.bincount(notes['track'], minlength=self.n_tracks))
+
+        notes['note_on'] -= start_time
+        notes['note_off'] -= start_time
+        np.maximum(notes['note_on'], 0, out=notes['note_on'])
+
+        return NoteTable(notes, offsets, self.programs, self.names, self.is_drum)
+
+
+    def to_dict(self):
+
+        """This function returns all the tracks in the dict format of
+        ``MidiProcessing.get_tracks``.
+
+        Returns
+        -------
+        tracks : dict
+            Dict of tracks indexed by their track number.
+        """
+
+        return {i: self.track(i) for i in range(self.n_tracks)}
+
+
+class CompactNoteTable:
+
+    """This class stores all the notes of a MIDI file in a compact structured
+    array with the columns ``pitch`` and ``velocity`` (uint8) and ``start``
+    and ``end`` in ticks (int32, or int64 for very long files), 10 bytes per
+    note instead of the 24 of ``NoteTable``. The notes of each track are
+    stored contiguously as in ``NoteTable``. The times in seconds are only
+    computed, vectorized with the tempo changes of the file, when they are
+    asked for.
+
+    Parameters
+    ----------
+    notes : np.ndarray
+        Structured array of ``COMPACT_DTYPE`` or ``COMPACT_DTYPE_64`` with
+        the notes of every track.
+    offsets : np.ndarray
+        Array of ``n_tracks + 1`` ints. The notes of track ``i`` are the rows
+        ``offsets[i]:offsets[i+1]``.
+    programs : list of ints
+        Program number of each track.
+    names : list of strs
+        Name of each track.
+    is_drum : list of bools
+        Is the instrument of each track a drum instrument (channel 9)?
+    tick_scales : list of (int, float)
+        Tempo changes as ``(tick, seconds per tick)`` pairs.
+
+    Examples
+    --------
+    >>> smf = midiplot.read_smf(data, compact=True)
+    >>> smf.note_table.seconds('start')
+    >>> smf.note_table.to_note_table()
+    """
+
+    def __init__(self, notes, offsets, programs, names, is_drum, tick_scales):
+
+        """Initialize from already built columns."""
+
+        self.notes = notes
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.programs = [int(p) for p in programs]
+        self.names = list(names)
+        self.is_drum = [bool(d) for d in is_drum]
+        self.tick_scales = [(int(tick), float(scale)) for tick, scale in tick_scales]
+
+
+    @classmethod
+    def from_ticks(cls, pitch, velocity, start, end, offsets, programs, names,
+                   is_drum, tick_scales):
+
+        """This function builds a table from its columns, with int32 ticks
+        if they fit.
+
+        Parameters
+        ----------
+        pitch, velocity, start, end : np.ndarray
+            Columns of the notes, grouped by track.
+        offsets, programs, names, is_drum, tick_scales
+            As in ``CompactNoteTable``.
+
+        Returns
+        -------
+        table : CompactNoteTable
+            Compact table.
+        """
+
+        end = np.asarray(end)
+        fits = not len(end) or end.max() <= np.iinfo(np.int32).max
+        notes = np.empty(len(end), dtype=COMPACT_DTYPE if fits else COMPACT_DTYPE_64)
+        notes['pitch'] = pitch
+        notes['velocity'] = velocity
+        notes['start'] = start
+        notes['end'] = end
+
+        return cls(notes, offsets, programs, names, is_drum, tick_scales)
+
+
+    @classmethod
+    def from_note_table(cls, table, tick_scales):
+
+        """This function converts a ``NoteTable`` to ticks.
+
+        Parameters
+        ----------
+        table : NoteTable
+            Table with times in seconds.
+        tick_scales : list of (int, float)
+            Tempo changes of the file as ``(tick, seconds per tick)`` pairs.
+
+        Returns
+        -------
+        table : CompactNoteTable
+            Compact table.
+        """
+
+        from .smf import seconds_to_ticks
+
+        notes = table.notes
+
+        return cls.from_ticks(notes['pitch'], notes['velocity'],
+                              seconds_to_ticks(notes['note_on'], tick_scales),
+                              seconds_to_ticks(notes['note_off'], tick_scales),
+                              table.offsets, table.programs, table.names,
+                              table.is_drum, tick_scales)
+
+
+    def __len__(self):
+
+        return len(self.notes)
+
+
+    @property
+    def n_tracks(self):
+
+        """Number of tracks in the table."""
+
+        return len(self.offsets) - 1
+
+
+    @property
+    def nbytes(self):
+
+        """Bytes of the notes."""
+
+        return self.notes.nbytes
+
+
+    def track_slice(self, n_track):
+
+        """This function returns the rows of the table that belong to a track.
+
+        Parameters
+        ----------
+        n_track : int
+            Number of the track.
+
+        Returns
+        -------
+        rows : slice
+            Slice of the rows of the track in ``notes``.
+        """
+
+        return slice(int(self.offsets[n_track]), int(self.offsets[n_track + 1]))
+
+
+    def seconds(self, column='start', rows=slice(None)):
+
+        """This function returns the times in seconds of the onsets or
+        offsets of some notes.
+
+        Parameters
+        ----------
+        column : str
+            ``start`` or ``end``. Default ``start``.
+        rows : slice or np.ndarray
+            Rows of the notes. Default every note.
+
+        Returns
+        -------
+        seconds : np.ndarray
+            Times in seconds.
+        """
+
+        from .smf import ticks_to_seconds
+
+        return ticks_to_seconds(self.notes[column][rows], self.tick_scales)
+
+
+    def track(self, n_track):
+
+        """This function returns a track in the dict format of
+        ``MidiProcessing.get_tracks``. ``pitch`` and ``velocity`` are uint8
+        views over the table and ``note_on`` and ``note_off`` are computed
+        in seconds.
+
+        Parameters
+        ----------
+        n_track : int
+            Number of the track.
+
+        Returns
+        -------
+        track : dict
+            Track with the keys ``n_track``, ``n_program``, ``track_name``,
+            ``is_drum``, ``pitch``, ``note_on``, ``note_off`` and ``velocity``.
+        """
+
+        rows = self.track_slice(n_track)
+
+        return {
+                "n_track"       :   n_track,
+                "n_program"     :   self.programs[n_track],
+                "track_name"    :   self.names[n_track],
+                "is_drum"       :   self.is_drum[n_track],
+                "pitch"         :   self.notes['pitch'][rows],
+                "note_on"       :   self.seconds('start', rows),
+                "note_off"      :   self.seconds('end', rows),
+                "velocity"      :   self.notes['velocity'][rows]
+               }
+
+
+    def to_note_table(self):
+
+        """This function returns the table with times in seconds.
+
+        Returns
+        -------
+        table : NoteTable
+            Table with times in seconds.
+        """
+
+        notes = np.empty(len(self.notes), dtype=NOTE_DTYPE)
+        notes['pitch'] = self.notes['pitch']
+        notes['velocity'] = self.notes['velocity']
+        notes['note_on'] = self.seconds('start')
+        notes['note_off'] = self.seconds('end')
+        notes['track'] = np.repeat(np.arange(self.n_tracks, dtype=np.int32),
+                                   np.diff(self.offsets))
+
+        return NoteTable(notes, self.offsets, self.programs, self.names, self.is_drum)
+
+
+    def to_dict(self):
+
+        """This function returns all the tracks in the dict format of
+        ``MidiProcessing.get_tracks``.
+
+        Returns
+        -------
+        tracks : dict
+            Dict of tracks indexed by their track number.
+        """
+
+        return {i: self.track(i) for i in range(self.n_tracks)}
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+This file builds piano-roll matrices from note arrays, as dense
+``(128, n_frames)`` matrices or as run-length encoded runs for long sparse
+tracks.
+
+"""
+
+import numpy as np
+
+
+RUN_DTYPE = np.dtype([('track', np.int32),
+                      ('pitch', np.int16),
+                      ('start', np.int64),
+                      ('stop', np.int64),
+                      ('value', np.int32)])
+
+
+def _events(pitch, start, stop, value, n_frames, row=None):
+
+    """This function returns the note start (``+value``) and stop
+    (``-value``) events of the notes sorted by row and frame, with the
+    events of the same row and frame added together."""
+
+    start = np.clip(start, 0, n_frames)
+    stop = np.clip(stop, 0, n_frames)
+    sounding = stop > start
+    pitch, start, stop, value = pitch[sounding], start[sounding], stop[sounding], value[sounding]
+    row = (np.zeros(len(pitch), dtype=np.int64) if row is None else row[sounding]) * 128 + pitch
+
+    keys = np.concatenate([row * (n_frames + 1) + start, row * (n_frames + 1) + stop])
+    deltas = np.concatenate([value, -value]).astype(np.int64)
+
+    keys, inverse = np.unique(keys, return_inverse=True)
+    deltas = np.bincount(inverse, weights=deltas, minlength=len(keys)).astype(np.int64)
+
+    return keys // (n_frames + 1), keys % (n_frames + 1), deltas
+
+
+def piano_roll(pitch, start, stop, value=None, n_frames=None, n_rows=1, row=None,
+               out=None):
+
+    """This function builds a dense piano-roll from notes given in frames.
+    As in ``pretty_midi``, the values of overlapping notes of the same pitch
+    are added and notes are active in the frames ``[start, stop)``.
+
+    Parameters
+    ----------
+    pitch : np.ndarray
+        Pitch of the notes.
+    start : np.ndarray
+        First frame of the notes.
+    stop : np.ndarray
+        Frame after the last frame of the notes.
+    value : np.ndarray
+        Value of the notes (their velocities). Default ``None`` which builds
+        a binary piano-roll.
+    n_frames : int
+        Number of frames. Default ``None`` which means the last ``stop``.
+    n_rows : int
+        Number of piano-rolls stacked in the output. Default ``1``.
+    row : np.ndarray
+        Piano-roll of each note if ``n_rows`` is greater than 1.
+    out : np.ndarray
+        Preallocated output of shape ``(128, n_frames)`` or
+        ``(n_rows, 128, n_frames)``. Its dtype must be able to hold the
+        sum of the values of the overlapping notes. Default ``None``.
+
+    Returns
+    -------
+    roll : np.ndarray
+        Piano-roll of shape ``(128, n_frames)``, or
+        ``(n_rows, 128, n_frames)`` if ``n_rows`` is greater than 1.
+    """
+
+    pitch = np.asarray(pitch, dtype=np.int64)
+    start = np.asarray(start, dtype=np.int64)
+    stop = np.asarray(stop, dtype=np.int64)
+    binary = value is None
+    value = np.ones(len(pitch), dtype=np.int64) if binary else np.asarray(value, dtype=np.int64)
+    if n_frames is None:
+        n_frames = int(stop.max(initial=0))
+    row = None if row is None else np.asarray(row, dtype=np.int64)
+
+    shape = (128, n_frames) if n_rows == 1 else (n_rows, 128, n_frames)
+    if out is None:
+        out = np.zeros(shape, dtype=np.uint8 if binary else np.int32)
+    elif out.shape != shape or not out.flags.c_contiguous:
+        raise ValueError('out must be a C-contiguous array of shape {}'.format(shape))
+
+    # Scatter the start and stop events in the output and integrate them
+    # along time. The stop events after the last frame are not needed.
+    rows, frames, deltas = _events(pitch, start, stop, value, n_frames, row)
+    inside = frames < n_frames
+    flat = out.reshape(n_rows * 128, n_frames)
+    flat[...] = 0
+    flat[rows[inside], frames[inside]] = deltas[inside]
+    np.cumsum(flat, axis=1, out=flat)
+
+    if binary:
+        np.minimum(flat, 1, out=flat)
+
+    return out
+
+
+def piano_roll_runs(pitch, start, stop, value=None, n_frames=None, row=None):
+
+    """This function builds a run-length encoded piano-roll from notes
+    given in frames: one run per maximal range of frames in which a pitch
+    keeps the same value. It holds the same data as ``piano_roll`` in memory
+    proportional to the number of notes instead of the duration.
+
+    Parameters
+    ----------
+    pitch : np.ndarray
+        Pitch of the notes.
+    start : np.ndarray
+        First frame of the notes.
+    stop : np.ndarray
+        Frame after the last frame of the notes.
+    value : np.ndarray
+        Value of the notes (their velocities). Default ``None`` which builds
+        a binary piano-roll.
+    n_frames : int
+        Number of frames. Default ``None`` which means the last ``stop``.
+    row : np.ndarray
+        Track of each note, for per track piano-rolls. Default ``None``.
+
+    Returns
+    -------
+    runs : np.ndarray
+        Structured array of ``RUN_DTYPE`` sorted by track, pitch and start.
+        ``track`` is ``-1`` if ``row`` is ``None``.
+    """
+
+    pitch = np.asarray(pitch, dtype=np.int64)
+    start = np.asarray(start, dtype=np.int64)
+    stop = np.asarray(stop, dtype=np.int64)
+    binary = value is None
+    value = np.ones(len(pitch), dtype=np.int64) if binary else np.asarray(value, dtype=np.int64)
+    if n_frames is None:
+        n_frames = int(stop.max(initial=0))
+    row = None if row is None else np.asarray(row, dtype=np.int64)
+
+    rows, frames, deltas = _events(pitch, start, stop, value, n_frames, row)
+
+    # The values of each pitch add up to 0, so a single cumulative sum
+    # gives the value of every pitch after each of its events
+    values = np.cumsum(deltas)
+    if binary:
+        values = (values > 0).astype(np.int64)
+
+    # Drop the events which do not change the value
+    previous = np.concatenate([[0], values[:-1]])
+    new_row = np.concatenate([[True], rows[1:] != rows[:-1]])
+    changes = new_row | (values != previous)
+    rows, frames, values = rows[changes], frames[changes], values[changes]
+
+    # Every event with a value opens a run which the next event closes
+    opens = np.flatnonzero(values[:-1] != 0)
+    runs = np.empty(len(opens), dtype=RUN_DTYPE)
+    runs['track'] = rows[opens] // 128 if row is not None else -1
+    runs['pitch'] = rows[opens] % 128
+    runs['start'] = frames[opens]
+    runs['stop'] = frames[opens + 1]
+    runs['value'] = values[opens]
+
+    return runs
+
+
+def runs_to_piano_roll(runs, n_frames, n_rows=1, out=None):
+
+    """This function expands run-length encoded runs into a dense
+    piano-roll.
+
+    Parameters
+    ----------
+    runs : np.ndarray
+        Structured array of ``RUN_DTYPE`` returned by ``piano_roll_runs``.
+    n_frames : int
+        Number of frames.
+    n_rows : int
+        Number of piano-rolls stacked in the output. Default ``1``.
+    out : np.ndarray
+        Preallocated output. Default ``None``.
+
+    Returns
+    -------
+    roll : np.ndarray
+        Piano-roll of shape ``(128, n_frames)``, or
+        ``(n_rows, 128, n_frames)`` if ``n_rows`` is greater than 1.
+    """
+
+    return piano_roll(runs['pitch'], runs['start'], runs['stop'], runs['value'],
+                      n_frames=n_frames, n_rows=n_rows,
+                      row=np.maximum(runs['track'], 0) if n_rows > 1 else None,
+                      out=out)
@@ -0,0 +1,912 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides a fast Standard MIDI File reader which decodes the file
+chunks straight into NumPy arrays, without building ``mido`` messages or
+``pretty_midi`` notes. The notes, instruments, tempo and time signatures it
+returns follow the same rules as ``pretty_midi.PrettyMIDI``. It also 
+provides the writer which encodes whole tracks from their note arrays.
+
+"""
+
+import numpy as np
+
+from .notetable import NoteTable, CompactNoteTable
+
+
+DEFAULT_TEMPO = 120.0
+DEFAULT_RESOLUTION = 220
+# MIDI channels of the instruments which are not drums
+_CHANNELS = [channel for channel in range(16) if channel != 9]
+
+
+class SMFData:
+
+    """This class holds the data read from a Standard MIDI File by
+    ``read_smf`` or ``scan_smf``.
+
+    Attributes
+    ----------
+    resolution : int
+        Ticks per quarter note.
+    note_table : NoteTable or CompactNoteTable
+        Columnar table with the notes of every instrument. ``None`` if only
+        the headers of the file were scanned.
+    programs : list of ints
+        Program number of each instrument.
+    names : list of strs
+        Name of each instrument.
+    is_drum : list of bools
+        Is each instrument a drum instrument (channel 9)?
+    tick_scales : list of (int, float)
+        Tempo changes as ``(tick, seconds per tick)`` pairs.
+    time_signatures : list of (int, int, float)
+        Time signature changes as ``(numerator, denominator, time)``.
+    end_time : float
+        Time in seconds of the last event of the file.
+    """
+
+    def __init__(self, resolution, note_table, tick_scales, time_signatures,
+                 end_time, tracks=None):
+
+        self.resolution = resolution
+        self.note_table = note_table
+        self.tick_scales = tick_scales
+        self.time_signatures = time_signatures
+        self.end_time = end_time
+        if note_table is not None:
+            tracks = zip(note_table.programs, note_table.names, note_table.is_drum)
+        tracks = list(tracks)
+        self.programs = [program for program, _, _ in tracks]
+        self.names = [name for _, name, _ in tracks]
+        self.is_drum = [is_drum for _, _, is_drum in tracks]
+
+
+    @classmethod
+    def from_pretty_midi(cls, midi_file):
+
+        """This function builds the data of a MIDI file from a
+        ``pretty_midi.PrettyMIDI`` object.
+
+        Parameters
+        ----------
+        midi_file : pretty_midi.pretty_midi.PrettyMIDI
+            Pretty MIDI object.
+
+        Returns
+        -------
+        smf : SMFData
+            Data of the MIDI file.
+        """
+
+        return cls(midi_file.resolution,
+                   NoteTable.from_pretty_midi(midi_file),
+                   [(int(tick), float(scale)) for tick, scale in midi_file._tick_scales],
+                   [(ts.numerator, ts.denominator, ts.time)
+                    for ts in midi_file.time_signature_changes],
+                   midi_file.get_end_time())
+
+
+    def compact(self):
+
+        """This function returns the data with the notes in a
+        ``CompactNoteTable``.
+
+        Returns
+        -------
+        smf : SMFData
+            Data of the MIDI file with times in ticks.
+        """
+
+        if self.note_table is None or isinstance(self.note_table, CompactNoteTable):
+            return self
+
+        return SMFData(self.resolution,
+                       CompactNoteTable.from_note_table(self.note_table, self.tick_scales),
+                       self.tick_scales, self.time_signatures, self.end_time)
+
+
+    def to_seconds(self):
+
+        """This function returns the data with the notes in a ``NoteTable``
+        with times in seconds.
+
+        Returns
+        -------
+        smf : SMFData
+            Data of the MIDI file with times in seconds.
+        """
+
+        if not isinstance(self.note_table, CompactNoteTable):
+            return self
+
+        return SMFData(self.resolution, self.note_table.to_note_table(),
+                       self.tick_scales, self.time_signatures, self.end_time)
+
+
+    def ticks_to_seconds(self, ticks):
+
+        """This function converts ticks to seconds with the tempo changes of
+        the file.
+
+        Parameters
+        ----------
+        ticks : np.ndarray
+            Ticks to convert.
+
+        Returns
+        -------
+        seconds : np.ndarray
+            Times in seconds of ``ticks``.
+        """
+
+        return ticks_to_seconds(ticks, self.tick_scales)
+
+
+    def get_tempo_changes(self):
+
+        """This function returns the tempo changes like
+        ``pretty_midi.PrettyMIDI.get_tempo_changes``.
+
+        Returns
+        -------
+        tempo_change_times : np.ndarray
+            Times in seconds where the tempo changes.
+        tempi : np.ndarray
+            Tempo in quarter notes per minute at each change.
+        """
+
+        ticks = np.array([tick for tick, _ in self.tick_scales])
+        scales = np.array([scale for _, scale in self.tick_scales])
+
+        return self.ticks_to_seconds(ticks), 60.0 / (scales * self.resolution)
+
+
+def ticks_to_seconds(ticks, tick_scales):
+
+    """This function converts ticks to seconds given the tempo changes of a
+    file. The times are computed the same way as ``pretty_midi`` does, so the
+    results are equal to the ones of ``pretty_midi.PrettyMIDI.tick_to_time``.
+
+    Parameters
+    ----------
+    ticks : np.ndarray
+        Ticks to convert.
+    tick_scales : list of (int, float)
+        Tempo changes as ``(tick, seconds per tick)`` pairs.
+
+    Returns
+    -------
+    seconds : np.ndarray
+        Times in seconds of ``ticks``.
+    """
+
+    change_ticks, scales, change_times = _tempo_segments(tick_scales)
+
+    ticks = np.asarray(ticks)
+    segment = np.searchsorted(change_ticks, ticks, side='right') - 1
+
+    return change_times[segment] + scales[segment] * (ticks - change_ticks[segment])
+
+
+def seconds_to_ticks(seconds, tick_scales):
+
+    """This function converts seconds to the nearest ticks given the tempo
+    changes of a file. It is the inverse of ``ticks_to_seconds``.
+
+    Parameters
+    ----------
+    seconds : np.ndarray
+        Times in seconds to convert.
+    tick_scales : list of (int, float)
+        Tempo changes as ``(tick, seconds per tick)`` pairs.
+
+    Returns
+    -------
+    ticks : np.ndarray
+        Ticks of ``seconds``.
+    """
+
+    change_ticks, scales, change_times = _tempo_segments(tick_scales)
+
+    seconds = np.asarray(seconds, dtype=np.float64)
+    segment = np.maximum(np.searchsorted(change_times, seconds, side='right') - 1, 0)
+
+    return change_ticks[segment] + np.rint((seconds - change_times[segment])
+                                           / scales[segment]).astype(np.int64)
+
+
+def _tempo_segments(tick_scales):
+
+    """This function returns the start tick, seconds per tick and start time
+    in seconds of each tempo segment."""
+
+    change_ticks = np.array([tick for tick, _ in tick_scales], dtype=np.int64)
+    scales = np.array([scale for _, scale in tick_scales])
+
+    # Time in seconds where each tempo segment starts
+    change_times = np.zeros(len(tick_scales))
+    for i in range(1, len(tick_scales)):
+        change_times[i] = (change_times[i - 1]
+                           + scales[i - 1] * (change_ticks[i] - change_ticks[i - 1]))
+
+    return change_ticks, scales, change_times
+
+
+def _read_varlen(data, pos):
+
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, pos
+
+
+def _iter_chunks(data):
+
+    """This function yields the ``(name, start, end)`` of every chunk of a
+    Standard MIDI File."""
+
+    pos = 0
+    while pos + 8 <= len(data):
+        name = bytes(data[pos:pos + 4])
+        size = int.from_bytes(data[pos + 4:pos + 8], 'big')
+        yield name, pos + 8, min(pos + 8 + size, len(data))
+        pos += 8 + size
+
+
+def read_smf(data, compact=False):
+
+    """This function reads the notes, instruments and tempo map of a
+    Standard MIDI File.
+
+    Notes are grouped in instruments by track, channel and program and
+    note-ons are paired with note-offs with the same rules as
+    ``pretty_midi``, so ``note_table`` is equal to the one built from a
+    ``pretty_midi.PrettyMIDI`` object of the same file. The events are
+    walked once to collect them in arrays, and the notes are paired and
+    grouped with array operations (see ``benchmarks/bench_smf.py``).
+
+    Parameters
+    ----------
+    data : bytes
+        Contents of the MIDI file.
+    compact : bool
+        Returns the notes in a ``CompactNoteTable``, with times in ticks,
+        instead of a ``NoteTable``. Default ``False``.
+
+    Returns
+    -------
+    smf : SMFData
+        Data of the MIDI file.
+    """
+
+    return _parse(data, compact=compact)
+
+
+def scan_smf(data):
+
+    """This function reads the instruments, tempo map and duration of a
+    Standard MIDI File without extracting its notes. The events are walked
+    once, without pairing the note-ons with their note-offs in lists or
+    storing any note: only the first and last open tick of each pitch is
+    kept, which is enough to know which instruments exist and when the last
+    note ends. The instruments are the same, in the same order, as
+    ``read_smf``.
+
+    The delta times of the events must still be read one by one, as in any
+    reader of Standard MIDI Files, so the scan is CPU-bound and about as
+    fast as ``read_smf``, but it does not collect the events or allocate
+    the notes.
+
+    Parameters
+    ----------
+    data : bytes
+        Contents of the MIDI file.
+
+    Returns
+    -------
+    smf : SMFData
+        Data of the MIDI file with ``note_table = None``.
+    """
+
+    resolution, tracks = _header(data)
+
+    last_note_off = 0
+    # (program, channel, track) -> instrument number
+    instrument_map = {}
+    instrument_names = []
+    tempo_events = []
+    time_signature_events = []
+    meta_ticks = []
+    last_control = -1
+    stragglers = {}
+
+    for track_idx, (_, pos, end) in enumerate(tracks):
+        track_name = ''
+        tick = 0
+        status = None
+        programs = [0] * 16
+        # channel * 128 + pitch -> (first tick, last tick, number of notes
+        # at the last tick) of the open notes of the pitch
+        open_notes = {}
+
+        while pos < end:
+            byte = data[pos]
+            if byte < 0x80:
+                tick += byte
+                pos += 1
+            else:
+                delta, pos = _read_varlen(data, pos)
+                tick += delta
+            byte = data[pos]
+            if byte < 0x80:
+                if status is None:
+                    raise ValueError('running status without last status')
+            else:
+                pos += 1
+                if byte != 0xFF:
+                    status = byte
+                else:
+                    meta_type = data[pos]
+                    length, pos = _read_varlen(data, pos + 1)
+                    if meta_type == 0x03:
+                        track_name = bytes(data[pos:pos + length]).decode('latin1')
+                    elif track_idx == 0 and meta_type == 0x51:
+                        tempo_events.append((tick, int.from_bytes(data[pos:pos + length], 'big')))
+                    elif track_idx == 0 and meta_type == 0x58:
+                        time_signature_events.append((tick, data[pos], 2 ** data[pos + 1]))
+                        meta_ticks.append(tick)
+                    elif (track_idx == 0 and meta_type == 0x59) or meta_type in (0x01, 0x05):
+                        meta_ticks.append(tick)
+                    pos += length
+                    continue
+
+            kind = status & 0xF0
+            if status in (0xF0, 0xF7):
+                length, pos = _read_varlen(data, pos)
+                pos += length
+                continue
+            channel = status & 0x0F
+            if kind in (0xC0, 0xD0):
+                if kind == 0xC0:
+                    programs[channel] = data[pos]
+                pos += 1
+                continue
+
+            key = channel * 128 + data[pos]
+            velocity = data[pos + 1]
+            pos += 2
+            if kind == 0x90 and velocity > 0:
+                state = open_notes.get(key)
+                if state is None:
+                    open_notes[key] = (tick, tick, 1)
+                elif state[1] == tick:
+                    open_notes[key] = (state[0], tick, state[2] + 1)
+                else:
+                    open_notes[key] = (state[0], tick, 1)
+            elif kind == 0x80 or kind == 0x90:
+                state = open_notes.pop(key, None)
+                # Same rules as read_smf: the note-off closes the notes which
+                # did not start at its tick, and keeps the others only if it
+                # closed some
+                if state is None or state[0] == tick:
+                    continue
+                instrument_key = (programs[channel], channel, track_idx)
+                if instrument_key not in instrument_map:
+                    instrument_map[instrument_key] = len(instrument_map)
+                    instrument_names.append(track_name)
+                    if (channel, track_idx) in stragglers:
+                        stragglers[(channel, track_idx)][1] = True
+                if tick > last_note_off:
+                    last_note_off = tick
+                if state[1] == tick:
+                    open_notes[key] = (tick, tick, state[2])
+            elif kind == 0xB0 or kind == 0xE0:
+                if (programs[channel], channel, track_idx) in instrument_map:
+                    last_control = max(last_control, tick)
+                elif (channel, track_idx) in stragglers:
+                    stragglers[(channel, track_idx)][0] = tick
+                else:
+                    stragglers[(channel, track_idx)] = [tick, False]
+
+    return _smf_data(resolution, None, instrument_map, instrument_names, tempo_events,
+                     time_signature_events, meta_ticks, _control_ticks(last_control, stragglers),
+                     last_note_off)
+
+
+def _header(data):
+
+    """This function returns the resolution and the ``(name, start, end)``
+    of the track chunks of a Standard MIDI File."""
+
+    chunks = _iter_chunks(data)
+    name, start, end = next(chunks, (None, 0, 0))
+    if name != b'MThd':
+        raise ValueError('MThd not found. Probably not a MIDI file')
+    resolution = int.from_bytes(data[start + 4:start + 6], 'big')
+
+    return resolution, (chunk for chunk in chunks if chunk[0] == b'MTrk')
+
+
+def _parse(data, compact=False):
+
+    """This function reads a Standard MIDI File in two passes. The events
+    are walked once, as in ``scan_smf``, to collect the meta events and the
+    channel events as ``(tick, status, data1, data2)`` rows. The note-ons
+    are then paired with their note-offs and grouped in instruments by
+    ``_pair_notes`` with array operations."""
+
+    resolution, tracks = _header(data)
+
+    # Note, program change, control change and pitch bend events, flat
+    events = []
+    # Number of channel events at the end of each track
+    track_ends = []
+    # (track, number of channel events before it, name) of the track names
+    name_events = []
+    tempo_events = []
+    time_signature_events = []
+    meta_ticks = []
+
+    for track_idx, (_, pos, end) in enumerate(tracks):
+        tick = 0
+        status = None
+
+        while pos < end:
+            byte = data[pos]
+            if byte < 0x80:
+                tick += byte
+                pos += 1
+            else:
+                delta, pos = _read_varlen(data, pos)
+                tick += delta
+            byte = data[pos]
+            if byte < 0x80:
+                if status is None:
+                    raise ValueError('running status without last status')
+            else:
+                pos += 1
+                if byte != 0xFF:
+                    status = byte
+                else:
+                    meta_type = data[pos]
+                    length, pos = _read_varlen(data, pos + 1)
+                    if meta_type == 0x03:
+                        name_events.append((track_idx, len(events) // 4,
+                                            bytes(data[pos:pos + length]).decode('latin1')))
+                    elif track_idx == 0 and meta_type == 0x51:
+                        tempo_events.append((tick, int.from_bytes(data[pos:pos + length], 'big')))
+                    elif track_idx == 0 and meta_type == 0x58:
+                        time_signature_events.append((tick, data[pos], 2 ** data[pos + 1]))
+                        meta_ticks.append(tick)
+                    elif (track_idx == 0 and meta_type == 0x59) or meta_type in (0x01, 0x05):
+                        meta_ticks.append(tick)
+                    pos += length
+                    continue
+
+            kind = status & 0xF0
+            if status in (0xF0, 0xF7):
+                length, pos = _read_varlen(data, pos)
+                pos += length
+            elif kind == 0xC0:
+                events += (tick, status, data[pos], 0)
+                pos += 1
+            elif kind == 0xD0:
+                pos += 1
+            else:
+                if kind != 0xA0 and kind != 0xF0:
+                    events += (tick, status, data[pos], data[pos + 1])
+                pos += 2
+
+        track_ends.append(len(events) // 4)
+
+    events = np.array(events, dtype=np.int64).reshape(-1, 4)
+    notes, instrument_map, instrument_names, control_ticks, last_note_off = \
+        _pair_notes(events, track_ends, name_events)
+
+    return _smf_data(resolution, notes, instrument_map, instrument_names, tempo_events,
+                     time_signature_events, meta_ticks, control_ticks, last_note_off, compact)
+
+
+def _pair_notes(events, track_ends, name_events):
+
+    """This function pairs the note-ons of the ``(tick, status, data1,
+    data2)`` rows of ``_parse`` with their note-offs and groups the notes in
+    instruments, with the rules of ``pretty_midi``:
+
+    - a note-off closes every open note of its track, channel and pitch
+      which did not start at its tick, and keeps the others open only if it
+      closed some;
+    - a note belongs to the instrument of the track, channel and program of
+      its note-off, and the instruments are numbered in the order of their
+      first note-off;
+    - the notes of an instrument are in the order of their note-offs.
+
+    The events of each track, channel and pitch are sorted together once
+    and each note-on is closed by the next note-off of its group. A group
+    where a note-on is followed by a note-off at the same tick is paired
+    one event at a time, since the note may be kept open or dropped.
+
+    Returns the notes in the format of ``_smf_data``, the instrument map,
+    the names of the instruments, the ticks of ``_control_ticks`` and the
+    tick of the last note-off."""
+
+    tick, status, data1, data2 = events.T
+    n_events = len(events)
+    kind = status & 0xF0
+    track = np.repeat(np.arange(len(track_ends)), np.diff(track_ends, prepend=0))
+    channel_key = track * 16 + (status & 0x0F)
+
+    # Program of the channel of every event: the last program change of its
+    # track and channel, or 0
+    order = np.argsort(channel_key, kind='stable')
+    positions = np.arange(n_events)
+    first = np.ones(n_events, dtype=bool)
+    first[1:] = channel_key[order][1:] != channel_key[order][:-1]
+    group_start = np.maximum.accumulate(np.where(first, positions, 0))
+    last_change = np.maximum.accumulate(np.where(kind[order] == 0xC0, positions, -1))
+    program = np.empty(n_events, dtype=np.int64)
+    program[order] = np.where(last_change >= group_start,
+                              data1[order][np.maximum(last_change, 0)], 0)
+
+    # Note events grouped by track, channel and pitch, in the order of the
+    # file inside each group
+    is_on = (kind == 0x90) & (data2 > 0)
+    note_events = np.flatnonzero(is_on | (kind == 0x80) | (kind == 0x90))
+    note_key = channel_key[note_events] * 128 + data1[note_events]
+    order = note_events[np.argsort(note_key, kind='stable')]
+    note_key = channel_key[order] * 128 + data1[order]
+    on = is_on[order]
+    note_tick = tick[order]
+    n_notes = len(order)
+
+    positions = np.arange(n_notes)
+    first = np.ones(n_notes, dtype=bool)
+    first[1:] = note_key[1:] != note_key[:-1]
+    starts = np.flatnonzero(first)
+    bounds = np.append(starts, n_notes)
+    group_end = np.repeat(bounds[1:], np.diff(bounds))
+    next_off = np.minimum.accumulate(np.where(on, n_notes, positions)[::-1])[::-1]
+    has_off = on & (next_off < group_end)
+    closer = np.where(has_off, next_off, 0)
+    same_tick = has_off & (note_tick[closer] == note_tick)
+
+    close = np.where(has_off, next_off, -1)
+    for group in np.unique(np.searchsorted(starts, positions[same_tick], side='right') - 1):
+        begin, stop = bounds[group], bounds[group + 1]
+        close[begin:stop] = -1
+        open_notes = []
+        for n in range(begin, stop):
+            if on[n]:
+                open_notes.append(n)
+                continue
+            keep = [note for note in open_notes if note_tick[note] == note_tick[n]]
+            for note in open_notes:
+                if note_tick[note] != note_tick[n]:
+                    close[note] = n
+            open_notes = keep if len(keep) < len(open_notes) else []
+
+    closed = np.flatnonzero(close >= 0)
+    note_on = order[closed]
+    note_off = order[close[closed]]
+
+    # Instruments by track, channel and program of the note-offs, numbered
+    # in the order of their first note-off
+    instrument_key = channel_key[note_off] * 128 + program[note_off]
+    keys, inverse = np.unique(instrument_key, return_inverse=True)
+    created = np.full(len(keys), n_events, dtype=np.int64)
+    np.minimum.at(created, inverse, note_off)
+    rank = np.argsort(created, kind='stable')
+    number = np.empty(len(keys), dtype=np.int64)
+    number[rank] = np.arange(len(keys))
+    note_instruments = number[inverse]
+
+    instrument_map = {}
+    instrument_names = []
+    for key, event in zip(keys[rank].tolist(), created[rank].tolist()):
+        track_idx = key // (16 * 128)
+        instrument_map[(key % 128, key // 128 % 16, track_idx)] = len(instrument_map)
+        instrument_names.append(next((name for idx, count, name in reversed(name_events)
+                                      if idx == track_idx and count <= event), ''))
+
+    note_order = np.lexsort((note_on, note_off, note_instruments))
+    note_on = note_on[note_order]
+    notes = (data1[note_on].astype(np.uint8),
+             data2[note_on].astype(np.uint8),
+             tick[note_on],
+             tick[note_off[note_order]],
+             np.bincount(note_instruments, minlength=len(keys)))
+    last_note_off = int(tick[note_off].max()) if len(note_off) else 0
+
+    # Control changes and pitch bends sent when the instrument of their
+    # channel and program already exists, or held as stragglers
+    controls = np.flatnonzero((kind == 0xB0) | (kind == 0xE0))
+    control_key = channel_key[controls] * 128 + program[controls]
+    found = np.minimum(np.searchsorted(keys, control_key), max(len(keys) - 1, 0))
+    exists = np.zeros(len(controls), dtype=bool)
+    if len(keys):
+        exists = (keys[found] == control_key) & (created[found] < controls)
+    last_control = int(tick[controls[exists]].max()) if exists.any() else -1
+
+    stragglers = {}
+    instrument_channels = keys // 128
+    for event in controls[~exists].tolist():
+        key = int(channel_key[event])
+        if key in stragglers:
+            stragglers[key][0] = int(tick[event])
+        else:
+            kept = bool(np.any((instrument_channels == key) & (created > event)))
+            stragglers[key] = [int(tick[event]), kept]
+
+    return (notes, instrument_map, instrument_names, _control_ticks(last_control, stragglers),
+            last_note_off)
+
+
+def _control_ticks(last_control, stragglers):
+
+    """This function returns the ticks of the control changes and pitch
+    bends which are kept in instruments. Like ``pretty_midi``, the events
+    sent to a channel of a track before an instrument with the current
+    program exists are held in a straggler instrument, which is only kept if
+    an instrument of the channel and track is created afterwards."""
+
+    ticks = [tick for tick, kept in stragglers.values() if kept]
+    if last_control >= 0:
+        ticks.append(last_control)
+
+    return ticks
+
+
+def _smf_data(resolution, notes, instrument_map, instrument_names, tempo_events,
+              time_signature_events, meta_ticks, control_ticks, last_note_off,
+              compact=False):
+
+    """This function builds the ``SMFData`` of the events collected by
+    ``_parse`` or ``scan_smf``. ``control_ticks`` are the ticks of
+    ``_control_ticks``. ``notes`` holds the pitches, velocities,
+    start and end ticks of the notes grouped by instrument and the number
+    of notes of each instrument, or is ``None`` for a scan."""
+
+    tick_scales = _tick_scales(tempo_events, resolution)
+    instrument_keys = list(instrument_map)
+    tracks = [(program, name, channel == 9)
+              for (program, channel, _), name in zip(instrument_keys, instrument_names)]
+
+    note_table = None
+    if notes is not None:
+        pitches, velocities, start_ticks, end_ticks, counts = notes
+        offsets = np.zeros(len(instrument_map) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        note_table = CompactNoteTable.from_ticks(pitches, velocities, start_ticks, end_ticks,
+                                                 offsets,
+                                                 [program for program, _, _ in tracks],
+                                                 [name for _, name, _ in tracks],
+                                                 [is_drum for _, _, is_drum in tracks],
+                                                 tick_scales)
+        if not compact:
+            note_table = note_table.to_note_table()
+
+    time_signature_times = ticks_to_seconds(
+            np.array([tick for tick, _, _ in time_signature_events], dtype=np.int64),
+            tick_scales)
+    time_signatures = [(numerator, denominator, float(time))
+                       for (_, numerator, denominator), time in zip(time_signature_events,
+                                                                    time_signature_times)]
+
+    # Last event of the file: note ends, control changes and pitch bends of
+    # the instruments, meta events and tempo changes
+    end_ticks = control_ticks + meta_ticks + [tick for tick, _ in tick_scales]
+    if instrument_keys:
+        end_ticks.append(last_note_off)
+    end_time = float(ticks_to_seconds(max(end_ticks), tick_scales))
+
+    return SMFData(resolution, note_table, tick_scales, time_signatures,
+                   end_time, tracks)
+
+
+def _tick_scales(tempo_events, resolution):
+
+    """This function builds the ``(tick, seconds per tick)`` tempo changes
+    from the set tempo events of the first track. Like ``pretty_midi``, a
+    tempo event at tick 0 replaces the default 120 bpm and repeated tempi are
+    ignored."""
+
+    tick_scales = [(0, 60.0 / (DEFAULT_TEMPO * resolution))]
+    for tick, tempo in tempo_events:
+        bpm = 6e7 / tempo
+        scale = 60.0 / (bpm * resolution)
+        if tick == 0:
+            tick_scales = [(0, scale)]
+        elif scale != tick_scales[-1][1]:
+            tick_scales.append((tick, scale))
+
+    return tick_scales
+
+
+def _varlen(value):
+
+    """This function encodes a variable length quantity."""
+
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    return bytes(reversed(out))
+
+
+def _chunk(name, data):
+
+    return name + len(data).to_bytes(4, 'big') + data
+
+
+def _meta(tick, meta_type, payload):
+
+    """This function returns a meta event and its tick."""
+
+    return tick, b'\xff' + bytes([meta_type]) + _varlen(len(payload)) + payload
+
+
+def _meta_track(events):
+
+    """This function encodes a track chunk from ``(tick, event)`` pairs
+    sorted by tick."""
+
+    data = bytearray()
+    last_tick = 0
+    for tick, event in events:
+        data += _varlen(tick - last_tick) + event
+        last_tick = tick
+    data += b'\x00\xff\x2f\x00'
+
+    return _chunk(b'MTrk', bytes(data))
+
+
+def _note_track(name, program, channel, pitch, start, stop, velocity):
+
+    """This function encodes the track chunk of an instrument. The note
+    events are sorted and encoded in vectorized passes: note-offs go before
+    the note-ons of the same tick."""
+
+    header = b'\x00' + _meta(0, 0x03, name.encode('latin1', 'replace'))[1]
+    header += bytes([0, 0xC0 | channel, program])
+
+    n_notes = len(pitch)
+    ticks = np.concatenate([stop, start])
+    order = np.lexsort((np.repeat([0, 1], n_notes), ticks))
+    ticks = ticks[order]
+    status = np.repeat(np.array([0x80 | channel, 0x90 | channel], dtype=np.uint8), n_notes)[order]
+    data1 = np.concatenate([pitch, pitch]).astype(np.uint8)[order]
+    data2 = np.concatenate([np.zeros(n_notes, dtype=np.uint8),
+                            velocity.astype(np.uint8)])[order]
+
+    deltas = np.diff(ticks, prepend=0)
+    if len(deltas) and deltas.max() >= 1 << 28:
+        raise ValueError('the notes are too far apart to be written in a MIDI file.')
+
+    # Bytes of the delta time of each event, and position of each event
+    n_bytes = 1 + (deltas >= 1 << 7) + (deltas >= 1 << 14) + (deltas >= 1 << 21)
+    positions = np.zeros(len(deltas), dtype=np.int64)
+    positions[1:] = np.cumsum(n_bytes + 3)[:-1]
+
+    events = np.zeros(int(n_bytes.sum()) + 3 * len(deltas), dtype=np.uint8)
+    for j in range(4):
+        # Byte j of the delta times with at least j + 1 bytes
+        mask = n_bytes > j
+        shift = 7 * (n_bytes[mask] - 1 - j)
+        last = (n_bytes[mask] - 1 == j)
+        events[positions[mask] + j] = ((deltas[mask] >> shift) & 0x7F) | np.where(last, 0, 0x80)
+    events[positions + n_bytes] = status
+    events[positions + n_bytes + 1] = data1
+    events[positions + n_bytes + 2] = data2
+
+    return _chunk(b'MTrk', header + events.tobytes() + b'\x00\xff\x2f\x00')
+
+
+def _change_ticks(change_times, tempi, resolution):
+
+    """This function returns the tick of each tempo change of a tempo map
+    given in seconds and bpm."""
+
+    ticks_per_second = np.asarray(tempi) / 60 * resolution
+    change_ticks = np.zeros(len(change_times))
+    change_ticks[1:] = np.cumsum(np.diff(change_times) * ticks_per_second[:-1])
+
+    return np.rint(change_ticks).astype(np.int64)
+
+
+def write_smf(tracks, tempo_map=None, resolution=DEFAULT_RESOLUTION):
+
+    """This function encodes tracks in the bytes of a Standard MIDI File
+    (format 1) straight from their note arrays, without building
+    ``pretty_midi`` notes or ``mido`` messages. The first track holds the
+    tempo changes and time signatures and each instrument is written in its
+    own track with its name, program and velocities. Drum instruments are
+    written in channel 9.
+
+    Times in seconds are rounded to the nearest tick of the tempo map. Notes
+    shorter than a tick last one tick, so no note is lost.
+
+    Parameters
+    ----------
+    tracks : dict, NoteTable or CompactNoteTable
+        Tracks in the format of ``MidiProcessing.get_tracks``, a single
+        track dict or a note table.
+    tempo_map : TempoMap
+        Tempo changes and time signatures of the file, e.g.
+        ``MidiProcessing.tempo_map``. Default ``None`` which means 120 bpm
+        and no time signature.
+    resolution : int
+        Ticks per quarter note. Default ``220`` like ``pretty_midi``.
+
+    Returns
+    -------
+    data : bytes
+        Contents of the MIDI file.
+
+    Examples
+    --------
+    >>> data = midiplot.write_smf(midi.get_tracks(), tempo_map=midi.tempo_map)
+    >>> with open('copy.mid', 'wb') as f:
+    ...     f.write(data)
+    """
+
+    if isinstance(tracks, (NoteTable, CompactNoteTable)):
+        tracks = tracks.to_dict()
+    elif "pitch" in tracks:
+        tracks = {0: tracks}
+
+    if tempo_map is None:
+        change_times = np.zeros(1)
+        tempi = np.array([DEFAULT_TEMPO])
+        time_signatures = []
+    else:
+        change_times = tempo_map.change_times
+        tempi = tempo_map.tempi
+        time_signatures = tempo_map.time_signatures
+
+    ticks_per_second = tempi / 60 * resolution
+    change_ticks = _change_ticks(change_times, tempi, resolution)
+
+    def to_ticks(seconds):
+        seconds = np.asarray(seconds, dtype=np.float64)
+        segment = np.maximum(np.searchsorted(change_times, seconds, side='right') - 1, 0)
+        ticks = change_ticks[segment] + np.rint((seconds - change_times[segment])
+                                                * ticks_per_second[segment]).astype(np.int64)
+        return np.maximum(ticks, 0)
+
+    events = [_meta(int(tick), 0x51, int(round(6e7 / tempo)).to_bytes(3, 'big'))
+              for tick, tempo in zip(change_ticks, tempi)]
+    for numerator, denominator, time in time_signatures:
+        events.append(_meta(int(to_ticks(time)), 0x58,
+                            bytes([numerator, int(np.log2(denominator)), 24, 8])))
+    events.sort(key=lambda event: event[0])
+    chunks = [_meta_track(events)]
+
+    n_channel = 0
+    for track in tracks.values():
+        pitch = np.asarray(track["pitch"])
+        if len(pitch) and (pitch.min() < 0 or pitch.max() > 127):
+            raise ValueError('pitches must be between 0 and 127.')
+        velocity = track.get("velocity")
+        if velocity is None:
+            velocity = np.full(len(pitch), 100)
+        velocity = np.clip(np.asarray(velocity), 1, 127)
+        start = to_ticks(track["note_on"])
+        stop = np.maximum(to_ticks(track["note_off"]), start + 1)
+
+        if track.get("is_drum", False):
+            channel = 9
+        else:
+            channel = _CHANNELS[n_channel % len(_CHANNELS)]
+            n_channel += 1
+        chunks.append(_note_track(track.get("track_name", ''), int(track.get("n_program", 0)),
+                                  channel, pitch, start, stop, velocity))
+
+    header = _chunk(b'MThd', (1).to_bytes(2, 'big') + len(chunks).to_bytes(2, 'big')
+                    + resolution.to_bytes(2, 'big'))
+
+    return header + b''.join(chunks)
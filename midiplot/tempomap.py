@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides the tempo and bar grid of a MIDI file and the vectorized
+conversions between seconds, beats and bars.
+
+"""
+
+import numpy as np
+
+
+def parse_bar(bar):
+
+    """This function parses a bar measure string like ``3/4``.
+
+    Parameters
+    ----------
+    bar : str
+        Bar measure ``numerator/denominator``.
+
+    Returns
+    -------
+    numerator : int
+        Beats per bar.
+    denominator : int
+        Note value of a beat.
+    """
+
+    try:
+        numerator, denominator = (int(value) for value in bar.split('/'))
+    except (AttributeError, ValueError):
+        raise ValueError('bar inserted is not correct.')
+
+    if numerator <= 0 or denominator <= 0:
+        raise ValueError('bar inserted is not correct.')
+
+    return numerator, denominator
+
+
+class TempoMap:
+
+    """This class holds the tempo changes and time signatures of a MIDI file
+    and converts whole arrays of times between seconds, beats (quarter
+    notes) and bars.
+
+    Parameters
+    ----------
+    change_times : np.ndarray
+        Times in seconds where the tempo changes. The first one must be 0.
+    tempi : np.ndarray
+        Tempo in quarter notes per minute at each change.
+    time_signatures : list of (int, int, float)
+        Time signature changes as ``(numerator, denominator, time)``. If
+        there is none at time 0, the file starts in ``4/4``.
+    end_time : float
+        End of the MIDI file in seconds. The bar grid covers it.
+
+    Attributes
+    ----------
+    bar_times : np.ndarray
+        Start time in seconds of every bar, plus the end of the last bar.
+    n_bars : int
+        Number of bars of the file.
+
+    Examples
+    --------
+    >>> tempo_map = midi.tempo_map
+    >>> tempo_map.seconds_to_bars(midi.note_table.notes['note_on'])
+    """
+
+    def __init__(self, change_times, tempi, time_signatures, end_time):
+
+        self.change_times = np.asarray(change_times, dtype=np.float64)
+        self.tempi = np.asarray(tempi, dtype=np.float64)
+        self.time_signatures = sorted(time_signatures, key=lambda ts: ts[2])
+        if not self.time_signatures or self.time_signatures[0][2] > 0:
+            self.time_signatures.insert(0, (4, 4, 0.))
+        self.end_time = float(end_time)
+
+        # Quarter notes elapsed at each tempo change
+        self._change_beats = np.zeros(len(self.change_times))
+        self._change_beats[1:] = np.cumsum(np.diff(self.change_times) * self.tempi[:-1] / 60)
+
+        self._bar_beats = self._build_bar_grid()
+        self.bar_times = self.beats_to_seconds(self._bar_beats)
+        self.n_bars = len(self._bar_beats) - 1
+
+
+    @classmethod
+    def constant(cls, bpm, bar, end_time):
+
+        """This function builds a tempo map with a single tempo and bar
+        measure.
+
+        Parameters
+        ----------
+        bpm : int or float
+            Beats per minute.
+        bar : str
+            Bar measure, e.g. ``4/4``.
+        end_time : float
+            End of the MIDI file in seconds.
+
+        Returns
+        -------
+        tempo_map : TempoMap
+            Tempo map.
+        """
+
+        numerator, denominator = parse_bar(bar)
+
+        return cls([0.], [bpm], [(numerator, denominator, 0.)], end_time)
+
+
+    def with_bar(self, bar):
+
+        """This function returns the same tempo map with a single bar
+        measure instead of the time signatures of the file.
+
+        Parameters
+        ----------
+        bar : str
+            Bar measure, e.g. ``3/4``.
+
+        Returns
+        -------
+        tempo_map : TempoMap
+            Tempo map.
+        """
+
+        numerator, denominator = parse_bar(bar)
+
+        return TempoMap(self.change_times, self.tempi,
+                        [(numerator, denominator, 0.)], self.end_time)
+
+
+    def _build_bar_grid(self):
+
+        """This function returns the position in beats of every bar line,
+        restarting the grid at each time signature change."""
+
+        ts_beats = self.seconds_to_beats(np.array([ts[2] for ts in self.time_signatures]))
+        end_beat = float(self.seconds_to_beats(self.end_time))
+
+        bar_beats = []
+        for i, (numerator, denominator, _) in enumerate(self.time_signatures):
+            beats_per_bar = numerator * 4 / denominator
+            start = ts_beats[i]
+            if i + 1 < len(self.time_signatures):
+                stop = ts_beats[i + 1]
+            else:
+                # Tolerate rounding errors of the duration at the end of a bar
+                stop = start + max(np.ceil((end_beat - start) / beats_per_bar - 1e-6), 1) * beats_per_bar
+            bar_beats.append(np.arange(start, stop - 1e-9, beats_per_bar))
+        bar_beats.append([stop])
+
+        return np.concatenate(bar_beats)
+
+
+    def seconds_to_beats(self, seconds):
+
+        """This function converts times in seconds to quarter notes.
+
+        Parameters
+        ----------
+        seconds : float or np.ndarray
+            Times in seconds.
+
+        Returns
+        -------
+        beats : float or np.ndarray
+            Times in quarter notes.
+        """
+
+        seconds = np.asarray(seconds, dtype=np.float64)
+        segment = np.clip(np.searchsorted(self.change_times, seconds, side='right') - 1,
+                          0, None)
+
+        return (self._change_beats[segment]
+                + (seconds - self.change_times[segment]) * self.tempi[segment] / 60)
+
+
+    def beats_to_seconds(self, beats):
+
+        """This function converts times in quarter notes to seconds.
+
+        Parameters
+        ----------
+        beats : float or np.ndarray
+            Times in quarter notes.
+
+        Returns
+        -------
+        seconds : float or np.ndarray
+            Times in seconds.
+        """
+
+        beats = np.asarray(beats, dtype=np.float64)
+        segment = np.clip(np.searchsorted(self._change_beats, beats, side='right') - 1,
+                          0, None)
+
+        return (self.change_times[segment]
+                + (beats - self._change_beats[segment]) * 60 / self.tempi[segment])
+
+
+    def seconds_to_bars(self, seconds):
+
+        """This function converts times in seconds to bars. The integer part
+        is the bar (starting at 0) and the fractional part the position
+        inside it.
+
+        Parameters
+        ----------
+        seconds : float or np.ndarray
+            Times in seconds.
+
+        Returns
+        -------
+        bars : float or np.ndarray
+            Times in bars.
+        """
+
+        beats = self.seconds_to_beats(seconds)
+        bar = np.clip(np.searchsorted(self._bar_beats, beats, side='right') - 1,
+                      0, self.n_bars - 1)
+        bar_start = self._bar_beats[bar]
+        bar_length = self._bar_beats[bar + 1] - bar_start
+
+        return bar + (beats - bar_start) / bar_length
+
+
+    def bars_to_seconds(self, bars):
+
+        """This function converts times in bars to seconds.
+
+        Parameters
+        ----------
+        bars : float or np.ndarray
+            Times in bars.
+
+        Returns
+        -------
+        seconds : float or np.ndarray
+            Times in seconds.
+        """
+
+        bars = np.asarray(bars, dtype=np.float64)
+        bar = np.clip(np.floor(bars).astype(np.int64), 0, self.n_bars - 1)
+        bar_start = self._bar_beats[bar]
+        bar_length = self._bar_beats[bar + 1] - bar_start
+
+        return self.beats_to_seconds(bar_start + (bars - bar) * bar_length)
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+This file provides a multi-resolution pyramid of the pianoroll of a MIDI file
+for interactive HTML plots of long files. The coarse levels hold the note
+density per pitch and time bucket and are embedded in the page, the notes are
+split in chunks which the page loads when the plot is zoomed in.
+
+"""
+
+import json
+import os
+
+import numpy as np
+
+from . import metrics, roll
+from .canvas import _b64, _script_json, _track_numbers
+
+
+# Columns of the finest coarse level computed per column of the stored one,
+# so the density is the fraction of each bucket covered by notes
+_OVERSAMPLING = 8
+
+
+class TilePyramid:
+
+    """This class holds a multi-resolution pyramid of the pianoroll of
+    several tracks.
+
+    The coarse levels are ``(128, n_columns)`` uint8 matrices with the
+    fraction (0 to 255) of each time bucket covered by notes of each pitch,
+    halving the number of columns from ``n_columns`` down to
+    ``min_columns``. The notes are stored in chunks of about ``chunk_notes``
+    notes sorted by onset.
+
+    Parameters
+    ----------
+    tracks : dict
+        Tracks returned by ``MidiProcessing.get_tracks``.
+    n_columns : int
+        Columns of the finest coarse level. Default ``1024``.
+    min_columns : int
+        Columns of the coarsest level. Default ``128``.
+    chunk_notes : int
+        Notes per chunk. Default ``5000``.
+    note_x : list of (np.ndarray, np.ndarray)
+        Onsets and offsets of the notes of each track in the units of the x
+        axis. Default ``None`` which means the times in seconds.
+
+    Attributes
+    ----------
+    levels : list of np.ndarray
+        Coarse levels from the finest to the coarsest.
+    chunks : list of np.ndarray
+        Notes of each chunk with the fields ``x0``, ``x1``, ``pitch``,
+        ``velocity`` and ``track``.
+    index : np.ndarray
+        First onset, last onset and last offset of each chunk.
+
+    Examples
+    --------
+    >>> pyramid = midiplot.TilePyramid(midi.get_tracks())
+    >>> pyramid.write_html('plots/', 'song')
+    """
+
+    CHUNK_DTYPE = np.dtype([('x0', np.float32),
+                            ('x1', np.float32),
+                            ('pitch', np.uint8),
+                            ('velocity', np.uint8),
+                            ('track', np.uint16)])
+
+    def __init__(self, tracks, n_columns=1024, min_columns=128, chunk_notes=5000,
+                 note_x=None):
+
+        keys = list(tracks.keys())
+        if note_x is None:
+            note_x = [(np.asarray(tracks[key]["note_on"], dtype=np.float64),
+                       np.asarray(tracks[key]["note_off"], dtype=np.float64)) for key in keys]
+
+        self.track_keys = keys
+        self.names = [tracks[key]["track_name"] for key in keys]
+
+        counts = [len(tracks[key]["pitch"]) for key in keys]
+        notes = np.empty(sum(counts), dtype=self.CHUNK_DTYPE)
+        notes['x0'] = np.concatenate([on for on, _ in note_x]) if keys else []
+        notes['x1'] = np.concatenate([off for _, off in note_x]) if keys else []
+        notes['pitch'] = np.concatenate([tracks[key]["pitch"] for key in keys]) if keys else []
+        notes['velocity'] = np.concatenate([tracks[key]["velocity"] if "velocity" in tracks[key]
+                                            else np.full(count, 100)
+                                            for key, count in zip(keys, counts)]) if keys else []
+        notes['track'] = _track_numbers(counts)
+
+        self.x_min = float(min(notes['x0'].min(initial=np.inf), 0))
+        self.x_max = float(notes['x1'].max(initial=0))
+        if self.x_max <= self.x_min:
+            self.x_max = self.x_min + 1
+
+        self.levels = self._build_levels(notes, n_columns, min_columns)
+
+        notes = notes[np.argsort(notes['x0'], kind='stable')]
+        self.chunks = [notes[i:i + chunk_notes] for i in range(0, len(notes), chunk_notes)]
+        self.index = np.array([[chunk['x0'][0], chunk['x0'][-1], chunk['x1'].max()]
+                               for chunk in self.chunks]).reshape(-1, 3)
+
+
+    def _build_levels(self, notes, n_columns, min_columns):
+
+        """This function returns the coarse levels, from the finest to the
+        coarsest."""
+
+        n_frames = n_columns * _OVERSAMPLING
+        frames_per_x = n_frames / (self.x_max - self.x_min)
+        start = np.minimum(((notes['x0'] - self.x_min) * frames_per_x).astype(np.int64), n_frames - 1)
+        stop = np.maximum(np.ceil((notes['x1'] - self.x_min) * frames_per_x).astype(np.int64),
+                          start + 1)
+
+        coverage = roll.piano_roll(notes['pitch'], start, stop, n_frames=n_frames)
+        coverage = coverage.reshape(128, n_columns, _OVERSAMPLING).mean(axis=2)
+
+        levels = []
+        while True:
+            levels.append(np.round(coverage * 255).astype(np.uint8))
+            if coverage.shape[1] // 2 < min_columns or coverage.shape[1] % 2:
+                break
+            coverage = coverage.reshape(128, -1, 2).mean(axis=2)
+
+        return levels
+
+
+    def chunk_script(self, i):
+
+        """This function returns the JavaScript file of a chunk, which
+        hands its notes to the page when it is loaded.
+
+        Parameters
+        ----------
+        i : int
+            Number of the chunk.
+
+        Returns
+        -------
+        script : str
+            Contents of the file.
+        """
+
+        chunk = self.chunks[i]
+        data = {"x0"        :   _b64(chunk['x0']),
+                "x1"        :   _b64(chunk['x1']),
+                "pitch"     :   _b64(chunk['pitch']),
+                "velocity"  :   _b64(chunk['velocity']),
+                "track"     :   _b64(chunk['track'])}
+
+        return 'midiplotChunk({}, {});\n'.format(i, json.dumps(data))
+
+
+    def write_html(self, fig_path, name_fig='plot', plot_title='', colors=None,
+                   edge_colors=None, xaxis_title='time', include_plotlyjs=True,
+                   max_chunks=4):
+
+        """This function writes an interactive HTML page of the pyramid. The
+        page embeds the coarse levels and the index of the chunks, which
+        are written to the ``<name_fig>_tiles`` directory and loaded when
+        at most ``max_chunks`` chunks are visible.
+
+        Parameters
+        ----------
+        fig_path : str
+            Directory of the page.
+        name_fig : str
+            Name of the page without extension. Default ``plot``.
+        plot_title : str
+            Title of the plot. Default ``''`` no title.
+        colors : list of strs
+            Color of the notes of each track. Default ``None`` which means
+            ``midiprocessing.COLOR``.
+        edge_colors : list of strs
+            Color of the borders of the notes of each track. Default ``None``
+            which means ``midiprocessing.COLOR_EDGES``.
+        xaxis_title : str
+            Title of the x axis. Default ``time``.
+        include_plotlyjs : bool or str
+            ``True`` embeds plotly.js in the page, ``cdn`` loads it from
+            the plotly CDN. Default ``True``.
+        max_chunks : int
+            Maximum number of chunks drawn as notes. Default ``4``.
+
+        Returns
+        -------
+        html_path : str
+            Path of the page.
+        """
+
+        from .midiprocessing import COLOR, COLOR_EDGES
+
+        colors = colors if colors is not None else [COLOR[key % len(COLOR)] for key in self.track_keys]
+        edge_colors = edge_colors if edge_colors is not None else \
+            [COLOR_EDGES[key % len(COLOR_EDGES)] for key in self.track_keys]
+
+        tiles_dir = name_fig + '_tiles'
+        os.makedirs(os.path.join(fig_path, tiles_dir), exist_ok=True)
+        for i in range(len(self.chunks)):
+            chunk_path = os.path.join(fig_path, tiles_dir, 'chunk_{:05d}.js'.format(i))
+            with metrics.span('write'), open(chunk_path, 'w') as f:
+                f.write(self.chunk_script(i))
+            metrics.count('bytes_written', os.path.getsize(chunk_path))
+
+        meta = {"title"         :   plot_title,
+                "xaxis_title"   :   xaxis_title,
+                "x_min"         :   self.x_min,
+                "x_max"         :   self.x_max,
+                "levels"        :   [{"n_columns": level.shape[1], "data": _b64(level)}
+                                     for level in self.levels],
+                "index"         :   self.index.tolist(),
+                "tiles_dir"     :   tiles_dir,
+                "max_chunks"    :   max_chunks,
+                "names"         :   self.names,
+                "colors"        :   colors,
+                "edge_colors"   :   edge_colors}
+
+        from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+        if include_plotlyjs == 'cdn':
+            plotlyjs = '<script src="https://cdn.plot.ly/plotly-{}.min.js"></script>'.format(
+                get_plotlyjs_version())
+        else:
+            plotlyjs = '<script type="text/javascript">{}</script>'.format(get_plotlyjs())
+
+        html_path = os.path.join(fig_path, name_fig + '.html')
+        with metrics.span('write'), open(html_path, 'w') as f:
+            f.write(_PAGE.replace('{{plotlyjs}}', plotlyjs)
+                         .replace('{{meta}}', _script_json(meta)))
+        metrics.count('bytes_written', os.path.getsize(html_path))
+
+        return html_path
+
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+{{plotlyjs}}
+<style>html, body, #plot { margin: 0; width: 100%; height: 100%; background: #111111; }</style>
+</head>
+<body>
+<div id="plot"></div>
+<script type="text/javascript">
+(function() {
+var meta = {{meta}};
+var plot = document.getElementById('plot');
+
+function decode(b64, Type) {
+    var s = atob(b64), bytes = new Uint8Array(s.length);
+    for (var i = 0; i < s.length; i++) bytes[i] = s.charCodeAt(i);
+    return new Type(bytes.buffer);
+}
+
+var levels = meta.levels.map(function(level) {
+    return {n: level.n_columns, z: decode(level.data, Uint8Array)};
+});
+var chunks = {}, requested = {};
+var view = [meta.x_min, meta.x_max];
+
+window.midiplotChunk = function(i, data) {
+    chunks[i] = {x0: decode(data.x0, Float32Array), x1: decode(data.x1, Float32Array),
+                 pitch: decode(data.pitch, Uint8Array), velocity: decode(data.velocity, Uint8Array),
+                 track: decode(data.track, Uint16Array)};
+    draw();
+};
+
+function request(i) {
+    if (requested[i]) return;
+    requested[i] = true;
+    var script = document.createElement('script');
+    script.src = meta.tiles_dir + '/chunk_' + ('0000' + i).slice(-5) + '.js';
+    document.head.appendChild(script);
+}
+
+function visibleChunks() {
+    var ids = [];
+    for (var i = 0; i < meta.index.length; i++) {
+        if (meta.index[i][0] <= view[1] && meta.index[i][2] >= view[0]) ids.push(i);
+    }
+    return ids;
+}
+
+function heatmap() {
+    // Coarsest level with at least one column per two pixels of the view
+    var span = meta.x_max - meta.x_min, width = plot.clientWidth || 1000, level = levels[0];
+    for (var l = levels.length - 1; l >= 0; l--) {
+        level = levels[l];
+        if (level.n * (view[1] - view[0]) / span >= width / 2) break;
+    }
+    var dx = span / level.n;
+    var c0 = Math.max(Math.floor((view[0] - meta.x_min) / dx), 0);
+    var c1 = Math.min(Math.ceil((view[1] - meta.x_min) / dx), level.n);
+    var z = [];
+    for (var p = 0; p < 128; p++) {
+        var row = new Array(c1 - c0);
+        for (var c = c0; c < c1; c++) row[c - c0] = level.z[p * level.n + c] || null;
+        z.push(row);
+    }
+    return [{type: 'heatmap', z: z, x0: meta.x_min + (c0 + 0.5) * dx, dx: dx, y0: 0.5, dy: 1,
+             zmin: 0, zmax: 255, showscale: false, name: 'density',
+             colorscale: [[0, '#1e3a4a'], [1, '#56C8FF']],
+             hovertemplate: 'density %{z}<extra></extra>'}];
+}
+
+function notes(ids) {
+    // The rectangles of a track skip the hover, which is carried once per
+    // note by an invisible marker at its center
+    var traces = meta.names.map(function(name, t) {
+        return {type: 'scattergl', mode: 'lines', fill: 'toself', name: name,
+                fillcolor: meta.colors[t], line: {color: meta.edge_colors[t], width: 2},
+                legendgroup: String(t), hoverinfo: 'skip', x: [], y: []};
+    });
+    var hovers = meta.names.map(function(name, t) {
+        return {type: 'scattergl', mode: 'markers', name: name, showlegend: false,
+                marker: {color: meta.colors[t], opacity: 0}, legendgroup: String(t),
+                x: [], y: [], customdata: [],
+                hovertemplate: name + '<br>x0 %{customdata[0]:.3f}<br>x1 %{customdata[1]:.3f}' +
+                               '<br>pitch %{customdata[2]}<br>velocity %{customdata[3]}<extra></extra>'};
+    });
+    ids.forEach(function(i) {
+        var chunk = chunks[i];
+        for (var n = 0; n < chunk.x0.length; n++) {
+            if (chunk.x1[n] < view[0] || chunk.x0[n] > view[1]) continue;
+            var t = chunk.track[n], x0 = chunk.x0[n], x1 = chunk.x1[n], p = chunk.pitch[n];
+            traces[t].x.push(x0, x0, x1, x1, x0, null);
+            traces[t].y.push(p, p + 1, p + 1, p, p, null);
+            hovers[t].x.push((x0 + x1) / 2);
+            hovers[t].y.push(p + 0.5);
+            hovers[t].customdata.push([x0, x1, p, chunk.velocity[n]]);
+        }
+    });
+    return traces.concat(hovers);
+}
+
+function draw() {
+    var ids = visibleChunks(), traces;
+    if (ids.length <= meta.max_chunks) {
+        ids.forEach(request);
+        var ready = ids.every(function(i) { return chunks[i]; });
+        traces = ready ? notes(ids) : heatmap();
+    } else {
+        traces = heatmap();
+    }
+    Plotly.react(plot, traces, {
+        title: meta.title, template: 'plotly_dark', paper_bgcolor: '#111111',
+        plot_bgcolor: '#282828', font: {color: '#f2f5fa'}, uirevision: 'view',
+        xaxis: {title: meta.xaxis_title, range: view.slice(), autorange: false},
+        yaxis: {title: 'pitch'}
+    });
+}
+
+draw();
+plot.on('plotly_relayout', function(event) {
+    if (event['xaxis.autorange']) {
+        view = [meta.x_min, meta.x_max];
+    } else if (event['xaxis.range[0]'] !== undefined) {
+        view = [event['xaxis.range[0]'], event['xaxis.range[1]']];
+    } else if (event['xaxis.range']) {
+        view = event['xaxis.range'].slice();
+    } else {
+        return;
+    }
+    draw();
+});
+})();
+</script>
+</body>
+</html>
+"""
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Hits, misses, keys and eviction of the on-disk ``NoteCache``.
+
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import midiplot
+import midiplot.cache
+import midiplot.midiprocessing
+
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'example', 'midi_file.mid')
+
+
+@pytest.fixture(scope='module')
+def data():
+
+    with open(EXAMPLE, 'rb') as f:
+        return f.read()
+
+
+def test_miss_then_hit(tmp_path, data, monkeypatch):
+
+    cache = midiplot.NoteCache(str(tmp_path))
+    assert cache.load(cache.key(data)) is None
+
+    parsed = midiplot.MidiProcessing(EXAMPLE, engine='fast', cache=cache)
+    assert cache.load(cache.key(data)) is not None
+
+    # A hit is not parsed again
+    def read_smf(data):
+        raise AssertionError('the cached file was parsed')
+    monkeypatch.setattr(midiplot.midiprocessing, 'read_smf', read_smf)
+    cached = midiplot.MidiProcessing(EXAMPLE, engine='fast', cache=cache)
+
+    expected = parsed.get_tracks()
+    tracks = cached.get_tracks()
+    assert list(tracks) == list(expected)
+    for name in expected:
+        for field in ("pitch", "velocity", "n_program", "is_drum"):
+            np.testing.assert_array_equal(tracks[name][field], expected[name][field])
+        for field in ("note_on", "note_off"):
+            np.testing.assert_allclose(tracks[name][field], expected[name][field])
+    np.testing.assert_allclose(cached.get_tempo_changes()[1], parsed.get_tempo_changes()[1])
+    assert cached.get_duration() == pytest.approx(parsed.get_duration())
+
+
+def test_key_changes_with_content_and_version(data, monkeypatch):
+
+    cache = midiplot.NoteCache('unused')
+    key = cache.key(data)
+
+    assert cache.key(data) == key
+    assert cache.key(data + b'\x00') != key
+    monkeypatch.setattr(midiplot.cache, '__version__', 'other')
+    assert cache.key(data) != key
+
+
+def test_evicts_least_recently_used(tmp_path, data):
+
+    cache = midiplot.NoteCache(str(tmp_path))
+    smf = midiplot.read_smf(data)
+    keys = ['a', 'b', 'c']
+    for key in keys:
+        cache.store(key, smf)
+    entry_size = cache.size() // len(keys)
+
+    # Stored in order a, b, c, then a is used again
+    for age, key in zip((300, 200, 100), keys):
+        for path in cache._paths(key):
+            os.utime(path, (os.path.getmtime(path) - age,) * 2)
+    assert cache.load('a') is not None
+
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert cache.load('b') is None
+    assert cache.load('a') is not None
+    assert cache.load('c') is not None
+
+    cache.clear()
+    assert cache.size() == 0
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Validation of the bar ranges of ``MidiProcessing.cut_midi_bars``.
+
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import midiplot
+
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'example', 'midi_file.mid')
+
+
+@pytest.fixture(scope='module')
+def midi():
+
+    return midiplot.MidiProcessing(EXAMPLE, engine='fast')
+
+
+@pytest.fixture(scope='module')
+def track(midi):
+
+    return midi.get_singletrack_by_ntrack(0)
+
+
+def test_cut_midi_bars_keeps_notes_starting_in_range(midi, track):
+
+    n_bars = midi.get_bars()[-1]
+    pitch, note_on, note_off, velocity = midi.cut_midi_bars(0, n_bars, tuple_notes=track)
+
+    assert len(pitch) == len(track["pitch"])
+    assert midi.cut_midi_bars(2, 2, tuple_notes=track)[0].size == 0
+    cuts = midi.cut_midi_bars(ranges=[(0, 1), (1, n_bars)], tuple_notes=track)
+    assert sum(len(cut[0]) for cut in cuts) == len(track["pitch"])
+    np.testing.assert_array_equal(cuts[0][0], midi.cut_midi_bars(0, 1, tuple_notes=track)[0])
+
+
+@pytest.mark.parametrize('kwargs, message', [
+        ({}, 'must be given'),
+        ({"start_bar": 1}, 'must be given'),
+        ({"start_bar": -1, "end_bar": 2}, 'negative'),
+        ({"start_bar": 3, "end_bar": 1}, 'lower than the starting bar'),
+        ({"start_bar": 0, "end_bar": 10 ** 6}, 'number of bars'),
+        ({"ranges": [(0, 1), (4, 2)]}, 'lower than the starting bar')])
+def test_cut_midi_bars_rejects_invalid_bars(midi, track, kwargs, message):
+
+    with pytest.raises(ValueError, match=message):
+        midi.cut_midi_bars(tuple_notes=track, **kwargs)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Piano-rolls of ``roll.py`` and ``MidiProcessing.get_pianoroll`` against
+``pretty_midi.get_piano_roll``.
+
+"""
+
+import io
+import os
+
+import numpy as np
+import pretty_midi
+import pytest
+
+import midiplot
+from midiplot import roll
+
+from test_smf import _fixture
+
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'example', 'midi_file.mid')
+
+SOURCES = [pytest.param(lambda: open(EXAMPLE, 'rb').read(), id='example'),
+           pytest.param(_fixture, id='fixture')]
+
+
+@pytest.fixture(params=SOURCES)
+def midis(request):
+
+    data = request.param()
+
+    return pretty_midi.PrettyMIDI(io.BytesIO(data)), midiplot.MidiProcessing(data, engine='fast')
+
+
+@pytest.mark.parametrize('fs', [100, 37])
+def test_merged_pianoroll_matches_pretty_midi(midis, fs):
+
+    pm, midi = midis
+    # pretty_midi leaves out the drums; the sustain pedal is not applied
+    expected = pm.get_piano_roll(fs=fs, pedal_threshold=None)
+    pianoroll = midi.get_pianoroll(fs=fs, include_drums=False, n_frames=expected.shape[1])
+
+    np.testing.assert_array_equal(pianoroll, expected)
+    np.testing.assert_array_equal(midi.get_pianoroll(fs=fs, include_drums=False,
+                                                     velocity=False,
+                                                     n_frames=expected.shape[1]),
+                                  expected > 0)
+
+
+def test_track_pianorolls_match_pretty_midi(midis):
+
+    pm, midi = midis
+    n_frames = pm.get_piano_roll(fs=100, pedal_threshold=None).shape[1]
+    pianorolls = midi.get_pianoroll(fs=100, merge=False, n_frames=n_frames)
+
+    assert pianorolls.shape == (len(pm.instruments), 128, n_frames)
+    for n, instrument in enumerate(pm.instruments):
+        if instrument.is_drum:
+            continue
+        expected = instrument.get_piano_roll(fs=100, pedal_threshold=None)
+        np.testing.assert_array_equal(pianorolls[n, :, :expected.shape[1]], expected)
+        assert not pianorolls[n, :, expected.shape[1]:].any()
+
+
+def test_piano_roll_runs_match_dense(midis):
+
+    _, midi = midis
+    notes = midi.note_table.notes
+    start = (notes['note_on'] * 100).astype(np.int64)
+    stop = (notes['note_off'] * 100).astype(np.int64)
+    n_tracks = midi.note_table.n_tracks
+    n_frames = int(stop.max()) + 1
+
+    dense = roll.piano_roll(notes['pitch'], start, stop, notes['velocity'], n_frames=n_frames,
+                            n_rows=n_tracks, row=notes['track'])
+    runs = roll.piano_roll_runs(notes['pitch'], start, stop, notes['velocity'],
+                                n_frames=n_frames, row=notes['track'])
+
+    assert runs.dtype == roll.RUN_DTYPE
+    np.testing.assert_array_equal(roll.runs_to_piano_roll(runs, n_frames, n_rows=n_tracks),
+                                  dense)
+    np.testing.assert_array_equal(dense.sum(axis=0),
+                                  roll.piano_roll(notes['pitch'], start, stop,
+                                                  notes['velocity'], n_frames=n_frames))
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Parity of the fast SMF reader with ``pretty_midi``: the tracks, notes, tempo
+changes and end time read by ``read_smf`` and ``MidiProcessing(engine='fast')``
+must be the ones ``pretty_midi`` reads from the same file.
+
+"""
+
+import io
+import os
+
+import numpy as np
+import pretty_midi
+import pytest
+
+import midiplot
+
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'example', 'midi_file.mid')
+
+
+def _varlen(value):
+
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    return bytes(reversed(out))
+
+
+def _track(events):
+
+    """Track chunk of ``(delta, bytes)`` events, ended by End of Track."""
+
+    data = b''.join(_varlen(delta) + event for delta, event in events) + b'\x00\xff\x2f\x00'
+
+    return b'MTrk' + len(data).to_bytes(4, 'big') + data
+
+
+def _fixture():
+
+    """Format 1 file with a tempo track, a piano track with running status,
+    a program change in the middle and control changes sent before its
+    instrument exists, which are kept in it, a drum track with note-ons of velocity 0 as
+    note-offs, a retriggered note which starts at the tick of a note-off of
+    the same pitch, and a control change of a drum program without notes
+    sent after the drum instrument exists, which ``pretty_midi`` drops."""
+
+    tempo = _track([(0, b'\xff\x51\x03\x07\xa1\x20'),              # 120 bpm
+                    (0, b'\xff\x58\x04\x04\x02\x18\x08'),          # 4/4
+                    (1920, b'\xff\x51\x03\x0b\x71\xb0'),           # 80 bpm
+                    (960, b'\xff\x58\x04\x03\x02\x18\x08')])       # 3/4
+    piano = _track([(0, b'\xff\x03\x05piano'),
+                    (0, b'\xb0\x07\x64'),                          # before any note
+                    (0, b'\xc0\x00'),
+                    (0, b'\x90\x3c\x50'),
+                    (0, b'\x40\x60'),                              # running status
+                    (240, b'\x3c\x00'),
+                    (0, b'\x40\x00'),
+                    (0, b'\x3c\x46'),                              # retrigger
+                    (240, b'\x80\x3c\x00'),
+                    (0, b'\x90\x3c\x40'),
+                    (480, b'\x80\x3c\x00'),
+                    (0, b'\xc0\x28'),                              # violin
+                    (0, b'\x90\x43\x70'),
+                    (960, b'\x43\x00'),
+                    (100, b'\xe0\x00\x50'),                        # pitch bend
+                    (3000, b'\xb0\x07\x10')])                      # kept
+    drums = _track([(0, b'\xff\x03\x05drums'),
+                    (0, b'\x99\x24\x7f'),
+                    (120, b'\x24\x00'),
+                    (120, b'\x26\x64'),
+                    (0, b'\x2a\x64'),
+                    (120, b'\x26\x00'),
+                    (0, b'\x2a\x00'),
+                    (2000, b'\x89\x24\x00'),                       # nothing open
+                    (0, b'\xc9\x05'),
+                    (4000, b'\xb9\x07\x10')])                      # dropped
+    header = b'MThd' + (6).to_bytes(4, 'big') + (1).to_bytes(2, 'big') \
+             + (3).to_bytes(2, 'big') + (480).to_bytes(2, 'big')
+
+    return header + tempo + piano + drums
+
+
+def _same_tick_fixture():
+
+    """Format 0 file with note-offs at the tick of a note-on of the same
+    pitch: a note kept open by a note-off which closes an older note, a
+    note dropped by a note-off which closes nothing, and a program change
+    between a note-on and its note-off."""
+
+    track = _track([(0, b'\x90\x3c\x50'),
+                    (100, b'\x3c\x60'),
+                    (0, b'\x80\x3c\x00'),                       # kept open
+                    (100, b'\x80\x3c\x00'),
+                    (100, b'\x90\x3e\x50'),
+                    (0, b'\x3e\x00'),                            # dropped
+                    (100, b'\x40\x50'),
+                    (0, b'\x40\x51'),
+                    (50, b'\xc0\x18'),
+                    (50, b'\x80\x40\x00'),
+                    (0, b'\xb0\x07\x10')])
+    header = b'MThd' + (6).to_bytes(4, 'big') + (0).to_bytes(2, 'big') \
+             + (1).to_bytes(2, 'big') + (96).to_bytes(2, 'big')
+
+    return header + track
+
+
+SOURCES = [pytest.param(lambda: open(EXAMPLE, 'rb').read(), id='example'),
+           pytest.param(_fixture, id='fixture'),
+           pytest.param(_same_tick_fixture, id='same_tick')]
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_notes_match_pretty_midi(source):
+
+    data = source()
+    midi = pretty_midi.PrettyMIDI(io.BytesIO(data))
+    smf = midiplot.read_smf(data)
+    table = smf.note_table
+
+    assert smf.programs == [instrument.program for instrument in midi.instruments]
+    assert smf.names == [instrument.name for instrument in midi.instruments]
+    assert smf.is_drum == [instrument.is_drum for instrument in midi.instruments]
+    for n, instrument in enumerate(midi.instruments):
+        notes = table.notes[table.offsets[n]:table.offsets[n + 1]]
+        assert notes['pitch'].tolist() == [note.pitch for note in instrument.notes]
+        assert notes['velocity'].tolist() == [note.velocity for note in instrument.notes]
+        np.testing.assert_allclose(notes['note_on'], [note.start for note in instrument.notes])
+        np.testing.assert_allclose(notes['note_off'], [note.end for note in instrument.notes])
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_tempo_and_end_time_match_pretty_midi(source):
+
+    data = source()
+    midi = pretty_midi.PrettyMIDI(io.BytesIO(data))
+
+    for smf in (midiplot.read_smf(data), midiplot.scan_smf(data)):
+        times, tempi = smf.get_tempo_changes()
+        expected_times, expected_tempi = midi.get_tempo_changes()
+        np.testing.assert_allclose(times, expected_times)
+        np.testing.assert_allclose(tempi, expected_tempi)
+        assert smf.time_signatures == pytest.approx(
+            [(ts.numerator, ts.denominator, ts.time) for ts in midi.time_signature_changes])
+        assert smf.end_time == pytest.approx(midi.get_end_time())
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_get_tracks_match_pretty_midi_engine(source):
+
+    data = source()
+    expected = midiplot.MidiProcessing(data, engine='pretty_midi')
+    fast = midiplot.MidiProcessing(data, engine='fast')
+
+    expected_tracks = expected.get_tracks()
+    tracks = fast.get_tracks()
+    assert tracks.keys() == expected_tracks.keys()
+    for key, track in tracks.items():
+        for column in ('n_track', 'n_program', 'track_name', 'is_drum'):
+            assert track[column] == expected_tracks[key][column]
+        for column in ('pitch', 'note_on', 'note_off', 'velocity'):
+            np.testing.assert_allclose(track[column], expected_tracks[key][column])
+    assert fast.get_duration() == pytest.approx(expected.get_duration())
+    np.testing.assert_allclose(fast.get_tempo_changes(), expected.get_tempo_changes())
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_write_smf_round_trip(source):
+
+    midi = midiplot.MidiProcessing(source(), engine='fast')
+    tracks = midi.get_tracks()
+    resolution = 960
+    smf = midiplot.read_smf(midiplot.write_smf(tracks, tempo_map=midi.tempo_map,
+                                               resolution=resolution))
+
+    assert smf.programs == [track["n_program"] for track in tracks.values()]
+    assert smf.names == [track["track_name"] for track in tracks.values()]
+    assert smf.is_drum == [track["is_drum"] for track in tracks.values()]
+    times, tempi = smf.get_tempo_changes()
+    expected_times, expected_tempi = midi.get_tempo_changes()
+    np.testing.assert_allclose(times, expected_times, atol=1e-3)
+    np.testing.assert_allclose(tempi, expected_tempi, rtol=1e-6)
+    # The implicit 4/4 of the tempo map is written out
+    assert [ts[:2] for ts in smf.time_signatures] == [ts[:2] for ts in
+                                                      midi.tempo_map.time_signatures]
+
+    # Times are rounded to the ticks of the written file
+    tolerance = 60 / (np.max(tempi) * resolution)
+    table = smf.note_table
+    for n, track in enumerate(tracks.values()):
+        notes = table.notes[table.track_slice(n)]
+        order = np.lexsort((track["note_off"], track["pitch"], track["note_on"]))
+        written = np.lexsort((notes['note_off'], notes['pitch'], notes['note_on']))
+        np.testing.assert_array_equal(notes['pitch'][written], track["pitch"][order])
+        np.testing.assert_array_equal(notes['velocity'][written], track["velocity"][order])
+        np.testing.assert_allclose(notes['note_on'][written], track["note_on"][order],
+                                   atol=tolerance)
+        np.testing.assert_allclose(notes['note_off'][written], track["note_off"][order],
+                                   atol=tolerance)
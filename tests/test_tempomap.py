@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Conversions of ``TempoMap`` between seconds, beats and bars against the
+beats, downbeats and ticks of ``pretty_midi``.
+
+"""
+
+import io
+import os
+
+import numpy as np
+import pretty_midi
+import pytest
+
+import midiplot
+
+from test_smf import _fixture
+
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'example', 'midi_file.mid')
+
+SOURCES = [pytest.param(lambda: open(EXAMPLE, 'rb').read(), id='example'),
+           pytest.param(_fixture, id='fixture')]
+
+
+@pytest.fixture(params=SOURCES)
+def midis(request):
+
+    data = request.param()
+
+    return pretty_midi.PrettyMIDI(io.BytesIO(data)), midiplot.MidiProcessing(data, engine='fast')
+
+
+def test_beats_match_pretty_midi(midis):
+
+    pm, midi = midis
+    tempo_map = midi.tempo_map
+    beats = pm.get_beats()
+
+    np.testing.assert_allclose(tempo_map.beats_to_seconds(np.arange(len(beats))), beats,
+                               atol=1e-9)
+    np.testing.assert_allclose(tempo_map.seconds_to_beats(beats), np.arange(len(beats)),
+                               atol=1e-9)
+
+    ticks = np.arange(0, pm.time_to_tick(pm.get_end_time()), 7)
+    seconds = np.array([pm.tick_to_time(int(tick)) for tick in ticks])
+    np.testing.assert_allclose(tempo_map.seconds_to_beats(seconds), ticks / pm.resolution,
+                               atol=1e-9)
+    np.testing.assert_allclose(tempo_map.beats_to_seconds(ticks / pm.resolution), seconds,
+                               atol=1e-9)
+
+
+def test_bars_match_pretty_midi(midis):
+
+    pm, midi = midis
+    tempo_map = midi.tempo_map
+    downbeats = pm.get_downbeats()
+
+    np.testing.assert_allclose(tempo_map.bar_times[:len(downbeats)], downbeats, atol=1e-9)
+    np.testing.assert_allclose(tempo_map.seconds_to_bars(downbeats),
+                               np.arange(len(downbeats)), atol=1e-9)
+    np.testing.assert_allclose(tempo_map.bars_to_seconds(np.arange(len(downbeats))),
+                               downbeats, atol=1e-9)
+    assert tempo_map.bar_times[-1] >= pm.get_end_time() - 1e-9
+
+
+def test_seconds_bars_round_trip(midis):
+
+    _, midi = midis
+    tempo_map = midi.tempo_map
+    seconds = np.linspace(0, tempo_map.bar_times[-1], 1001)
+
+    np.testing.assert_allclose(tempo_map.bars_to_seconds(tempo_map.seconds_to_bars(seconds)),
+                               seconds, atol=1e-9)
+    np.testing.assert_allclose(tempo_map.beats_to_seconds(tempo_map.seconds_to_beats(seconds)),
+                               seconds, atol=1e-9)